@@ -0,0 +1,197 @@
+"""
+飞书持仓风控建议：持仓存储、建议计算，以及订阅用户的整点主动推送。
+- 持仓：/data/holdings/{user_id}.json；订阅：/data/subscriptions/{user_id}.json（含上次推送时各币对的操作建议）
+- 推送：每根1h K线收盘后 ADVICE_PUSH_DELAY 秒，对全体订阅用户统一计算一次（行情取一份、每个币对的风控输入只取一次），
+  只向操作建议有变化的用户推送；各 worker 都在等，但每根K线只有抢到 Redis 占位的那个执行
+"""
+import json, logging, os, pathlib, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from .cache import client
+from .exchanges import get_exchange
+from .feishu_utils import send_md
+from .resample import TF_MS
+from .risk_cache import get_risk_inputs, current_bar_ts, RISK_TF
+from .shared import load_markets_shared, fetch_tickers_shared, fetch_ticker_shared
+
+log = logging.getLogger(__name__)
+
+DATA_DIR = pathlib.Path("/data")
+HOLD_DIR = DATA_DIR / "holdings"
+HOLD_DIR.mkdir(parents=True, exist_ok=True)
+SUB_DIR = DATA_DIR / "subscriptions"
+SUB_DIR.mkdir(parents=True, exist_ok=True)
+PUSH_CONCURRENCY = 8
+
+# ---------- 持仓 ----------
+def _user_file(uid: str) -> pathlib.Path:
+    return HOLD_DIR / (uid + ".json")
+
+def load_holdings(uid: str) -> List[dict]:
+    p = _user_file(uid)
+    if not p.exists(): return []
+    return json.loads(p.read_text("utf-8"))
+
+def save_holdings(uid: str, items: List[dict]):
+    _user_file(uid).write_text(json.dumps(items, ensure_ascii=False, indent=2), "utf-8")
+
+# ---------- 建议计算 ----------
+def advice_rows(ex, items: List[dict], ticks: dict, inputs: dict | None = None) -> List[dict]:
+    """逐个持仓给出操作建议；inputs 为预先取好的 {symbol: 风控输入}（批量推送时各用户共用），缺失时按币对读取。"""
+    rows = []
+    for h in items:
+        sym=h["symbol"]; entry=float(h["entry_price"])
+        slp=float(h.get("stop_loss_pct",8.0)); tpp=float(h.get("take_profit_pct",12.0))
+        t = ticks.get(sym) or {}
+        last = t.get("last") or fetch_ticker_shared(ex, sym).get("last")
+        ri = (inputs or {}).get(sym) or get_risk_inputs(ex, "okx", sym)  # 同一根1h K线内命中缓存，不再拉K线
+        ma50, ma200 = ri["ma50"], ri["ma200"]
+        slp_price = entry*(1-slp/100); tpp_price = entry*(1+tpp/100)
+        pnl = (last-entry)/entry*100 if (last and entry) else None
+
+        if last <= slp_price:
+            action="卖出"; reason="触发止损，优先保护本金"
+        elif last >= tpp_price:
+            action="分批止盈"; reason="达到止盈目标，建议分批落袋"
+        else:
+            action="观察"; reasons=[]
+            if ma50 and last<ma50:
+                action="减仓"; reasons.append(f"跌破MA50≈{ma50:.4f}")
+            if ma200 and last<ma200:
+                action="减仓"; reasons.append(f"低于MA200≈{ma200:.4f}")
+            reason = "；".join(reasons) if reasons else "趋势未变，继续跟踪"
+        rows.append({"symbol": sym, "last": last, "pnl": pnl, "sl": slp_price, "tp": tpp_price,
+                     "ma50": ma50, "ma200": ma200, "action": action, "reason": reason})
+    return rows
+
+def render_advice(rows: List[dict], changed: dict | None = None) -> str:
+    """changed 为 {symbol: 上次建议}，推送时在对应条目后标出变化。"""
+    lines = ["**风控建议（仅供参考）**\n"]
+    for r in rows:
+        ma50, ma200 = r["ma50"], r["ma200"]
+        prev = (changed or {}).get(r["symbol"])
+        lines.append(
+          f"- **{r['symbol']}**  现价:{r['last']}  盈亏:{r['pnl']:.2f}%  "
+          f"止损:{r['sl']:.4f}  止盈:{r['tp']:.4f}"
+          + (f"  MA50:{ma50:.4f}" if ma50 else "")
+          + (f"  MA200:{ma200:.4f}" if ma200 else "") +
+          f"\n  建议：**{r['action']}**；{r['reason']}"
+          + (f"（原建议：{prev}）" if prev else "")
+        )
+    return "\n".join(lines)
+
+def current_advice(items: List[dict]) -> List[dict]:
+    ex = get_exchange("okx", None)
+    load_markets_shared(ex)
+    return advice_rows(ex, items, fetch_tickers_shared(ex))
+
+def advice_md(items: List[dict]) -> str:
+    if not items: return "**风控建议**\n- 暂无持仓。"
+    return render_advice(current_advice(items))
+
+# ---------- 订阅 ----------
+def _sub_file(uid: str) -> pathlib.Path:
+    return SUB_DIR / (uid + ".json")
+
+def get_subscription(uid: str) -> dict | None:
+    p = _sub_file(uid)
+    return json.loads(p.read_text("utf-8")) if p.exists() else None
+
+def _put_subscription(uid: str, sub: dict) -> None:
+    p = _sub_file(uid)
+    tmp = p.with_name(f".{p.name}.tmp")
+    tmp.write_text(json.dumps(sub, ensure_ascii=False), "utf-8")
+    os.replace(tmp, p)
+
+def subscribe(uid: str, actions: dict[str, str]) -> None:
+    """actions 为订阅时刻各币对的建议，之后只在建议与之不同时推送。"""
+    _put_subscription(uid, {"since": int(time.time()), "last": actions})
+
+def reset_actions(uid: str) -> None:
+    """持仓变更后清空已记录的建议（下一次推送只记录不推送），未订阅时不做任何事。"""
+    sub = get_subscription(uid)
+    if sub is not None:
+        sub["last"] = {}
+        _put_subscription(uid, sub)
+
+def unsubscribe(uid: str) -> bool:
+    p = _sub_file(uid)
+    if not p.exists():
+        return False
+    p.unlink()
+    return True
+
+def subscribers() -> List[str]:
+    return sorted(p.stem for p in SUB_DIR.glob("*.json"))
+
+# ---------- 整点批量推送 ----------
+def push_once() -> int:
+    """对全体订阅用户计算一次建议，向操作建议有变化的用户推送；返回推送人数。"""
+    users = {uid: load_holdings(uid) for uid in subscribers()}
+    users = {uid: items for uid, items in users.items() if items}
+    if not users:
+        return 0
+    ex = get_exchange("okx", None)
+    load_markets_shared(ex)
+    ticks = fetch_tickers_shared(ex)
+    syms = sorted({h["symbol"] for items in users.values() for h in items})
+
+    def one(sym):
+        try:
+            return sym, get_risk_inputs(ex, "okx", sym)
+        except Exception as e:
+            log.warning("advice push: risk inputs %s failed: %s", sym, e)
+            return sym, None
+    with ThreadPoolExecutor(max_workers=PUSH_CONCURRENCY) as pool:
+        inputs = {s: ri for s, ri in pool.map(one, syms) if ri is not None}
+
+    pushed = 0
+    for uid, items in users.items():
+        sub = get_subscription(uid)
+        if sub is None:  # 计算期间已退订
+            continue
+        try:
+            rows = advice_rows(ex, [h for h in items if h["symbol"] in inputs], ticks, inputs)
+        except Exception as e:
+            log.warning("advice push: %s failed: %s", uid, e)
+            continue
+        last = sub.get("last") or {}
+        # 新加入的币对只记录不推送，已有币对的建议变化才推送
+        changed = {r["symbol"]: last[r["symbol"]] for r in rows
+                   if r["symbol"] in last and last[r["symbol"]] != r["action"]}
+        if changed:
+            try:
+                send_md(uid, render_advice(rows, changed), "持仓建议变化")
+            except Exception as e:
+                log.warning("advice push: send to %s failed: %s", uid, e)
+                continue  # 不更新 last，下一根K线再推
+            pushed += 1
+        # 本次没算出来的币对（风控输入获取失败）沿用上次的建议
+        held = {h["symbol"] for h in items}
+        sub["last"] = {**{s: a for s, a in last.items() if s in held}, **{r["symbol"]: r["action"] for r in rows}}
+        if _sub_file(uid).exists():  # 推送期间退订的不再写回
+            _put_subscription(uid, sub)
+    return pushed
+
+def _claim_bar(bar: int) -> bool:
+    """每根K线只推一次：多个 worker 同时醒来，SET NX 抢到的执行；Redis 不可用时不推（避免每个 worker 各推一遍）。"""
+    try:
+        return bool(client().set(f"advice_push:{bar}", 1, nx=True, ex=TF_MS[RISK_TF] // 1000))
+    except Exception:
+        return False
+
+def run_pusher(stop: threading.Event, delay: float) -> None:
+    """后台线程：每根1h K线收盘后 delay 秒醒来，抢到占位则执行 push_once。"""
+    step = TF_MS[RISK_TF] / 1000
+    while True:
+        wake = current_bar_ts() / 1000 + step + delay  # 当前K线收盘后 delay 秒
+        if stop.wait(max(0.0, wake - time.time())):
+            break
+        bar = current_bar_ts()
+        if not _claim_bar(bar):
+            continue
+        try:
+            n = push_once()
+            log.info("advice push for bar %s: %d users notified", bar, n)
+        except Exception as e:
+            log.warning("advice push failed: %s", e)
@@ -0,0 +1,236 @@
+"""
+价格触发告警引擎：逐笔（逐 tick）检查止损/止盈价位，穿越即推送飞书。
+- 每个币对维护两条有序价位表（止损、止盈），按价格二分定位被穿越的价位，O(log n)
+- 已触发的价位从索引移除；同一持仓的止损/止盈告警后不再重复提醒，直到价位被上调越过已告警价位，
+  或价格收复（止损回到告警价位之上、止盈回到告警价位之下）超过 rearm_pct 且过了冷却期后重新布防
+- sync() 整体重载价位：本次没有出现的持仓（已平仓/删除）撤防
+- 行情源可插拔：任何产出 (symbol, price, ts) 的可迭代对象，内置回放文件与轮询交易所两种
+"""
+import bisect, json, pathlib, time
+from typing import Callable, Iterable, Iterator
+
+from .risk_logic import advice_from_inputs
+
+class LevelIndex:
+    """单个币对的止损/止盈价位索引。"""
+
+    def __init__(self):
+        self.stops: list[tuple[float, str]] = []   # (价位, 持仓键)，价格 <= 价位 触发
+        self.tps: list[tuple[float, str]] = []     # (价位, 持仓键)，价格 >= 价位 触发
+        self.levels: dict[str, tuple[float | None, float | None]] = {}
+
+    def _remove(self, book: list, level: float | None, key: str) -> None:
+        if level is None:
+            return
+        i = bisect.bisect_left(book, (level, key))
+        if i < len(book) and book[i] == (level, key):
+            del book[i]
+
+    def set(self, key: str, sl: float | None, tp: float | None) -> None:
+        old_sl, old_tp = self.levels.get(key, (None, None))
+        self._remove(self.stops, old_sl, key)
+        self._remove(self.tps, old_tp, key)
+        if sl is not None: bisect.insort(self.stops, (sl, key))
+        if tp is not None: bisect.insort(self.tps, (tp, key))
+        self.levels[key] = (sl, tp)
+
+    def discard(self, key: str) -> None:
+        sl, tp = self.levels.pop(key, (None, None))
+        self._remove(self.stops, sl, key)
+        self._remove(self.tps, tp, key)
+
+    def cross(self, price: float) -> list[tuple[str, str, float]]:
+        """返回并移除被 price 穿越的价位：[(kind, key, level)]，kind ∈ {"sl","tp"}"""
+        hits = []
+        i = bisect.bisect_left(self.stops, (price, ""))
+        for level, key in self.stops[i:]:
+            hits.append(("sl", key, level))
+            self.levels[key] = (None, self.levels[key][1])
+        del self.stops[i:]
+        j = bisect.bisect_right(self.tps, (price, chr(0x10FFFF)))
+        for level, key in self.tps[:j]:
+            hits.append(("tp", key, level))
+            self.levels[key] = (self.levels[key][0], None)
+        del self.tps[:j]
+        return hits
+
+class AlertEngine:
+    """
+    rearm_pct：价格须收复到告警价位之外这个比例（止损 level×(1+rearm_pct) 之上 / 止盈 level×(1-rearm_pct) 之下）才重新布防；
+    cooldown：同一 (持仓, kind) 告警后至少间隔这么多秒才重新布防。两者同时满足才布防，避免价格在价位附近来回穿越时反复推送。
+    """
+    def __init__(self, notify: Callable[[dict], None] | None = None, rearm_pct: float = 0.005, cooldown: float = 300.0):
+        self.books: dict[str, LevelIndex] = {}
+        self.wanted: dict[str, tuple[str, float | None, float | None]] = {}  # 持仓键 -> 最近一次设置的 (symbol, sl, tp)
+        self.fired: dict[str, dict[tuple[str, str], tuple[float, int]]] = {}  # symbol -> {(持仓键, kind): (已告警价位, 告警时间ms)}
+        self.notify = notify
+        self.rearm_pct = rearm_pct
+        self.cooldown_ms = cooldown * 1000
+
+    def _armed(self, symbol: str, key: str, kind: str, level: float | None) -> float | None:
+        """告警过的 (持仓, kind) 只有价位上调越过已告警价位才重新布防；动态价位随现价重算的小幅变化不算。"""
+        fired = self.fired.get(symbol, {})
+        f = fired.get((key, kind))
+        if level is None or f is None:
+            return level
+        if level > f[0]:
+            del fired[(key, kind)]
+            return level
+        return None
+
+    def _drop_fired(self, symbol: str, key: str) -> None:
+        fired = self.fired.get(symbol)
+        if fired is None:
+            return
+        fired.pop((key, "sl"), None)
+        fired.pop((key, "tp"), None)
+        if not fired:
+            del self.fired[symbol]
+
+    def set_levels(self, key: str, symbol: str, sl: float | None, tp: float | None) -> None:
+        """布防/更新某持仓的价位（已告警的按 _armed 去重）。"""
+        old = self.wanted.get(key)
+        if old is not None and old[0] != symbol:
+            if old[0] in self.books:
+                self.books[old[0]].discard(key)
+            self._drop_fired(old[0], key)
+        self.wanted[key] = (symbol, sl, tp)
+        self.books.setdefault(symbol, LevelIndex()).set(
+            key, self._armed(symbol, key, "sl", sl), self._armed(symbol, key, "tp", tp))
+
+    def remove(self, key: str) -> None:
+        """撤防并清除告警记录（持仓已平仓/删除）。"""
+        symbol = self.wanted.pop(key, (None,))[0]
+        if symbol in self.books:
+            self.books[symbol].discard(key)
+        self._drop_fired(symbol, key)
+
+    def sync(self, rows: list[tuple[str, str, float | None, float | None]], prune: bool = True) -> list[str]:
+        """
+        整体重载 [(持仓键, symbol, sl, tp)]，返回涉及的币对。
+        prune=True 时撤防本次没有出现的持仓；某个价位来源读取失败时应传 False，避免把它的持仓误撤后又重新告警。
+        """
+        seen = set()
+        for key, sym, sl, tp in rows:
+            self.set_levels(key, sym, sl, tp)
+            seen.add(key)
+        if prune:
+            for key in [k for k in self.wanted if k not in seen]:
+                self.remove(key)
+        return sorted({sym for _, sym, _, _ in rows})
+
+    def _recover(self, symbol: str, price: float, ts: int) -> None:
+        """价格收复已告警价位超过 rearm_pct 且已过冷却期后，按最近设置的价位重新布防；只看本币对的告警记录。"""
+        fired = self.fired[symbol]
+        for (key, kind), (level, at) in list(fired.items()):
+            if ts - at < self.cooldown_ms:
+                continue
+            if not (price > level * (1 + self.rearm_pct) if kind == "sl" else price < level * (1 - self.rearm_pct)):
+                continue
+            del fired[(key, kind)]
+            _, sl, tp = self.wanted[key]
+            self.books[symbol].set(key, self._armed(symbol, key, "sl", sl), self._armed(symbol, key, "tp", tp))
+        if not fired:
+            del self.fired[symbol]
+
+    def on_tick(self, symbol: str, price: float, ts: int | None = None) -> list[dict]:
+        book = self.books.get(symbol)
+        if book is None or price is None:
+            return []
+        ts = ts or int(time.time() * 1000)
+        out = []
+        for kind, key, level in book.cross(float(price)):
+            self.fired.setdefault(symbol, {})[(key, kind)] = (level, ts)
+            alert = {"key": key, "symbol": symbol, "kind": kind, "level": level, "price": float(price), "ts": ts}
+            out.append(alert)
+            if self.notify:
+                self.notify(alert)
+        if symbol in self.fired:
+            self._recover(symbol, float(price), ts)
+        return out
+
+    def run(self, feed: Iterable[tuple[str, float, int | None]]) -> int:
+        n = 0
+        for symbol, price, ts in feed:
+            n += len(self.on_tick(symbol, price, ts))
+        return n
+
+# ---------- 行情源 ----------
+def replay_feed(path: str | pathlib.Path) -> Iterator[tuple[str, float, int | None]]:
+    """回放文件：每行一个 JSON，{"symbol": "BTC/USDT", "price": 60000, "ts": 1700000000000}"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            j = json.loads(line)
+            yield j["symbol"], float(j["price"]), j.get("ts")
+
+def poll_feed(ex, symbols: Callable[[], list[str]], interval: float = 5.0) -> Iterator[tuple[str, float, int | None]]:
+    """轮询交易所 tickers；symbols 为回调，便于价位重载后跟随持仓变化。"""
+    while True:
+        syms = symbols()
+        try:
+            ticks = ex.fetch_tickers(syms) if syms else {}
+        except Exception as e:
+            print(f"[WARN] fetch_tickers failed: {e}")
+            ticks = {}
+        for s in syms:
+            t = ticks.get(s) or {}
+            if t.get("last") is not None:
+                yield s, float(t["last"]), t.get("timestamp")
+        time.sleep(interval)
+
+# ---------- 价位来源 ----------
+def levels_from_state(path: str | pathlib.Path) -> list[tuple[str, str, float | None, float | None]]:
+    """
+    读取风控状态文件，兼容两种格式：
+      - data/risk_state.json：{"symbols": {sym: {"stop_loss_price", "take_profit_price", ...}}}
+      - push_risk 的 positions_state.json：{sym: {"sl_price", "tp_price", "highest_close"}}
+    返回 [(持仓键, symbol, sl, tp)]
+    """
+    p = pathlib.Path(path)
+    if not p.exists():
+        return []
+    data = json.loads(p.read_text("utf-8"))
+    rows = data.get("symbols", data) if isinstance(data, dict) else {}
+    out = []
+    for sym, st in rows.items():
+        if not isinstance(st, dict): continue
+        sl = st.get("stop_loss_price", st.get("sl_price"))
+        tp = st.get("take_profit_price", st.get("tp_price"))
+        out.append((f"file:{p}:{sym}", sym, sl, tp))
+    return out
+
+def levels_from_store(store, ns: str = "positions") -> list[tuple[str, str, float | None, float | None]]:
+    """读取 StateStore 中 push_risk 写入的追踪价位。"""
+    return [(f"store:{sym}", sym, st.get("sl_price"), st.get("tp_price")) for sym, st in store.get_all(ns).items()]
+
+def levels_from_holdings(items: list[dict], inputs_for: Callable[[str], dict],
+                         last_for: Callable[[str], float | None], prefix: str = "hold") -> list[tuple]:
+    """
+    由持仓计算价位：给了止损/止盈百分比的按百分比，否则按 compute_dynamic_advice 的动态口径。
+    inputs_for(symbol) 返回 compute_risk_inputs 结果（可走 risk_cache），last_for(symbol) 返回现价。
+    """
+    out = []
+    for i, h in enumerate(items):
+        sym = h.get("symbol")
+        entry = float(h.get("entry_price", 0) or 0)
+        if not sym or entry <= 0: continue
+        key = f"{prefix}:{i}:{sym}"
+        if "stop_loss_pct" in h or "take_profit_pct" in h:
+            sl = entry * (1 - float(h.get("stop_loss_pct", 8.0)) / 100.0)
+            tp = entry * (1 + float(h.get("take_profit_pct", 12.0)) / 100.0)
+        else:
+            last = last_for(sym)
+            if last is None: continue
+            dyn = advice_from_inputs(inputs_for(sym), entry, last)
+            sl, tp = dyn["stop_loss_price"], dyn["take_profit_price"]
+        out.append((key, sym, sl, tp))
+    return out
+
+def alert_md(alert: dict) -> str:
+    kind_cn = "触发止损" if alert["kind"] == "sl" else "触发止盈"
+    action = "卖出，优先保护本金" if alert["kind"] == "sl" else "分批止盈，建议分批落袋"
+    return (f"**{alert['symbol']} {kind_cn}**\n"
+            f"- 现价：{alert['price']}  价位：{alert['level']:.6f}\n"
+            f"- 建议：**{action}**")
@@ -0,0 +1,219 @@
+"""
+K线归档：按 交易所/周期/月份 分区的 Parquet，列为 symbol, ts, open, high, low, close, volume。
+- 目录：{root}/{exchange}/{tf}/{YYYY-MM}/part-*.parquet；只追加，每次写入新建一个 part 文件，compact() 把同月的 part 合并成一个
+- 每个月份目录的 _parts.json 列出当前有效的 part（按写入顺序），读者只读清单里的文件；
+  合并时先写新 part、再原子替换清单、最后删旧 part，读者不会同时读到合并前后的两份数据
+- 只归档已收盘K线；各币对已归档的最后 ts 记在 {root}/{exchange}/{tf}/_last.json，重复写入自动跳过
+- 读取以内存映射打开文件，数值列直接转 ndarray，按币对切成 Candles 视图，不产生逐行 Python 对象
+- 单写者（scripts/archive_candles.py），读者可并发；文件先写临时名再 rename，读者不会看到半截文件；
+  读者拿到旧清单后文件恰好被合并删除时，重新读清单再读一遍
+"""
+from __future__ import annotations
+import json, os, pathlib, time, uuid
+from datetime import datetime, timezone
+import numpy as np
+from .candles import Candles
+from .config import settings
+from .resample import TF_MS
+
+FIELDS = ("ts", "open", "high", "low", "close", "volume")
+
+def _month(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+def _months(start: int | None, end: int | None, have: list[str]) -> list[str]:
+    lo = _month(start) if start is not None else ""
+    hi = _month(end) if end is not None else "9999-99"
+    return [m for m in have if lo <= m <= hi]
+
+def _month_span(month: str) -> tuple[int, int]:
+    """月份分区覆盖的 [起, 止) 毫秒 ts。"""
+    lo = np.datetime64(month, "M")
+    return int(lo.astype("datetime64[ms]").astype(np.int64)), int((lo + 1).astype("datetime64[ms]").astype(np.int64))
+
+def _replace_atomic(path: pathlib.Path, write) -> None:
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+def _live_parts(d: pathlib.Path) -> list[pathlib.Path]:
+    """月份目录当前有效的 part；没有清单（旧版归档）时按文件名排序取全部。"""
+    m = d / "_parts.json"
+    if m.exists():
+        return [d / n for n in json.loads(m.read_text("utf-8"))]
+    return sorted(d.glob("part-*.parquet"))
+
+def _set_parts(d: pathlib.Path, names: list[str]) -> None:
+    _replace_atomic(d / "_parts.json", lambda p: p.write_text(json.dumps(names), "utf-8"))
+
+class CandleArchive:
+    def __init__(self, root: str | pathlib.Path):
+        self.root = pathlib.Path(root)
+
+    def _dir(self, exchange: str, tf: str) -> pathlib.Path:
+        return self.root / exchange / tf
+
+    def months(self, exchange: str, tf: str) -> list[str]:
+        d = self._dir(exchange, tf)
+        return sorted(p.name for p in d.iterdir() if p.is_dir()) if d.exists() else []
+
+    def last_ts(self, exchange: str, tf: str) -> dict[str, int]:
+        """{symbol: 已归档的最后一根K线 ts}。"""
+        p = self._dir(exchange, tf) / "_last.json"
+        return json.loads(p.read_text("utf-8")) if p.exists() else {}
+
+    # ---------- 写入 ----------
+    def append(self, exchange: str, tf: str, rows_by_symbol: dict[str, list], now_ms: int | None = None) -> int:
+        """
+        追加 {symbol: ccxt 行}；只写比已归档更新、且已收盘的K线，返回写入根数。
+        同一批数据按月拆分，每个涉及的月份新建一个 part 文件。
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        step = TF_MS[tf]
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        cutoff = now_ms // step * step  # 当前未收盘K线的开盘时间
+        last = self.last_ts(exchange, tf)
+        syms, cols = [], []
+        for sym in sorted(rows_by_symbol):
+            after = last.get(sym, -1)
+            rows = {int(r[0]): r for r in rows_by_symbol[sym] if after < r[0] < cutoff}
+            if not rows:
+                continue
+            data = np.array([rows[t][:6] for t in sorted(rows)], dtype=np.float64)
+            syms.append(np.full(len(data), sym, dtype=object))
+            cols.append(data)
+            last[sym] = int(data[-1, 0])
+        if not cols:
+            return 0
+        sym_col, data = np.concatenate(syms), np.concatenate(cols)
+        ts = data[:, 0].astype(np.int64)
+        month = ts.astype("datetime64[ms]").astype("datetime64[M]")
+        stamp = f"{now_ms}-{uuid.uuid4().hex[:6]}"
+        for m in np.unique(month):
+            sel = month == m
+            table = pa.table({"symbol": pa.array(sym_col[sel], pa.string()),
+                              "ts": ts[sel], **{f: data[sel, i] for i, f in enumerate(FIELDS) if i}})
+            d = self._dir(exchange, tf) / str(m)
+            d.mkdir(parents=True, exist_ok=True)
+            name = f"part-{stamp}.parquet"
+            _replace_atomic(d / name, lambda p: pq.write_table(table, p))
+            _set_parts(d, [p.name for p in _live_parts(d) if p.name != name] + [name])
+        _replace_atomic(self._dir(exchange, tf) / "_last.json",
+                        lambda p: p.write_text(json.dumps(last, sort_keys=True), "utf-8"))
+        return len(data)
+
+    def compact(self, exchange: str, tf: str, month: str | None = None) -> int:
+        """把每个月的多个 part 合并为一个（按币对分组、ts 升序、去重），返回合并的月份数。"""
+        import pyarrow.parquet as pq
+        done = 0
+        for m in ([month] if month else self.months(exchange, tf)):
+            d = self._dir(exchange, tf) / m
+            parts = _live_parts(d)
+            if len(parts) < 2:
+                continue
+            table = _grouped(pq.read_table(parts, memory_map=True))
+            name = f"part-{int(time.time() * 1000)}-c.parquet"
+            _replace_atomic(d / name, lambda p: pq.write_table(table, p))
+            _set_parts(d, [name])  # 清单切换后读者只看到合并后的 part，旧 part 才可以删
+            for p in parts:
+                p.unlink(missing_ok=True)
+            done += 1
+        return done
+
+    # ---------- 读取 ----------
+    def read_table(self, exchange: str, tf: str, symbols: list[str] | None = None,
+                   start: int | None = None, end: int | None = None):
+        """
+        pyarrow.Table，按月份、part 顺序拼接：同一币对的行 ts 升序，但不同币对交错。
+        start/end 为毫秒 ts（含），缺省不限。
+        """
+        import pyarrow as pa
+        tables = []
+        for m in _months(start, end, self.months(exchange, tf)):
+            # 时间过滤只加在首尾两个月：整月落在区间内的分区不必逐行比较 ts
+            lo, hi = _month_span(m)
+            filters = [("symbol", "in", list(symbols))] if symbols is not None else []
+            if start is not None and start > lo:
+                filters.append(("ts", ">=", start))
+            if end is not None and end < hi - 1:
+                filters.append(("ts", "<=", end))
+            tables.extend(_read_month(self._dir(exchange, tf) / m, filters or None))
+        if not tables:
+            return pa.table({"symbol": pa.array([], pa.string()), "ts": pa.array([], pa.int64()),
+                             **{f: pa.array([], pa.float64()) for f in FIELDS[1:]}})
+        return pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+
+    def load(self, exchange: str, tf: str, symbols: list[str] | None = None,
+             start: int | None = None, end: int | None = None) -> dict[str, Candles]:
+        """{symbol: Candles}；各币对是同一块 Fortran 序矩阵的行切片视图，可直接交给打分/回测。"""
+        table = self.read_table(exchange, tf, symbols, start, end)
+        n = table.num_rows
+        if not n:
+            return {}
+        names, codes = _codes(table)
+        # 同一币对在拼接结果里已是 ts 升序，按编码稳定排序即可分组，不必比较字符串或 ts
+        order = np.argsort(codes, kind="stable")
+        data = np.empty((n, len(FIELDS)), dtype=np.float64, order="F")
+        for i, f in enumerate(FIELDS):
+            np.take(table.column(f).to_numpy().astype(np.float64, copy=False), order, out=data[:, i])
+        codes = codes[order]
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        starts, ends = np.r_[0, bounds], np.r_[bounds, n]
+        return {names[codes[a]]: Candles(data[a:b]) for a, b in zip(starts, ends)}
+
+    def tail_rows(self, exchange: str, tf: str, symbol: str, n: int, before: int) -> list:
+        """ts < before 的最后 n 根，ccxt 行格式（ts 为整数毫秒）。"""
+        step = TF_MS[tf]
+        c = self.load(exchange, tf, [symbol], start=before - n * step, end=before - 1).get(symbol)
+        if c is None:
+            return []
+        c = c.tail(n)
+        return [[t, *r] for t, r in zip(c.ts.tolist(), c.data[:, 1:].tolist())]
+
+def _read_month(d: pathlib.Path, filters, attempts: int = 3) -> list:
+    """按清单读一个月份的全部 part；读到一半文件被合并删除时重读清单。"""
+    import pyarrow.parquet as pq
+    for i in range(attempts):
+        try:
+            return [pq.read_table(f, memory_map=True, filters=filters) for f in _live_parts(d)]
+        except FileNotFoundError:
+            if i == attempts - 1:
+                raise
+
+def _codes(table) -> tuple[list[str], np.ndarray]:
+    """symbol 列哈希编码：(名称列表, 每行的整数编码)。"""
+    import pyarrow.compute as pc
+    enc = pc.dictionary_encode(table.column("symbol")).combine_chunks()
+    return enc.dictionary.to_pylist(), enc.indices.to_numpy()
+
+def _grouped(table):
+    """按币对分组、ts 升序；同一 (symbol, ts) 保留最后写入的一行。"""
+    if table.num_rows < 2:
+        return table
+    _, codes = _codes(table)
+    ts = table.column("ts").to_numpy()
+    order = np.lexsort((np.arange(len(ts)), ts, codes))
+    codes, ts = codes[order], ts[order]
+    keep = np.ones(len(ts), dtype=bool)
+    keep[:-1] = (codes[:-1] != codes[1:]) | (ts[:-1] != ts[1:])
+    return table.take(order[keep])
+
+_default: CandleArchive | None = None
+
+def default_archive() -> CandleArchive | None:
+    """ARCHIVE_DIR 未配置时为 None（行情读取完全走交易所）。"""
+    global _default
+    if _default is None and settings.ARCHIVE_DIR:
+        _default = CandleArchive(settings.ARCHIVE_DIR)
+    return _default
+
+def archived_rows(exchange: str, symbol: str, tf: str, n: int, before: int) -> list:
+    """供 market.fetch_rows 使用：归档中 ts < before 的最后 n 根；未启用归档或出错时返回空。"""
+    arc = default_archive()
+    if arc is None or tf not in TF_MS or n <= 0:
+        return []
+    try:
+        return arc.tail_rows(exchange, tf, symbol, n, before)
+    except (OSError, ValueError):
+        return []
@@ -0,0 +1,250 @@
+"""
+Redis JSON 缓存。
+值统一包成 {"_v": 值, "_exp": 软过期时间戳, "_d": 上次计算耗时}，Redis 键 TTL = ttl + stale（陈旧宽限）：
+- get_json / aget_json / amget_json 只返回未过软过期的值，口径与普通 TTL 一致
+- acached 在此基础上做防击穿：进程内 single-flight + 跨 worker 填充锁、过期后先返回陈旧值再后台刷新、
+  临近过期按计算耗时概率性提前刷新（XFetch），热点键过期时不会一拥而上打到交易所
+旧格式（未包装）的值视为未过期，直到 Redis TTL 到期。
+"""
+import asyncio, contextvars, json, logging, math, random, time, uuid
+from .config import settings
+from .metrics import cache_result
+
+log = logging.getLogger(__name__)
+
+# 全局共享的 Redis 客户端（API 与飞书路由共用）；首次访问时才导入 redis 并创建
+r = None
+# 异步端点用的 redis.asyncio 客户端（同样按需创建，关闭时由 aclose 释放连接池）
+ar = None
+
+STALE_SEC = settings.CACHE_STALE_SEC
+BETA = settings.CACHE_EARLY_BETA
+LOCK_MS = 60_000
+
+def client():
+    global r
+    if r is None:
+        import redis
+        r = redis.from_url(settings.REDIS_URL)
+    return r
+
+def _dump(value, ttl: int, delta: float = 0.0) -> str:
+    return json.dumps({"_v": value, "_exp": time.time() + ttl, "_d": round(delta, 4)},
+                      ensure_ascii=False, default=str)
+
+def _load(raw) -> tuple:
+    """返回 (值, 软过期时间戳或 None, 计算耗时)。"""
+    obj = json.loads(raw)
+    if isinstance(obj, dict) and "_exp" in obj and "_v" in obj:
+        return obj["_v"], obj["_exp"], obj.get("_d") or 0.0
+    return obj, None, 0.0
+
+def _fresh(raw):
+    if not raw:
+        return None
+    value, exp, _ = _load(raw)
+    return value if exp is None or time.time() < exp else None
+
+def _prefix(key: str) -> str:
+    return key.split(":", 1)[0]
+
+def get_json(key: str):
+    """读取 JSON 缓存；Redis 不可用时视为未命中。命中率按键前缀（如 k / risk）统计。"""
+    from redis import RedisError
+    try:
+        value = _fresh(client().get(key))
+    except RedisError:
+        value = None
+    cache_result(_prefix(key), value is not None)
+    return value
+
+def set_json(key: str, ttl: int, value, stale: int = 0) -> None:
+    """写入 JSON 缓存；Redis 不可用时静默跳过（缓存只是加速，不影响结果）。"""
+    from redis import RedisError
+    try:
+        client().setex(key, ttl + stale, _dump(value, ttl))
+    except RedisError:
+        pass
+
+def delete(*keys: str) -> None:
+    """删除缓存键（主动失效）；Redis 不可用时跳过。"""
+    from redis import RedisError
+    try:
+        client().delete(*keys)
+    except RedisError:
+        pass
+
+def aclient():
+    global ar
+    if ar is None:
+        import redis.asyncio as aredis
+        ar = aredis.from_url(settings.REDIS_URL)
+    return ar
+
+async def aget_json(key: str):
+    from redis import RedisError
+    try:
+        value = _fresh(await aclient().get(key))
+    except RedisError:
+        value = None
+    cache_result(_prefix(key), value is not None)
+    return value
+
+async def aset_json(key: str, ttl: int, value, stale: int = 0) -> None:
+    from redis import RedisError
+    try:
+        await aclient().setex(key, ttl + stale, _dump(value, ttl))
+    except RedisError:
+        pass
+
+async def amget_json(keys: list[str]) -> list:
+    """一次 MGET 读取多个键；Redis 不可用时全部视为未命中。"""
+    from redis import RedisError
+    try:
+        hits = await aclient().mget(keys) if keys else []
+    except RedisError:
+        hits = [None] * len(keys)
+    values = [_fresh(h) for h in hits]
+    for k, v in zip(keys, values):
+        cache_result(_prefix(k), v is not None)
+    return values
+
+async def amset_json(values: dict, ttl: int, stale: int = 0) -> None:
+    """多个键在一个 pipeline 里写入（各自 SETEX）。"""
+    from redis import RedisError
+    if not values:
+        return
+    try:
+        pipe = aclient().pipeline(transaction=False)
+        for k, v in values.items():
+            pipe.setex(k, ttl + stale, _dump(v, ttl))
+        await pipe.execute()
+    except RedisError:
+        pass
+
+# ---------- 防击穿 ----------
+_inflight: dict[str, asyncio.Future] = {}
+_background: dict[str, asyncio.Task] = {}
+
+async def acached(key: str, ttl: int, fill, stale: int | None = None):
+    """
+    读缓存，未命中时调用 fill()（无参协程函数）计算并写回。
+    - 新鲜：直接返回；按 XFetch 以 _d × BETA × -ln(rand) 的提前量概率性触发后台刷新
+    - 已过软过期但仍在 stale 宽限内：返回陈旧值，后台刷新
+    - 完全未命中：同一进程内只有一个协程计算，其余等待同一结果；跨 worker 由 Redis 锁保证只有一个在算
+    """
+    from redis import RedisError
+    stale = STALE_SEC if stale is None else stale
+    try:
+        raw = await aclient().get(key)
+    except RedisError:
+        raw = None
+    if raw:
+        value, exp, delta = _load(raw)
+        now = time.time()
+        if exp is None:
+            cache_result(_prefix(key), True)
+            return value
+        if now - delta * BETA * math.log(1.0 - random.random()) < exp:
+            cache_result(_prefix(key), True)
+            return value
+        cache_result(_prefix(key), True, "stale" if now >= exp else "early")
+        _refresh_later(key, ttl, fill, stale)
+        return value
+    cache_result(_prefix(key), False)
+    return await _single_flight(key, lambda: _fill_or_wait(key, ttl, fill, stale))
+
+def _refresh_later(key: str, ttl: int, fill, stale: int) -> None:
+    if key in _inflight or key in _background:
+        return
+    # 后台任务不继承请求上下文（如分析采样状态）
+    task = asyncio.get_running_loop().create_task(_refresh(key, ttl, fill, stale), context=contextvars.Context())
+    _background[key] = task
+    task.add_done_callback(lambda _: _background.pop(key, None))
+
+async def _refresh(key: str, ttl: int, fill, stale: int) -> None:
+    """后台刷新：拿不到锁（其他 worker 正在刷新）就放弃，失败只记日志，陈旧值继续可用。"""
+    token = await _lock(key)
+    if token is None:
+        return
+    try:
+        await _single_flight(key, lambda: _fill_store(key, ttl, fill, stale), join=False)
+    except Exception as e:
+        log.warning("background refresh %s failed: %s", key, e)
+    finally:
+        await _unlock(key, token)
+
+async def _single_flight(key: str, make, join: bool = True):
+    """同一进程内同一键只运行一个 make()；join=False 时若已有在跑的直接返回 None。"""
+    fut = _inflight.get(key)
+    if fut is not None:
+        return await asyncio.shield(fut) if join else None
+    fut = asyncio.get_running_loop().create_future()
+    fut.add_done_callback(lambda f: f.cancelled() or f.exception())  # 无人等待时不报 "never retrieved"
+    _inflight[key] = fut
+    try:
+        value = await make()
+        fut.set_result(value)
+        return value
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+async def _lock(key: str) -> str | None:
+    from redis import RedisError
+    token = uuid.uuid4().hex
+    try:
+        return token if await aclient().set(f"lock:{key}", token, nx=True, px=LOCK_MS) else None
+    except RedisError:
+        return None
+
+# 只删除自己持有的锁：比较与删除在一个 Lua 脚本里完成，避免锁恰好过期被他人取得后误删
+_UNLOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+async def _unlock(key: str, token: str) -> None:
+    from redis import RedisError
+    try:
+        await aclient().eval(_UNLOCK, 1, f"lock:{key}", token)
+    except RedisError:
+        pass
+
+async def _fill_store(key: str, ttl: int, fill, stale: int):
+    from redis import RedisError
+    t0 = time.perf_counter()
+    value = await fill()
+    try:
+        await aclient().setex(key, ttl + stale, _dump(value, ttl, time.perf_counter() - t0))
+    except RedisError:
+        pass
+    return value
+
+async def _fill_or_wait(key: str, ttl: int, fill, stale: int):
+    """未命中：拿到锁就计算；否则退避轮询持锁 worker 的结果，锁释放或超时仍无结果时自己算。"""
+    from redis import RedisError
+    token = await _lock(key)
+    if token is None:
+        deadline, pause = time.monotonic() + LOCK_MS / 1000, 0.02
+        while time.monotonic() < deadline:
+            await asyncio.sleep(pause)
+            pause = min(pause * 2, 0.5)
+            try:
+                raw = await aclient().get(key)
+                if raw:
+                    return _load(raw)[0]
+                if not await aclient().exists(f"lock:{key}"):
+                    break
+            except RedisError:
+                break
+        return await _fill_store(key, ttl, fill, stale)
+    try:
+        return await _fill_store(key, ttl, fill, stale)
+    finally:
+        await _unlock(key, token)
+
+async def aclose() -> None:
+    global ar
+    if ar is not None:
+        await ar.aclose()
+        ar = None
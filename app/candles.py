@@ -0,0 +1,79 @@
+"""
+列式K线容器：ccxt 的 [[ts, o, h, l, c, v], ...] 一次性转成列连续（Fortran 序）的 float64 矩阵，
+各列是零拷贝视图，tail() 也是视图，全程不构造 DataFrame。
+打分热路径只看尾部若干值，用它可以省掉每个币对的 DataFrame/DatetimeIndex 构造。
+"""
+from datetime import datetime, timezone
+import numpy as np
+
+COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+
+class Candles:
+    __slots__ = ("data",)
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+
+    @classmethod
+    def from_rows(cls, rows: list) -> "Candles":
+        if not rows:
+            return cls(np.empty((0, 6), dtype=np.float64, order="F"))
+        # 毫秒时间戳 < 2^53，float64 可精确表示
+        return cls(np.array([r[:6] for r in rows] if len(rows[0]) > 6 else rows, dtype=np.float64, order="F"))
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __getitem__(self, col: str) -> np.ndarray:
+        return self.data[:, COLUMNS.index(col)]
+
+    @property
+    def ts(self) -> np.ndarray:
+        return self.data[:, 0].astype(np.int64)
+
+    @property
+    def open(self) -> np.ndarray: return self.data[:, 1]
+    @property
+    def high(self) -> np.ndarray: return self.data[:, 2]
+    @property
+    def low(self) -> np.ndarray: return self.data[:, 3]
+    @property
+    def close(self) -> np.ndarray: return self.data[:, 4]
+    @property
+    def volume(self) -> np.ndarray: return self.data[:, 5]
+
+    def tail(self, n: int) -> "Candles":
+        return Candles(self.data[-n:] if n < len(self) else self.data)
+
+    def to_columns(self) -> dict:
+        """列式输出：各列并行数组，ts 为整数毫秒（比逐行 dict + ISO 字符串小得多，也更快）。"""
+        return {"ts": self.ts.tolist(), "open": self.open.tolist(), "high": self.high.tolist(),
+                "low": self.low.tolist(), "close": self.close.tolist(), "volume": self.volume.tolist()}
+
+def _records(rows) -> list[dict]:
+    out = []
+    for ts, o, h, l, c, v in rows:
+        t = datetime.fromtimestamp(ts / 1000, tz=timezone.utc).replace(tzinfo=None)
+        out.append({"ts": t.isoformat(timespec="milliseconds"), "open": o, "high": h,
+                    "low": l, "close": c, "volume": v})
+    return out
+
+def columns_to_records(cols: dict) -> list[dict]:
+    """to_columns 的逆变换：记录列表，ts 为 ISO 字符串（UTC，毫秒精度），不经过 pandas（用于缓存的列式数据按旧格式返回）。"""
+    return _records(zip(cols["ts"], cols["open"], cols["high"], cols["low"], cols["close"], cols["volume"]))
+
+# ---------- 尾部统计（与 pandas rolling(...).iloc[-1] 口径一致：样本不足时为 NaN） ----------
+def col(src, name: str) -> np.ndarray:
+    """从 Candles 或 DataFrame 取一列为 ndarray。"""
+    if isinstance(src, Candles):
+        return src[name]
+    return src[name].to_numpy(dtype=np.float64)
+
+def last_mean(x: np.ndarray, window: int) -> float:
+    return float(x[-window:].mean()) if len(x) >= window else float("nan")
+
+def last_max(x: np.ndarray, window: int) -> float:
+    return float(x[-window:].max()) if len(x) >= window else float("nan")
+
+def last_pct_change(x: np.ndarray, periods: int) -> float:
+    return float(x[-1] / x[-1 - periods] - 1.0) if len(x) > periods else float("nan")
@@ -5,5 +5,52 @@ class Settings:
     DEFAULT_EXCHANGE: str = os.getenv("DEFAULT_EXCHANGE", "okx")
     HTTP_PROXY: str | None = os.getenv("HTTP_PROXY") or None
     HTTPS_PROXY: str | None = os.getenv("HTTPS_PROXY") or None
+    ADMIN_TOKEN: str | None = os.getenv("ADMIN_TOKEN") or None
+    PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", "20"))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    # 启动后在后台预热重模块（pandas/ccxt/redis/requests）与默认交易所；设为 0 则完全按需加载
+    WARMUP: bool = os.getenv("WARMUP", "1") == "1"
+    # /screen/daily 并发拉取K线的上限（实际请求节奏仍受 ccxt 限频约束）
+    SCREEN_CONCURRENCY: int = int(os.getenv("SCREEN_CONCURRENCY", "16"))
+    # 打分权重覆盖，如 "trend=0.25,xs_momentum=0.10"（键为 FactorWeights 的属性名，大小写不敏感）
+    FACTOR_WEIGHTS: dict[str, float] = {k.strip().lower(): float(v) for k, v in
+                                        (x.split("=", 1) for x in os.getenv("FACTOR_WEIGHTS", "").split(",") if "=" in x)}
+    # 外部因子数据源（见 factors.py），如 "catalyst=file:/data/catalyst.json,onchain=http://host/onchain.json"；
+    # FACTOR_TTL 为各因子缓存秒数（缺省 300），如 "catalyst=900,onchain=300"；FACTOR_TIMEOUT 为筛选时等待数据源的上限（秒）
+    FACTOR_PROVIDERS: dict[str, str] = {k.strip().lower(): v.strip() for k, v in
+                                        (x.split("=", 1) for x in os.getenv("FACTOR_PROVIDERS", "").split(",") if "=" in x)}
+    FACTOR_TTL: dict[str, int] = {k.strip().lower(): int(v) for k, v in
+                                  (x.split("=", 1) for x in os.getenv("FACTOR_TTL", "").split(",") if "=" in x)}
+    FACTOR_TIMEOUT: float = float(os.getenv("FACTOR_TIMEOUT", "2"))
+    # strict 筛选在总分最高的多少个候选里逐个过滤（只保留这么多打分结果，内存不随候选数增长）
+    SCREEN_STRICT_POOL: int = int(os.getenv("SCREEN_STRICT_POOL", "200"))
+    # strict 最多逐个检查 topn × SCREEN_STRICT_CHECK_FACTOR 个候选（每个都要补拉日线/4h），0 不限
+    SCREEN_STRICT_CHECK_FACTOR: int = int(os.getenv("SCREEN_STRICT_CHECK_FACTOR", "3"))
+    # 打分进程池：进程数（0 = CPU 核数 / WEB_CONCURRENCY），候选少于 SCORE_POOL_MIN 时在请求进程内打分
+    SCORE_PROCESSES: int = int(os.getenv("SCORE_PROCESSES", "0"))
+    SCORE_POOL_MIN: int = int(os.getenv("SCORE_POOL_MIN", "200"))
+    # 多 worker 共享缓存（秒）：市场元数据 / 全市场行情 / K线
+    MARKETS_TTL: int = int(os.getenv("MARKETS_TTL", "3600"))
+    TICKERS_TTL: int = int(os.getenv("TICKERS_TTL", "15"))
+    CANDLES_TTL: int = int(os.getenv("CANDLES_TTL", "30"))
+    # 防击穿：过期后仍可返回陈旧值的宽限（秒）、XFetch 提前刷新系数（越大越早刷新）
+    CACHE_STALE_SEC: int = int(os.getenv("CACHE_STALE_SEC", "60"))
+    CACHE_EARLY_BETA: float = float(os.getenv("CACHE_EARLY_BETA", "1.0"))
+    # /screen/daily 结果缓存（秒），0 关闭
+    SCREEN_CACHE_TTL: int = int(os.getenv("SCREEN_CACHE_TTL", "60"))
+    # 后台刷新（仅 leader 执行）：间隔秒数，0 关闭；REFRESH_VENUES 逗号分隔，缺省为 DEFAULT_EXCHANGE
+    REFRESH_SEC: float = float(os.getenv("REFRESH_SEC", "10"))
+    REFRESH_VENUES: list[str] = [x.strip() for x in os.getenv("REFRESH_VENUES", "").split(",") if x.strip()]
+    # 飞书回调：事件去重保留秒数（飞书重试可持续数小时），每用户每 FEISHU_RATE_WINDOW 秒最多 FEISHU_RATE_LIMIT 条命令（0 不限）
+    FEISHU_DEDUP_TTL: int = int(os.getenv("FEISHU_DEDUP_TTL", "86400"))
+    FEISHU_RATE_LIMIT: int = int(os.getenv("FEISHU_RATE_LIMIT", "6"))
+    FEISHU_RATE_WINDOW: int = int(os.getenv("FEISHU_RATE_WINDOW", "60"))
+    # 飞书 /advice 结果缓存（秒）：同一用户持仓不变且仍在同一根1h K线内时直接返回，0 关闭
+    ADVICE_CACHE_TTL: int = int(os.getenv("ADVICE_CACHE_TTL", "60"))
+    # 订阅用户的主动推送：每根1h K线收盘后多少秒统一计算（等交易所K线落定），ADVICE_PUSH=0 关闭
+    ADVICE_PUSH: bool = os.getenv("ADVICE_PUSH", "1") == "1"
+    ADVICE_PUSH_DELAY: float = float(os.getenv("ADVICE_PUSH_DELAY", "30"))
+    # K线归档目录（scripts/archive_candles.py 写入）；设置后深度K线请求优先读归档，只向交易所补最近部分
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "")
 
 settings = Settings()
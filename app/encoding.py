@@ -0,0 +1,61 @@
+"""
+行情端点的响应编码，按 Accept 协商：
+- application/json（默认）：orjson 直接编码成字节，绕过 FastAPI 的 jsonable_encoder
+- application/x-msgpack（或 application/msgpack）：MessagePack，列式并行数组，ts 为整数毫秒
+- application/vnd.apache.arrow.stream：Arrow IPC 流（需要 pyarrow，未安装时返回 406）
+"""
+import json
+from fastapi import HTTPException, Response
+
+JSON = "application/json"
+MSGPACK = "application/x-msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+_ALIASES = {"application/msgpack": MSGPACK, "application/vnd.msgpack": MSGPACK,
+            "application/vnd.apache.arrow.file": ARROW}
+
+def negotiate(accept: str | None) -> str:
+    """按 Accept 中出现的顺序取第一个支持的类型（不解析 q 值），都不支持时回落 JSON。"""
+    for part in (accept or "").split(","):
+        mt = part.split(";", 1)[0].strip().lower()
+        mt = _ALIASES.get(mt, mt)
+        if mt in (JSON, MSGPACK, ARROW):
+            return mt
+    return JSON
+
+def dumps(obj) -> bytes:
+    try:
+        import orjson
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    except ImportError:
+        return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+def json_response(obj) -> Response:
+    return Response(content=dumps(obj), media_type=JSON)
+
+def msgpack_response(obj) -> Response:
+    try:
+        import msgpack
+    except ImportError:
+        raise HTTPException(status_code=406, detail="msgpack not installed on server")
+    return Response(content=msgpack.packb(obj, use_bin_type=True), media_type=MSGPACK)
+
+def arrow_response(columns: dict, metadata: dict | None = None) -> Response:
+    """columns: {列名: 等长列表或 ndarray}；metadata 以 JSON 字符串存入 schema 元数据。"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise HTTPException(status_code=406, detail="pyarrow not installed on server")
+    table = pa.table(columns)
+    if metadata:
+        table = table.replace_schema_metadata({k: json.dumps(v, ensure_ascii=False) for k, v in metadata.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW)
+
+def columnar_response(fmt: str, columns: dict, metadata: dict | None = None) -> Response:
+    """列式数据按协商结果输出；JSON 同样输出列式（调用方需要逐行格式时自行转换）。"""
+    if fmt == ARROW:
+        return arrow_response(columns, metadata)
+    payload = {**(metadata or {}), **columns}
+    return msgpack_response(payload) if fmt == MSGPACK else json_response(payload)
@@ -1,13 +1,67 @@
-import ccxt
 from typing import Dict
-EX_MAP: Dict[str, type] = {
-    "binance": ccxt.binance,
-    "okx": ccxt.okx,
-    "bitget": ccxt.bitget,
+from .metrics import instrument_exchange
+# 交易所名 → ccxt 类名；ccxt 导入很慢（会加载上百个交易所类），首次 get_exchange 时才导入
+EX_MAP: Dict[str, str] = {
+    "binance": "binance",
+    "okx": "okx",
+    "bitget": "bitget",
+}
+# 单次 fetch_ohlcv 能返回的最大K线根数（超出部分交易所会静默截断）
+MAX_OHLCV_PER_CALL: Dict[str, int] = {
+    "binance": 1000,
+    "okx": 300,
+    "bitget": 1000,
 }
 def get_exchange(name: str, proxies: dict | None = None):
     name = (name or "okx").lower()
     if name not in EX_MAP:
         raise ValueError(f"unsupported exchange: {name}")
-    klass = EX_MAP[name]
-    return klass({"enableRateLimit": True, "proxies": proxies or None})
+    import ccxt
+    klass = getattr(ccxt, EX_MAP[name])
+    return instrument_exchange(klass({"enableRateLimit": True, "proxies": proxies or None}))
+
+# 异步实例按 (交易所, 代理) 进程内共享：市场元数据只加载一次，aiohttp 连接池复用；关闭时统一释放
+_ASYNC: dict[tuple, object] = {}
+
+def get_async_exchange(name: str, proxies: dict | None = None):
+    name = (name or "okx").lower()
+    if name not in EX_MAP:
+        raise ValueError(f"unsupported exchange: {name}")
+    key = (name, tuple(sorted((proxies or {}).items())))
+    ex = _ASYNC.get(key)
+    if ex is None:
+        import ccxt.async_support as accxt
+        cfg = {"enableRateLimit": True}
+        proxy = (proxies or {}).get("https") or (proxies or {}).get("http")
+        if proxy:
+            cfg["aiohttp_proxy"] = proxy
+        ex = _ASYNC[key] = instrument_exchange(getattr(accxt, EX_MAP[name])(cfg))
+    return ex
+
+async def close_async_exchanges() -> None:
+    while _ASYNC:
+        _, ex = _ASYNC.popitem()
+        try:
+            await ex.close()
+        except Exception:
+            pass
+def max_ohlcv_per_call(name: str | None) -> int:
+    return MAX_OHLCV_PER_CALL.get((name or "").lower(), 300)
+
+# 带 since 回溯较早K线时，超出“近期”窗口后 ccxt 改走历史接口，单次上限更小：
+# okx 回溯超过 1440 根走 history-candles（100 根/次）；bitget 回溯超过 maxDaysPerTimeframe 天走 history-candles（200 根/次）
+HISTORY_OHLCV_PER_CALL: Dict[str, int] = {
+    "okx": 100,
+    "bitget": 200,
+}
+
+def ohlcv_history_border(ex, tf: str, tf_ms: int) -> int | None:
+    """回溯超过多少根后改走历史接口（留一根余量）；None 表示没有这种切换。"""
+    name = (getattr(ex, "id", None) or "").lower()
+    if name == "okx":
+        return 1439 - 1
+    if name == "bitget":
+        days = ((getattr(ex, "options", None) or {}).get("fetchOHLCV", {})
+                .get("maxDaysPerTimeframe", {}).get(tf, 30))
+        return days * 86_400_000 // tf_ms - 1
+    return None
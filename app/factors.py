@@ -0,0 +1,159 @@
+"""
+外部因子（催化剂 / 链上）：可插拔的异步数据源，筛选时对全体候选整批拉取。
+- 每个数据源对应一个因子，返回 {symbol: 0~100 分}；结果按数据源各自的 TTL 写入 Redis（fx:{因子}:{symbol}），只拉未命中的币对
+- 整体限时 FACTOR_TIMEOUT 秒：超时或出错的数据源记中性分，拉取在后台继续并写缓存，下一次筛选即可命中；
+  进行中的拉取按币对登记，并发的筛选只等待覆盖自己币对的那些，其余未命中的币对另起拉取
+- FACTOR_PROVIDERS 配置，如 "catalyst=file:/data/catalyst.json,onchain=http://host:8000/onchain.json"；
+  未配置的因子保持中性分，打分结果与不接数据源时一致
+- 离线调试：file: 读本地 JSON；http 数据源对静态 JSON 同样适用（python -m http.server 即可充当）
+"""
+from __future__ import annotations
+import asyncio, contextvars, json, logging, pathlib
+from abc import ABC, abstractmethod
+from .cache import amget_json, amset_json
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+NEUTRAL = 60.0
+FACTORS = ("catalyst", "onchain")
+HTTP_CHUNK = 200
+
+class FactorProvider(ABC):
+    """数据源基类：子类实现 fetch(symbols) -> {symbol: 分数}，拿不到的币对不返回（记中性分）。"""
+    def __init__(self, factor: str, ttl: int | None = None):
+        self.factor = factor
+        self.ttl = ttl if ttl is not None else settings.FACTOR_TTL.get(factor, 300)
+
+    @abstractmethod
+    async def fetch(self, symbols: list[str]) -> dict[str, float]:
+        ...
+
+def _lookup(data: dict, symbols: list[str]) -> dict[str, float]:
+    """数据可按币对（BTC/USDT）或基础币（BTC）给分；非数值忽略，分数截到 0~100。"""
+    out = {}
+    for s in symbols:
+        v = data.get(s, data.get(s.split("/")[0]))
+        try:
+            out[s] = min(100.0, max(0.0, float(v)))
+        except (TypeError, ValueError):
+            continue
+    return out
+
+class FileProvider(FactorProvider):
+    """本地 JSON 文件 {symbol 或基础币: 分数}；每次拉取重新读文件，手工改分后等缓存过期即生效。"""
+    def __init__(self, factor: str, path: str, ttl: int | None = None):
+        super().__init__(factor, ttl)
+        self.path = pathlib.Path(path)
+
+    async def fetch(self, symbols: list[str]) -> dict[str, float]:
+        data = await asyncio.to_thread(lambda: json.loads(self.path.read_text("utf-8")))
+        return _lookup(data, symbols)
+
+class HttpProvider(FactorProvider):
+    """GET url?symbols=A,B,... 返回 JSON {symbol 或基础币: 分数}；每 HTTP_CHUNK 个币对一个请求，并发发出。"""
+    def __init__(self, factor: str, url: str, ttl: int | None = None):
+        super().__init__(factor, ttl)
+        self.url = url
+
+    def _get(self, chunk: list[str]) -> dict:
+        import requests
+        r = requests.get(self.url, params={"symbols": ",".join(chunk)}, timeout=settings.FACTOR_TIMEOUT + 5)
+        r.raise_for_status()
+        return r.json()
+
+    async def fetch(self, symbols: list[str]) -> dict[str, float]:
+        chunks = [symbols[i:i + HTTP_CHUNK] for i in range(0, len(symbols), HTTP_CHUNK)]
+        res = await asyncio.gather(*(asyncio.to_thread(self._get, c) for c in chunks))
+        out = {}
+        for c, data in zip(chunks, res):
+            out.update(_lookup(data, c))
+        return out
+
+def _from_spec(factor: str, spec: str) -> FactorProvider:
+    if spec.startswith("file:"):
+        return FileProvider(factor, spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return HttpProvider(factor, spec)
+    raise ValueError(f"unknown factor provider for {factor}: {spec}")
+
+_providers: dict[str, FactorProvider] | None = None
+
+def providers() -> dict[str, FactorProvider]:
+    """{因子: 数据源}；首次调用时按 FACTOR_PROVIDERS 创建，配置有误的项记日志后跳过。"""
+    global _providers
+    if _providers is None:
+        _providers = {}
+        for factor, spec in settings.FACTOR_PROVIDERS.items():
+            if factor not in FACTORS:
+                log.warning("unknown factor %s ignored", factor)
+                continue
+            try:
+                _providers[factor] = _from_spec(factor, spec)
+            except ValueError as e:
+                log.warning("%s", e)
+    return _providers
+
+def register(provider: FactorProvider) -> None:
+    """代码里接入数据源（覆盖同一因子的配置项）。"""
+    providers()[provider.factor] = provider
+
+# ---------- 整批拉取 ----------
+_inflight: dict[str, dict[str, asyncio.Task]] = {}  # 因子 -> {symbol: 覆盖该币对的进行中拉取}
+
+def _key(factor: str, symbol: str) -> str:
+    return f"fx:{factor}:{symbol}"
+
+async def _fetch_store(p: FactorProvider, symbols: list[str]) -> dict[str, float]:
+    got = await p.fetch(symbols)
+    # 数据源没给分的币对也按中性分缓存，TTL 内不重复询问
+    await amset_json({_key(p.factor, s): got.get(s, NEUTRAL) for s in symbols}, p.ttl)
+    return got
+
+def _done(factor: str, symbols: list[str], task: asyncio.Task) -> None:
+    running = _inflight.get(factor, {})
+    for s in symbols:
+        if running.get(s) is task:
+            del running[s]
+    if not task.cancelled() and task.exception() is not None:
+        log.warning("factor %s fetch failed: %s", factor, task.exception())
+
+async def _one(p: FactorProvider, symbols: list[str], deadline: float) -> dict[str, float]:
+    loop = asyncio.get_running_loop()
+    cached = await amget_json([_key(p.factor, s) for s in symbols])
+    vals = {s: v for s, v in zip(symbols, cached) if v is not None}
+    miss = [s for s in symbols if s not in vals]
+    if not miss:
+        return vals
+    running = _inflight.setdefault(p.factor, {})
+    tasks = {running[s] for s in miss if s in running}
+    new = [s for s in miss if s not in running]
+    if new:
+        # 后台任务不继承请求上下文，也不随请求取消：超时后继续跑完并写缓存
+        task = loop.create_task(_fetch_store(p, new), context=contextvars.Context())
+        running.update((s, task) for s in new)
+        task.add_done_callback(lambda t, f=p.factor, ss=new: _done(f, ss, t))
+        tasks.add(task)
+    # asyncio.wait 超时不会取消任务
+    done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - loop.time()))
+    if pending:
+        log.warning("factor %s timed out, using neutral score for some of %d symbols", p.factor, len(miss))
+    for t in done:
+        if not t.cancelled() and t.exception() is None:  # 失败已由 _done 记日志
+            got = t.result()
+            vals.update((s, got[s]) for s in miss if s in got)
+    return vals
+
+async def factor_scores(symbols: list[str]) -> dict[str, dict[str, float]]:
+    """{symbol: {因子: 分数}}；未配置、超时或没给分的因子不出现，打分时按中性分处理。"""
+    provs = providers()
+    if not provs or not symbols:
+        return {}
+    syms = list(dict.fromkeys(symbols))
+    deadline = asyncio.get_running_loop().time() + settings.FACTOR_TIMEOUT
+    res = await asyncio.gather(*(_one(p, syms, deadline) for p in provs.values()))
+    out: dict[str, dict[str, float]] = {}
+    for p, vals in zip(provs.values(), res):
+        for s, v in vals.items():
+            out.setdefault(s, {})[p.factor] = v
+    return out
@@ -1,27 +1,16 @@
 from fastapi import APIRouter, Request
-import json, pathlib, re
+import asyncio, contextvars, hashlib, json, logging, re
 from typing import List
-from .feishu_utils import parse_event, reply_md, get_tenant_access_token
-from .exchanges import get_exchange
-from .market import fetch_ohlcv_df
-import requests
+from .config import settings
+from .feishu_utils import parse_event, reply_md, get_tenant_access_token, claim_event, rate_hit
+from .metrics import FEISHU_SECONDS, FEISHU_DROPPED
+from .cache import get_json, set_json, delete as cache_delete
+from .risk_cache import current_bar_ts
+from .advice import (load_holdings as _load, save_holdings as _save, advice_md as _advice_md,
+                     current_advice, render_advice, subscribe, unsubscribe, reset_actions)
 
 router = APIRouter(prefix="/feishu", tags=["feishu"])
-
-DATA_DIR = pathlib.Path("/data")
-HOLD_DIR = DATA_DIR / "holdings"
-HOLD_DIR.mkdir(parents=True, exist_ok=True)
-
-def _user_file(uid: str) -> pathlib.Path:
-    return HOLD_DIR / (uid + ".json")
-
-def _load(uid: str) -> List[dict]:
-    p = _user_file(uid)
-    if not p.exists(): return []
-    return json.loads(p.read_text("utf-8"))
-
-def _save(uid: str, items: List[dict]):
-    _user_file(uid).write_text(json.dumps(items, ensure_ascii=False, indent=2), "utf-8")
+log = logging.getLogger(__name__)
 
 def _parse_hold_lines(txt: str) -> List[dict]:
     items=[]
@@ -38,44 +27,27 @@ def _parse_hold_lines(txt: str) -> List[dict]:
                       "stop_loss_pct": sl, "take_profit_pct": tp})
     return items
 
-def _advice_md(items: List[dict]) -> str:
-    if not items: return "**风控建议**\n- 暂无持仓。"
-    ex = get_exchange("okx", None)
-    ticks = ex.fetch_tickers()
-    lines = ["**风控建议（仅供参考）**\n"]
-    for h in items:
-        sym=h["symbol"]; entry=float(h["entry_price"]); qty=float(h["qty"])
-        slp=float(h.get("stop_loss_pct",8.0)); tpp=float(h.get("take_profit_pct",12.0))
-        t = ticks.get(sym) or {}
-        last = t.get("last") or ex.fetch_ticker(sym).get("last")
-        df = fetch_ohlcv_df(ex, sym, "1h", 200)
-        ma50 = df["close"].rolling(50).mean().iloc[-1]
-        ma200 = df["close"].rolling(200).mean().iloc[-1] if len(df)>=200 else None
-        slp_price = entry*(1-slp/100); tpp_price = entry*(1+tpp/100)
-        pnl = (last-entry)/entry*100 if (last and entry) else None
-
-        if last <= slp_price:
-            action="卖出"; reason="触发止损，优先保护本金"
-        elif last >= tpp_price:
-            action="分批止盈"; reason="达到止盈目标，建议分批落袋"
-        else:
-            action="观察"; reasons=[]
-            if last<ma50:
-                action="减仓"; reasons.append(f"跌破MA50≈{ma50:.4f}")
-            if ma200 and last<ma200:
-                action="减仓"; reasons.append(f"低于MA200≈{ma200:.4f}")
-            reason = "；".join(reasons) if reasons else "趋势未变，继续跟踪"
-
-        lines.append(
-          f"- **{sym}**  现价:{last}  盈亏:{pnl:.2f}%  "
-          f"止损:{slp_price:.4f}  止盈:{tpp_price:.4f}  MA50:{ma50:.4f}"
-          + (f"  MA200:{ma200:.4f}" if ma200 else "") +
-          f"\n  建议：**{action}**；{reason}"
-        )
-    return "\n".join(lines)
+def _advice_key(uid: str) -> str:
+    return f"advice:{uid}"
+
+def _advice_for(uid: str, items: List[dict]) -> str:
+    """
+    带缓存的 _advice_md：按 (持仓哈希, 当前1h K线开盘时间) 校验，ADVICE_CACHE_TTL 内重复 /advice 直接返回；
+    持仓变化、新K线开始或 /holdings set|clear 主动失效后重新计算。
+    """
+    if not items or settings.ADVICE_CACHE_TTL <= 0:
+        return _advice_md(items)
+    tag = {"h": hashlib.sha1(json.dumps(items, sort_keys=True).encode()).hexdigest()[:16], "bar": current_bar_ts()}
+    hit = get_json(_advice_key(uid))
+    if hit and hit.get("h") == tag["h"] and hit.get("bar") == tag["bar"]:
+        return hit["md"]
+    md = _advice_md(items)
+    set_json(_advice_key(uid), settings.ADVICE_CACHE_TTL, {**tag, "md": md})
+    return md
 
 def _reply_test_card(message_id: str):
     """发送一张带按钮的交互卡片；按钮回传 value={'cmd':'ping'}"""
+    import requests
     token = get_tenant_access_token()
     url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}/reply"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json; charset=utf-8"}
@@ -96,7 +68,8 @@ def _reply_test_card(message_id: str):
             ]
         }
     }
-    requests.post(url, headers=headers, data=json.dumps(card), timeout=10)
+    with FEISHU_SECONDS.labels("reply").time():
+        requests.post(url, headers=headers, data=json.dumps(card), timeout=10)
 
 @router.post("/callback")
 async def feishu_callback(req: Request):
@@ -106,7 +79,26 @@ async def feishu_callback(req: Request):
         return {"challenge": parsed["challenge"]}
 
     ev = parsed["event"] or {}
+    # 飞书认为回调超时会重试同一事件：按事件 ID（缺省用消息 ID）去重，重复的直接丢弃，不做任何处理
+    event_id = parsed.get("event_id") or (ev.get("message") or {}).get("message_id")
+    if event_id and not await claim_event(event_id):
+        FEISHU_DROPPED.labels("duplicate").inc()
+        return {"code":0}
+    # 立即应答，处理放到后台线程：拉行情/读写文件/回复消息都是阻塞调用，不占事件循环，也不会让飞书等到超时重试
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(_dispatch, ev), context=contextvars.Context())
+    _tasks.add(task)
+    task.add_done_callback(_dispatch_done)
+    return {"code":0}
+
+_tasks: set[asyncio.Task] = set()
+
+def _dispatch_done(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.warning("feishu handler failed: %r", task.exception())
 
+def _dispatch(ev: dict) -> None:
+    """处理一条回调事件（在线程中执行）。"""
     # —— 分支1：卡片按钮回传（card.action.trigger）——
     if ev.get("type") == "card.action.trigger" or "action" in ev:
         val = (ev.get("action") or {}).get("value") or {}
@@ -115,7 +107,7 @@ async def feishu_callback(req: Request):
         msg_id = ev.get("open_message_id") or (ev.get("message") or {}).get("message_id")
         if cmd == "ping" and msg_id:
             reply_md(msg_id, "pong ✅", "回传确认")
-        return {"code":0}
+        return
 
     # —— 分支2：文本消息（im.message.receive_v1）——
     msg = ev.get("message", {})
@@ -128,14 +120,22 @@ async def feishu_callback(req: Request):
         text = ""
 
     if not text or not user_id:
-        return {"code":0}
+        return
+
+    # 每用户限频：超限的命令丢弃，只在刚超限时提示一次
+    n = rate_hit(user_id)
+    if n > settings.FEISHU_RATE_LIMIT:
+        FEISHU_DROPPED.labels("rate_limited").inc()
+        if n == settings.FEISHU_RATE_LIMIT + 1:
+            reply_md(message_id, "⚠️ 操作过于频繁，请稍后再试。", "提示")
+        return
 
     t = text.strip()
     low = t.lower()
 
     if low.startswith("/testcard"):
         _reply_test_card(message_id)
-        return {"code":0}
+        return
 
     if low.startswith("/help"):
         reply_md(message_id,
@@ -144,43 +144,62 @@ async def feishu_callback(req: Request):
                  "`/holdings set` 多行：`币对 价格 数量 [止损% 止盈%]`\n"
                  "`/holdings list` 查看我的持仓\n"
                  "`/holdings clear confirm` 清空我的持仓\n"
-                 "`/advice` 获取我的即时建议\n\n"
+                 "`/advice` 获取我的即时建议\n"
+                 "`/subscribe` 订阅：每小时K线收盘后，持仓建议有变化时主动推送\n"
+                 "`/unsubscribe` 取消订阅\n\n"
                  "示例：\n/holdings set\nBTC/USDT 60000 0.12 8 12\nSOL/USDT 165.3 20")
-        return {"code":0}
+        return
 
     if low.startswith("/holdings clear"):
         if "confirm" in low:
             _save(user_id, [])
+            cache_delete(_advice_key(user_id))
+            reset_actions(user_id)
             reply_md(message_id, "✅ 已清空你的持仓。", "持仓管理")
         else:
             reply_md(message_id, "⚠️ 确认清空请发送：`/holdings clear confirm`", "持仓管理")
-        return {"code":0}
+        return
 
     if low.startswith("/holdings list"):
         items = _load(user_id)
         if not items:
             reply_md(message_id, "你当前没有持仓记录。用 `/holdings set` 添加。", "持仓管理")
-            return {"code":0}
+            return
         lines = ["**你的持仓**\n"]
         for h in items:
             lines.append(f"- {h['symbol']}  价格:{h['entry_price']}  数量:{h['qty']}  止损%:{h.get('stop_loss_pct',8)}  止盈%:{h.get('take_profit_pct',12)}")
         reply_md(message_id, "\n".join(lines), "持仓管理")
-        return {"code":0}
+        return
 
     if low.startswith("/holdings set"):
         payload = t.split("\n",1)[1] if "\n" in t else ""
         items = _parse_hold_lines(payload)
         if not items:
             reply_md(message_id, "未解析到任何持仓。\n格式：每行 `币对 价格 数量 [止损% 止盈%]`，可用逗号或空格分隔。", "持仓管理")
-            return {"code":0}
+            return
         _save(user_id, items)
-        reply_md(message_id, "✅ 已更新你的持仓（共 {} 条）。\n\n{}".format(len(items), _advice_md(items)), "持仓已更新")
-        return {"code":0}
+        cache_delete(_advice_key(user_id))
+        reset_actions(user_id)
+        reply_md(message_id, "✅ 已更新你的持仓（共 {} 条）。\n\n{}".format(len(items), _advice_for(user_id, items)), "持仓已更新")
+        return
 
     if low.startswith("/advice"):
         items = _load(user_id)
-        reply_md(message_id, _advice_md(items), "我的风控建议")
-        return {"code":0}
+        reply_md(message_id, _advice_for(user_id, items), "我的风控建议")
+        return
+
+    if low.startswith("/subscribe"):
+        items = _load(user_id)
+        rows = current_advice(items) if items else []
+        subscribe(user_id, {r["symbol"]: r["action"] for r in rows})
+        md = render_advice(rows) if rows else "你当前没有持仓记录，用 `/holdings set` 添加后即可收到推送。"
+        reply_md(message_id, "✅ 已订阅：每小时K线收盘后，持仓建议有变化时会主动通知你。\n\n" + md, "订阅管理")
+        return
+
+    if low.startswith("/unsubscribe"):
+        done = unsubscribe(user_id)
+        reply_md(message_id, "✅ 已取消订阅。" if done else "你当前没有订阅。", "订阅管理")
+        return
 
     reply_md(message_id, "指令未识别，发送 `/help` 查看用法。", "帮助")
-    return {"code":0}
+    return
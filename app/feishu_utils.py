@@ -1,34 +1,80 @@
-import os, json, requests
+import os, json, time
 from typing import Any, Dict
+from .config import settings
+from .metrics import FEISHU_SECONDS
+from .cache import client, get_json, set_json, aclient
 
 APP_ID = os.getenv("FEISHU_APP_ID", "")
 APP_SECRET = os.getenv("FEISHU_APP_SECRET", "")
 VERIFICATION_TOKEN = os.getenv("FEISHU_VERIFICATION_TOKEN", "")
+WEBHOOK = os.getenv("FEISHU_WEBHOOK", "").strip()
+
+TOKEN_KEY = "feishu:tenant_token"
 
 def get_tenant_access_token() -> str:
+    """tenant_access_token 有效期约 2 小时，经 Redis 在各 worker 间共用，提前 5 分钟过期重取。"""
+    import requests
+    hit = get_json(TOKEN_KEY)
+    if hit:
+        return hit
     url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-    r = requests.post(url, json={"app_id": APP_ID, "app_secret": APP_SECRET}, timeout=10).json()
+    with FEISHU_SECONDS.labels("token").time():
+        r = requests.post(url, json={"app_id": APP_ID, "app_secret": APP_SECRET}, timeout=10).json()
     if r.get("code") != 0:
         raise RuntimeError(f"get token failed: {r}")
+    ttl = int(r.get("expire") or 7200) - 300
+    if ttl > 0:
+        set_json(TOKEN_KEY, ttl, r["tenant_access_token"])
     return r["tenant_access_token"]
 
+def _md_card(md: str, title: str) -> dict:
+    return {
+        "config": {"wide_screen_mode": True},
+        "header": {"title": {"tag": "plain_text", "content": title}},
+        "elements": [
+            {"tag":"div","text":{"tag":"lark_md","content": md}},
+            {"tag":"hr"},
+            {"tag":"note","elements":[{"tag":"lark_md","content":"*非投资建议*"}]}
+        ]
+    }
+
 def reply_md(message_id: str, md: str, title: str = "Crypto Agent"):
+    import requests
     token = get_tenant_access_token()
     url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}/reply"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json; charset=utf-8"}
-    card = {
-        "msg_type": "interactive",
-        "card": {
-            "config": {"wide_screen_mode": True},
-            "header": {"title": {"tag": "plain_text", "content": title}},
-            "elements": [
-                {"tag":"div","text":{"tag":"lark_md","content": md}},
-                {"tag":"hr"},
-                {"tag":"note","elements":[{"tag":"lark_md","content":"*非投资建议*"}]}
-            ]
-        }
-    }
-    requests.post(url, headers=headers, data=json.dumps(card), timeout=10)
+    card = {"msg_type": "interactive", "card": _md_card(md, title)}
+    with FEISHU_SECONDS.labels("reply").time():
+        requests.post(url, headers=headers, data=json.dumps(card), timeout=10)
+
+def send_md(receive_id: str, md: str, title: str = "Crypto Agent", id_type: str = "user_id"):
+    """主动发消息给用户（无需 message_id，用于订阅推送）；receive_id 默认为 user_id。"""
+    import requests
+    token = get_tenant_access_token()
+    url = f"https://open.feishu.cn/open-apis/im/v1/messages?receive_id_type={id_type}"
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json; charset=utf-8"}
+    body = {"receive_id": receive_id, "msg_type": "interactive",
+            "content": json.dumps(_md_card(md, title), ensure_ascii=False)}
+    with FEISHU_SECONDS.labels("send").time():
+        r = requests.post(url, headers=headers, json=body, timeout=10)
+    try: res = r.json()
+    except Exception: res = {}
+    if not (r.status_code < 300 and res.get("code", 0) == 0):
+        raise RuntimeError(f"Feishu error: {r.status_code} {str(res)[:200]}")
+
+def push_webhook_md(md: str, title: str = "Crypto Agent", webhook: str | None = None):
+    """通过群机器人 Webhook 推送卡片（无需 message_id，用于主动提醒）。"""
+    import requests
+    url = webhook or WEBHOOK
+    if not url:
+        raise RuntimeError("FEISHU_WEBHOOK not set")
+    card = {"msg_type": "interactive", "card": _md_card(md, title)}
+    with FEISHU_SECONDS.labels("webhook").time():
+        r = requests.post(url, json=card, timeout=10)
+    try: body = r.json()
+    except Exception: body = {}
+    if not (r.status_code < 300 and body.get("code", 0) == 0):
+        raise RuntimeError(f"Feishu error: {r.status_code} {str(body)[:200]}")
 
 def parse_event(body: Dict[str, Any]) -> Dict[str, Any]:
     # 1) URL 验证：直接回 challenge（无需校验 token）
@@ -40,5 +86,31 @@ def parse_event(body: Dict[str, Any]) -> Dict[str, Any]:
     if VERIFICATION_TOKEN and token_in != VERIFICATION_TOKEN:
         raise RuntimeError("invalid verification token")
 
-    # 3) 事件体（v2 为 event 字段）
-    return {"type":"event", "event": body.get("event", {})}
+    # 3) 事件体（v2 为 event 字段）；事件 ID：v2 在 header.event_id，v1 为顶层 uuid（飞书重试时不变）
+    event_id = (body.get("header") or {}).get("event_id") or body.get("uuid")
+    return {"type":"event", "event": body.get("event", {}), "event_id": event_id}
+
+# ---------- 回调去重与限频（Redis，跨 worker 生效；Redis 不可用时放行） ----------
+async def claim_event(event_id: str) -> bool:
+    """SET NX 占用事件 ID：首次返回 True，飞书重试或重复投递返回 False。"""
+    from redis import RedisError
+    try:
+        return bool(await aclient().set(f"feishu:evt:{event_id}", 1, nx=True, ex=settings.FEISHU_DEDUP_TTL))
+    except RedisError:
+        return True
+
+def rate_hit(user_id: str) -> int:
+    """固定窗口计数：返回该用户本窗口内的第几条命令（未启用或 Redis 不可用时返回 0）。"""
+    from redis import RedisError
+    if settings.FEISHU_RATE_LIMIT <= 0:
+        return 0
+    window = settings.FEISHU_RATE_WINDOW
+    key = f"feishu:rl:{user_id}:{int(time.time()) // window}"
+    try:
+        pipe = client().pipeline(transaction=False)
+        pipe.incr(key)
+        pipe.expire(key, window + 5)
+        n, _ = pipe.execute()
+        return int(n)
+    except RedisError:
+        return 0
@@ -0,0 +1,56 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 胜率增强（strict）过滤：均基于已拉取的K线，返回 (ok, reason)
+STRICT_FILTERS = ("trend", "4h", "volume")
+
+def trend_chain_daily(df: pd.DataFrame | None) -> tuple[bool, str]:
+    """日线：Close > MA50 > MA200 且 MA50 上行"""
+    if df is None or len(df) < 205:
+        return False, "数据不足(日线)"
+    close = df["close"]
+    ma50 = close.rolling(50).mean()
+    ma200 = close.rolling(200).mean()
+    last, m50, m200 = float(close.iloc[-1]), float(ma50.iloc[-1]), float(ma200.iloc[-1])
+    ma50_up = float(ma50.iloc[-1]) > float(ma50.iloc[-2])
+    ok = last > m50 > m200 and ma50_up
+    return ok, ("OK" if ok else "未满足 Close>MA50>MA200 或 MA50未上行")
+
+def confirm_4h_ema200(df: pd.DataFrame | None) -> tuple[bool, str]:
+    """4小时：Close > EMA200 且 EMA200 上行"""
+    if df is None or len(df) < 210:
+        return False, "数据不足(4h)"
+    close = df["close"]
+    ema200 = close.ewm(span=200, adjust=False).mean()
+    ok = float(close.iloc[-1]) > float(ema200.iloc[-1]) and float(ema200.iloc[-1]) > float(ema200.iloc[-2])
+    return ok, ("OK" if ok else "未满足 Close>EMA200 或 EMA200未上行")
+
+def volume_persist(df: pd.DataFrame | None, n: int = 20, at_least: int = 2, m: int = 3) -> tuple[bool, str]:
+    """最近 m 天里至少 at_least 天的成交量 > 前 n 日均量（以当天之前的均量为基准，避免未来函数）"""
+    if df is None or len(df) < n + m + 1:
+        return False, "数据不足(量能)"
+    vol = df["volume"]
+    prev_sma = vol.rolling(n).mean().shift(1)
+    ok_cnt = int((vol.tail(m) > prev_sma.tail(m)).sum())
+    ok = ok_cnt >= at_least
+    return ok, (f"近{m}日有{ok_cnt}日量能>均量{n}日" + ("" if ok else "（不足）"))
+
+def apply_strict(frames: dict[str, pd.DataFrame], enabled: tuple[str, ...] = STRICT_FILTERS) -> dict:
+    """
+    对单个标的执行 strict 过滤。
+    frames: {"1d": 日线, "4h": 4小时线}
+    返回 {"passed": bool, "checks": {name: {"ok": bool, "reason": str}}}
+    """
+    checks = {}
+    if "trend" in enabled:
+        ok, why = trend_chain_daily(frames.get("1d"))
+        checks["trend"] = {"ok": ok, "reason": why}
+    if "4h" in enabled:
+        ok, why = confirm_4h_ema200(frames.get("4h"))
+        checks["4h"] = {"ok": ok, "reason": why}
+    if "volume" in enabled:
+        ok, why = volume_persist(frames.get("1d"))
+        checks["volume"] = {"ok": ok, "reason": why}
+    return {"passed": all(c["ok"] for c in checks.values()), "checks": checks}
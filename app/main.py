@@ -1,126 +1,476 @@
-import os, json, time, pathlib
+import os, json, time, pathlib, threading, logging, asyncio, hashlib
+from contextlib import asynccontextmanager
 from typing import List
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Header
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import redis
 
-from .models import KlineQuery, SnapshotQuery, ScreenDailyQuery, Holding
+from .models import KlineQuery, KlineBatchQuery, SnapshotQuery, ScreenDailyQuery, Holding
 from .config import settings
-from .exchanges import get_exchange
-from .scoring import total_score, decide_action_cn
-from .risk_logic import compute_dynamic_advice
-from .market import fetch_ohlcv_df
+from .exchanges import EX_MAP, get_exchange, get_async_exchange, close_async_exchanges
+from .scoring import spread_limit, cross_sectional_weights, decide_action_cn
+from .xsection import FEATURES as XS_FEATURES, features as xs_features, percentile_ranks as xs_percentile_ranks
+from .factors import factor_scores
+from .topn import TopN, ScoreSummary
+from .score_pool import score_candidates, warm as warm_score_pool, shutdown as shutdown_score_pool
+from .risk_logic import advice_from_inputs
+from .risk_cache import aget_risk_inputs
+from .market import afetch_candles, afetch_ohlcv_multi
+from .candles import columns_to_records
+from .encoding import (negotiate, json_response, msgpack_response, arrow_response, columnar_response,
+                       JSON, MSGPACK, ARROW)
+from .shared import (aload_markets_shared, afetch_tickers_shared, afetch_candles_shared,
+                     run_refresher)
+from .filters import apply_strict, STRICT_FILTERS
+from .cache import (acached, amget_json, amset_json, aclient as cache_aclient,
+                    aclose as cache_aclose)
+from .metrics import timed, render as render_metrics, REQUEST_SECONDS
+from .profiling import (PROFILE_REQUEST, PROFILES, profiled, wants_profile,
+                        new_profile_id, get_profile, is_admin)
 from .feishu_router import router as feishu_router  # ← 飞书路由
 
 DATA_DIR = pathlib.Path("/data")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 HOLDINGS_FILE = DATA_DIR / "holdings.json"
 
-app = FastAPI(title="Crypto Agent Data Hub", version="0.4.1")
+log = logging.getLogger(__name__)
+
+# ---------- 冷启动 ----------
+# 模块导入时不加载 pandas / ccxt / redis / requests，首次使用时才导入；
+# 开启 WARMUP 时，服务开始接受 /health 后由后台任务提前加载（导入放到线程里，不阻塞事件循环），
+# 避免首个业务请求承担导入耗时
+WARM = threading.Event()
+
+async def _warmup():
+    steps = (
+        ("pandas", lambda: asyncio.to_thread(__import__, "pandas")),
+        ("ccxt", lambda: asyncio.to_thread(__import__, "ccxt.async_support")),
+        ("markets", lambda: aload_markets_shared(get_async_exchange(settings.DEFAULT_EXCHANGE, _proxies()))),
+        ("redis", lambda: cache_aclient().ping()),
+        ("requests", lambda: asyncio.to_thread(__import__, "requests")),
+        ("score_pool", warm_score_pool),
+    )
+    for name, fn in steps:
+        try:
+            with timed(f"warmup.{name}"):
+                await fn()
+        except Exception as e:
+            log.warning("warmup %s failed: %s", name, e)
+    WARM.set()
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    warm_task = None
+    if settings.WARMUP:
+        warm_task = asyncio.create_task(_warmup())
+    else:
+        WARM.set()
+    # 每个 worker 都起刷新线程，但只有持有 leader 租约的那个会请求交易所
+    stop = threading.Event()
+    if settings.REFRESH_SEC > 0:
+        venues = settings.REFRESH_VENUES or [settings.DEFAULT_EXCHANGE]
+        threading.Thread(target=run_refresher, name="refresher", daemon=True,
+                         args=(stop, lambda v: get_exchange(v, _proxies()), venues, settings.REFRESH_SEC)).start()
+    # 订阅推送：每个 worker 都在K线收盘时醒来，由 Redis 占位保证每根K线只推一次
+    if settings.ADVICE_PUSH:
+        from .advice import run_pusher
+        threading.Thread(target=run_pusher, name="advice-pusher", daemon=True,
+                         args=(stop, settings.ADVICE_PUSH_DELAY)).start()
+    yield
+    stop.set()
+    if warm_task is not None:
+        warm_task.cancel()
+    # 共享的异步交易所实例与 Redis 连接池在退出时关闭，避免 aiohttp "Unclosed client session"
+    await close_async_exchanges()
+    await cache_aclose()
+    shutdown_score_pool()
+
+app = FastAPI(title="Crypto Agent Data Hub", version="0.4.1", lifespan=_lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 # 注册飞书回调路由
 app.include_router(feishu_router)
 
-r = redis.from_url(settings.REDIS_URL)
-TF_ALIAS = {"1m":"1m","5m":"5m","15m":"15m","1h":"1h","4h":"4h","1d":"1d"}
-
 def _proxies():
     px = {}
     if settings.HTTP_PROXY: px["http"] = settings.HTTP_PROXY
     if settings.HTTPS_PROXY: px["https"] = settings.HTTPS_PROXY
     return px or None
 
-def fetch_ohlcv_df(ex, symbol: str, tf: str, limit: int) -> pd.DataFrame:
-    tf = TF_ALIAS.get(tf, "1h")
-    ohlcv = ex.fetch_ohlcv(symbol, timeframe=tf, limit=limit)
-    df = pd.DataFrame(ohlcv, columns=["ts","open","high","low","close","volume"])
-    df["ts"] = pd.to_datetime(df["ts"], unit="ms")
-    df.set_index("ts", inplace=True)
-    return df
+@app.middleware("http")
+async def _observe_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        resp = await call_next(request)
+        status = resp.status_code
+        return resp
+    finally:
+        # 用路由模板而非原始路径做标签，避免基数膨胀
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.labels(request.method, path, str(status)).observe(time.perf_counter() - t0)
+
+@app.middleware("http")
+async def _profile_opt_in(request: Request, call_next):
+    if not wants_profile(request.headers, request.query_params):
+        return await call_next(request)
+    pid = new_profile_id()
+    token = PROFILE_REQUEST.set(pid)
+    try:
+        resp = await call_next(request)
+    finally:
+        PROFILE_REQUEST.reset(token)
+    resp.headers["X-Profile-Id"] = pid
+    return resp
 
 @app.get("/health")
 def health():
-    return {"ok": True, "ts": int(time.time())}
+    return {"ok": True, "ts": int(time.time()), "warm": WARM.is_set()}
+
+@app.get("/metrics")
+def metrics():
+    body, ctype = render_metrics()
+    return Response(content=body, media_type=ctype)
 
 # ---------- KLINE ----------
+# 三种响应格式按 Accept 协商（见 encoding.py）；缓存统一存列式数据，/kline 与 /kline/batch 共用
 @app.post("/kline")
-def kline(q: KlineQuery):
-    cache_key = f"k:{q.exchange}:{q.symbol}:{q.tf}:{q.limit}"
-    hit = r.get(cache_key)
-    if hit:
-        return json.loads(hit)
+async def kline(q: KlineQuery, accept: str | None = Header(default=None)):
+    async def fill():
+        ex = get_async_exchange(q.exchange, _proxies())
+        await aload_markets_shared(ex)
+        return (await afetch_candles(ex, q.symbol, q.tf, q.limit)).to_columns()
     try:
-        ex = get_exchange(q.exchange, _proxies())
-        df = fetch_ohlcv_df(ex, q.symbol, q.tf, q.limit)
-        payload = df.reset_index().to_dict(orient="records")
-        r.setex(cache_key, 30, json.dumps(payload))
-        return payload
+        cols = await acached(f"kc:{q.exchange}:{q.symbol}:{q.tf}:{q.limit}", 30, fill)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    fmt = negotiate(accept)
+    if fmt == JSON and not q.columnar:
+        return json_response(columns_to_records(cols))
+    return columnar_response(fmt, cols, {"symbol": q.symbol, "tf": q.tf, "exchange": q.exchange})
+
+@app.post("/kline/batch")
+async def kline_batch(q: KlineBatchQuery, accept: str | None = Header(default=None)):
+    """
+    多个 (symbol, tf, limit) 一次返回：缓存命中用一次 MGET 取回，未命中并发拉取后用一个 pipeline 写回。
+    每项为列式数组（ts 为整数毫秒）；单项失败只在该项返回 error。
+    Arrow 格式下各项纵向拼成一张表（附 symbol/tf 列），失败项放在 schema 元数据 errors 中。
+    """
+    keys = [f"kc:{q.exchange}:{it.symbol}:{it.tf}:{it.limit}" for it in q.items]
+    cached = await amget_json(keys)
+    miss = [i for i, c in enumerate(cached) if c is None]
+    fresh = {}
+    if miss:
+        try:
+            ex = get_async_exchange(q.exchange, _proxies())
+            await aload_markets_shared(ex)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        sem = asyncio.Semaphore(settings.SCREEN_CONCURRENCY)
+
+        async def one(it):
+            async with sem:
+                return (await afetch_candles(ex, it.symbol, it.tf, it.limit)).to_columns()
+        res = await asyncio.gather(*(one(q.items[i]) for i in miss), return_exceptions=True)
+        for i, r in zip(miss, res):
+            cached[i] = {"error": str(r)} if isinstance(r, Exception) else r
+            if not isinstance(r, Exception):
+                fresh[keys[i]] = r
+        await amset_json(fresh, 30)
+    fmt = negotiate(accept)
+    if fmt == ARROW:
+        cols = {k: [] for k in ("symbol", "tf", "ts", "open", "high", "low", "close", "volume")}
+        errors = []
+        for it, c in zip(q.items, cached):
+            if "error" in c:
+                errors.append({"symbol": it.symbol, "tf": it.tf, "error": c["error"]})
+                continue
+            n = len(c["ts"])
+            cols["symbol"] += [it.symbol] * n
+            cols["tf"] += [it.tf] * n
+            for k in ("ts", "open", "high", "low", "close", "volume"):
+                cols[k] += c[k]
+        return arrow_response(cols, {"exchange": q.exchange, "errors": errors})
+    payload = {"exchange": q.exchange,
+               "items": [{"symbol": it.symbol, "tf": it.tf, "limit": it.limit, **c} for it, c in zip(q.items, cached)]}
+    return msgpack_response(payload) if fmt == MSGPACK else json_response(payload)
 
 # ---------- SNAPSHOT ----------
+SNAPSHOT_FIELDS = ("last", "bid", "ask", "baseVolume", "quoteVolume")
+
 @app.post("/snapshot")
-def snapshot(q: SnapshotQuery):
+async def snapshot(q: SnapshotQuery, accept: str | None = Header(default=None)):
     res = []
     try:
-        ex = get_exchange(q.exchange, _proxies())
-        tickers = ex.fetch_tickers()
-        for sym in q.symbols:
-            t = tickers.get(sym)
-            if not t: continue
-            res.append({
-                "symbol": sym,
-                "last": t.get("last"),
-                "bid": t.get("bid"),
-                "ask": t.get("ask"),
-                "baseVolume": t.get("baseVolume"),
-                "quoteVolume": t.get("quoteVolume"),
-                "info": t.get("info", {})
-            })
-        return res
+        ex = get_async_exchange(q.exchange, _proxies())
+        await aload_markets_shared(ex)
+        tickers = await afetch_tickers_shared(ex)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    for sym in q.symbols:
+        t = tickers.get(sym)
+        if not t: continue
+        row = {"symbol": sym, **{k: t.get(k) for k in SNAPSHOT_FIELDS}}
+        if q.include_info:
+            row["info"] = t.get("info", {})
+        res.append(row)
+    fmt = negotiate(accept)
+    if fmt == JSON:
+        return json_response(res)
+    # 列式：每个字段一个并行数组；Arrow 不带 info（各交易所 info 结构不一）
+    cols = {k: [r[k] for r in res] for k in ("symbol",) + SNAPSHOT_FIELDS}
+    if q.include_info and fmt == MSGPACK:
+        cols["info"] = [r["info"] for r in res]
+    return columnar_response(fmt, cols, {"exchange": q.exchange})
 
 # ---------- SCREEN DAILY ----------
+async def _fetch_one(ex, sym: str, sem: asyncio.Semaphore):
+    async with sem:
+        with timed("screen.fetch_ohlcv"):
+            return await afetch_candles_shared(ex, sym, "1h", 500)
+
+def _spread_pct(t: dict) -> float | None:
+    bid, ask = t.get("bid"), t.get("ask")
+    if bid and ask and ask > 0:
+        return round((ask - bid) / ask * 100, 4)
+    return None
+
 @app.post("/screen/daily")
-def screen_daily(q: ScreenDailyQuery):
+@profiled("screen_daily")
+async def screen_daily(q: ScreenDailyQuery):
+    """同一查询的结果缓存 SCREEN_CACHE_TTL 秒；过期后先返回上一份并后台重算，多个请求不会同时重算。"""
+    try:
+        if settings.SCREEN_CACHE_TTL <= 0:
+            return await _screen(q)
+        key = "screen:" + hashlib.sha1(q.model_dump_json().encode()).hexdigest()
+        return await acached(key, settings.SCREEN_CACHE_TTL, lambda: _screen(q), stale=settings.SCREEN_CACHE_TTL * 4)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _venues(q: ScreenDailyQuery) -> list[str]:
+    names = q.exchanges or [q.exchange]
+    if "all" in names:
+        names = list(EX_MAP)
+    return list(dict.fromkeys((n or settings.DEFAULT_EXCHANGE).lower() for n in names))
+
+async def _load_venue(name: str) -> dict:
+    """单个交易所的市场、行情与 BTC 基准；各交易所之间并发。"""
+    ex = get_async_exchange(name, _proxies())
+    with timed("screen.load_markets"):
+        markets = await aload_markets_shared(ex)
+    with timed("screen.fetch_tickers"):
+        tick = await afetch_tickers_shared(ex)
+    with timed("screen.fetch_ohlcv"):
+        bench_df = await afetch_candles_shared(ex, "BTC/USDT", "1h", 500)
+    return {"ex": ex, "markets": markets, "tick": tick, "bench": bench_df}
+
+def _dedup_bases(listings: list[tuple[str, str]], venues: dict) -> list[tuple[str, str]]:
+    """
+    同一基础币在多个交易所上市时只保留一家：点差在可接受范围内的优先，其次成交额大，再次点差小。
+    listings 为 (交易所, 币对)，返回保留的 listings（顺序不变）。
+    """
+    limit = spread_limit()
+    best = {}
+    for venue, sym in listings:
+        v = venues[venue]
+        t = v["tick"].get(sym, {})
+        spread = _spread_pct(t)
+        key = (spread is None or spread <= limit, t.get("quoteVolume") or 0, -(spread or 0.0))
+        base = (v["markets"].get(sym) or {}).get("base") or sym.split("/")[0]
+        if base not in best or key > best[base][0]:
+            best[base] = (key, venue, sym)
+    keep = {(venue, sym) for _, venue, sym in best.values()}
+    return [x for x in listings if x in keep]
+
+async def _screen(q: ScreenDailyQuery) -> dict:
+    names = _venues(q)
+    multi = len(names) > 1
+    loaded = await asyncio.gather(*(_load_venue(n) for n in names), return_exceptions=True)
+    venues, venue_errors = {}, {}
+    for n, v in zip(names, loaded):
+        if isinstance(v, BaseException):
+            # 单交易所时照旧报错；多交易所时跳过失败的那家，其余照常筛选
+            if not multi:
+                raise v
+            venue_errors[n] = str(v)
+        else:
+            venues[n] = v
+    if not venues:
+        raise RuntimeError(f"all exchanges failed: {venue_errors}")
+
+    listings = []
+    for n, v in venues.items():
+        syms = q.symbols or [m for m in v["markets"].keys() if m.endswith("/USDT")]
+        listings += [(n, s) for s in syms if not multi or s in v["markets"]]
+    listed = len(listings)
+    if multi:
+        listings = _dedup_bases(listings, venues)
+    # 先按成交额过滤一下规模
+    vol = lambda x: venues[x[0]]["tick"].get(x[1], {}).get("quoteVolume") or 0
+    candidates = sorted(listings, key=vol, reverse=True)[:q.universe]
+
+    # strict 只在总分最高的 SCREEN_STRICT_POOL 个里逐个过滤，其余模式只需保留 topn 个
+    best = TopN(max(q.topn, settings.SCREEN_STRICT_POOL) if q.strict else q.topn)
+    summary = ScoreSummary() if q.diag else None
+    with timed("screen.score"):
+        await _score_batches(venues, candidates, best, summary)
+    scored = best.sorted()
+    out = {"bench": "BTC/USDT", "exchange": q.exchange if not multi else ",".join(venues)}
+    if multi:
+        out["exchanges"] = list(venues)
+    diag = {}
+    if q.strict:
+        with timed("screen.strict"):
+            topn, diag = await _strict_select({n: v["ex"] for n, v in venues.items()}, scored, q)
+        out.update(topn=topn, strict=True)
+    else:
+        out["topn"] = scored
+        diag["filtered_count"] = len(scored)
+    if q.diag:
+        diag.update(raw_count=len(candidates), scored_count=best.count, summary=summary.to_dict())
+        if multi:
+            diag["venues"] = {n: sum(1 for v, _ in candidates if v == n) for n in venues}
+            diag["listed_count"] = listed
+            diag["dedup_dropped"] = listed - len(listings)
+            diag["venue_errors"] = venue_errors
+        out["diag"] = diag
+        if q.strict:
+            out["raw"] = [{k: it[k] for k in ("symbol", "exchange", "score_total", "avg_spread_pct", "action")}
+                          for it in scored[: max(q.topn * 3, 20)]]
+    return out
+
+async def _score_batches(venues: dict, candidates: list[tuple[str, str]],
+                         best: TopN, summary: ScoreSummary | None) -> None:
+    """
+    分批拉取并打分，结果逐个并入 best 堆，每批的K线打完分即释放，峰值内存只与批大小有关。
+    拉取下一批与当前批打分重叠进行；批大小不小于 SCORE_POOL_MIN，候选多时每批都能交给进程池。
+    candidates 为 (交易所, 币对)；各交易所各用一个并发上限，互不占用，多交易所总耗时接近单个。
+    """
+    # 并发拉取K线（交易所限频仍由 ccxt 的 enableRateLimit 控制），单个失败不影响其余
+    sems = {n: asyncio.Semaphore(settings.SCREEN_CONCURRENCY) for n in venues}
+
+    async def fetch(batch: list[tuple[str, str]]) -> dict:
+        res = await asyncio.gather(*(_fetch_one(venues[n]["ex"], sym, sems[n]) for n, sym in batch),
+                                   return_exceptions=True)
+        frames = {n: {} for n in venues}
+        for (n, sym), c in zip(batch, res):
+            if not isinstance(c, BaseException):
+                frames[n][sym] = c
+        return frames
+
+    async def score(n: str, frames: dict) -> list[dict]:
+        tick = venues[n]["tick"]
+        return await score_candidates(frames, venues[n]["bench"], {s: _spread_pct(tick.get(s, {})) for s in frames},
+                                      n, ext)
+
+    # 启用横截面因子时要等全体候选的特征都算出来才能排名：先收集（只留打分结果与特征，K线照样逐批释放），最后统一入堆
+    xs = cross_sectional_weights()
+    held, held_feats = [], []
+    size = max(settings.SCREEN_CONCURRENCY * 4, settings.SCORE_POOL_MIN)
+    batches = [candidates[i:i + size] for i in range(0, len(candidates), size)]
+    # 外部因子整批拉取（限时，超时记中性分），与第一批K线同时进行
+    ext_task = asyncio.ensure_future(factor_scores([sym for _, sym in candidates]))
+    pending = asyncio.ensure_future(fetch(batches[0])) if batches else None
     try:
-        ex = get_exchange(q.exchange, _proxies())
-        markets = ex.load_markets()
-        candidates: List[str] = q.symbols or [m for m in markets.keys() if m.endswith("/USDT")]
-        tick = ex.fetch_tickers()
-        # 先按成交额过滤一下规模
-        candidates = sorted(candidates, key=lambda s: (tick.get(s, {}).get("quoteVolume") or 0), reverse=True)[:120]
-
-        bench_df = fetch_ohlcv_df(ex, "BTC/USDT", "1h", 500)
-        scored = []
-        for sym in candidates:
+        ext = await ext_task
+        for i in range(len(batches)):
+            frames = await pending
+            pending = asyncio.ensure_future(fetch(batches[i + 1])) if i + 1 < len(batches) else None
+            feats = {}
+            if xs:
+                for n, f in frames.items():
+                    if f:
+                        ref = venues[n]["bench"]
+                        rows = xs_features(list(f.values()), int(ref.data[-1, 0]) if len(ref) else None)
+                        feats.update(((n, sym), row) for sym, row in zip(f, rows))
+            results = await asyncio.gather(*(score(n, f) for n, f in frames.items() if f))
+            del frames
+            for it in (x for r in results for x in r):
+                if xs:
+                    held.append(it)
+                    held_feats.append(feats[(it["exchange"], it["symbol"])])
+                    continue
+                best.push(it)
+                if summary is not None:
+                    summary.add(it)
+    finally:
+        ext_task.cancel()
+        if pending is not None:
+            pending.cancel()
+    if xs and held:
+        _apply_cross_sectional(held, held_feats, xs)
+        for it in held:
+            best.push(it)
+        # 总分变了，保留下来的候选按新总分重新给出操作建议（K线读共享缓存，不再请求交易所）
+        await _redecide(venues, best.sorted())
+        if summary is not None:
+            for it in held:
+                summary.add(it)
+
+def _apply_cross_sectional(items: list[dict], feats, weights: dict[str, float]) -> None:
+    """全体候选一次排名，把各横截面因子的百分位（0~100）按权重计入总分。"""
+    ranks = xs_percentile_ranks(feats)
+    cols = {f: ranks[:, j] for j, f in enumerate(XS_FEATURES)}
+    for i, it in enumerate(items):
+        extra = 0.0
+        for f, w in weights.items():
+            r = round(float(cols[f][i]), 2)
+            it[f"score_xs_{f}"] = r
+            extra += r * w
+        it["score_total"] = round(it["score_total"] + extra, 2)
+
+async def _redecide(venues: dict, items: list[dict]) -> None:
+    sem = asyncio.Semaphore(settings.SCREEN_CONCURRENCY)
+
+    async def one(it: dict):
+        c = await _fetch_one(venues[it["exchange"]]["ex"], it["symbol"], sem)
+        it["action"], it["reason"] = decide_action_cn(c, it["score_total"], it["avg_spread_pct"])
+    await asyncio.gather(*(one(it) for it in items), return_exceptions=True)
+
+async def _strict_select(exs: dict, scored: list[dict], q: ScreenDailyQuery) -> tuple[list[dict], dict]:
+    """
+    按总分从高到低对候选执行 strict 过滤，凑满 topn 即停止，
+    只为真正需要判定的标的补拉日线/4h（4h 尽量由 1h 合成）。
+    每轮并发拉取“还差几个”就取几个候选，全部通过时不会多拉。
+    最多检查 topn × SCREEN_STRICT_CHECK_FACTOR 个，达到上限仍未凑满时在 diag 中标出 check_limit_hit。
+    """
+    enabled = tuple(f for f in (STRICT_FILTERS if q.strict_filters is None else q.strict_filters) if f in STRICT_FILTERS)
+    want = {}
+    if "trend" in enabled or "volume" in enabled: want["1d"] = 250
+    if "4h" in enabled: want["4h"] = 220
+    kept = []
+    dropped = {f"dropped_by_{f}": 0 for f in enabled}
+    dropped["dropped_by_other"] = 0
+    checked = 0
+
+    async def frames_for(item):
+        return await afetch_ohlcv_multi(exs[item["exchange"]], item["symbol"], want) if want else {}
+
+    factor = settings.SCREEN_STRICT_CHECK_FACTOR
+    limit = min(len(scored), q.topn * factor) if factor > 0 else len(scored)
+    pos = 0
+    while pos < limit and len(kept) < q.topn:
+        batch = scored[pos: min(pos + q.topn - len(kept), limit)]
+        pos += len(batch)
+        fetched = await asyncio.gather(*(frames_for(it) for it in batch), return_exceptions=True)
+        for item, frames in zip(batch, fetched):
+            checked += 1
             try:
-                df = fetch_ohlcv_df(ex, sym, "1h", 500)
-                s = total_score(sym, df, bench_df)
-                avg_spread = None
-                t = tick.get(sym, {})
-                bid, ask = t.get("bid"), t.get("ask")
-                if bid and ask and ask > 0:
-                    avg_spread = round((ask - bid) / ask * 100, 4)
-                action_cn, reason_cn = decide_action_cn(df, s["score_total"], avg_spread)
-                item = {
-                    "symbol": sym,
-                    "exchange": q.exchange,
-                    "avg_spread_pct": avg_spread,
-                    **s,
-                    "action": action_cn,
-                    "reason": reason_cn,
-                }
-                scored.append(item)
+                if isinstance(frames, BaseException):
+                    raise frames
+                res = apply_strict(frames, enabled)
             except Exception:
+                dropped["dropped_by_other"] += 1
                 continue
-        scored = sorted(scored, key=lambda x: x["score_total"], reverse=True)[: q.topn]
-        return {"topn": scored, "bench": "BTC/USDT", "exchange": q.exchange}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+            for name, c in res["checks"].items():
+                if not c["ok"]:
+                    dropped[f"dropped_by_{name}"] += 1
+            if res["passed"]:
+                kept.append({**item, "strict": res["checks"]})
+    diag = {"checked_count": checked, "filtered_count": len(kept), "filters": list(enabled), **dropped,
+            "check_limit": limit, "check_limit_hit": len(kept) < q.topn and limit < len(scored)}
+    return kept, diag
 
 # ---------- HOLDINGS ----------
 def _read_holdings() -> list[dict]:
@@ -146,68 +496,93 @@ def set_holdings(items: List[Holding]):
 
 # ---------- RISK SCAN（中文口径） ----------
 @app.get("/risk/scan")
-def risk_scan():
+@profiled("risk_scan")
+async def risk_scan():
     items = _read_holdings()
     if not items:
         return {"items": [], "note": "no holdings"}
-    ex = get_exchange("okx", _proxies())
-    tickers = ex.fetch_tickers()
-    out = []
-    for h in items:
-        sym = h.get("symbol")
-        try:
-            entry = float(h.get("entry_price", 0))
-            qty = float(h.get("qty", 0))
-            t = tickers.get(sym) or {}
-            last = t.get("last") or ex.fetch_ticker(sym).get("last")
-            df = fetch_ohlcv_df(ex, sym, "1h", 220)
-
-            # 判断是否使用“动态风控”（当用户未提供止损/止盈百分比时）
-            use_dynamic = ("stop_loss_pct" not in h) and ("take_profit_pct" not in h)
-
-            if use_dynamic:
-                dyn = compute_dynamic_advice(df, entry, last)
-                sl_price = dyn["stop_loss_price"]
-                tp_price = dyn["take_profit_price"]
-                action = dyn["action"]
-                reason = dyn["reason"]
-                ma50 = dyn["ma50"]
-                ma200 = dyn["ma200"]
+    ex = get_async_exchange("okx", _proxies())
+    await aload_markets_shared(ex)
+    tickers = await afetch_tickers_shared(ex)
+    # 各持仓并发计算，输出顺序与持仓一致
+    return {"items": list(await asyncio.gather(*(_risk_item(ex, tickers, h) for h in items)))}
+
+async def _risk_item(ex, tickers: dict, h: dict) -> dict:
+    sym = h.get("symbol")
+    try:
+        entry = float(h.get("entry_price", 0))
+        qty = float(h.get("qty", 0))
+        t = tickers.get(sym) or {}
+        last = t.get("last") or (await ex.fetch_ticker(sym)).get("last")
+        inputs = await aget_risk_inputs(ex, "okx", sym)
+
+        # 判断是否使用“动态风控”（当用户未提供止损/止盈百分比时）
+        use_dynamic = ("stop_loss_pct" not in h) and ("take_profit_pct" not in h)
+
+        if use_dynamic:
+            dyn = advice_from_inputs(inputs, entry, last)
+            sl_price = dyn["stop_loss_price"]
+            tp_price = dyn["take_profit_price"]
+            action = dyn["action"]
+            reason = dyn["reason"]
+            ma50 = dyn["ma50"]
+            ma200 = dyn["ma200"]
+        else:
+            slp = float(h.get("stop_loss_pct", 8.0))
+            tpp = float(h.get("take_profit_pct", 12.0))
+            sl_price = entry * (1 - slp / 100.0)
+            tp_price = entry * (1 + tpp / 100.0)
+            # 基于百分比的口径 + 均线提示
+            ma50 = inputs["ma50"]
+            ma200 = inputs["ma200"]
+            if last is not None and last <= sl_price:
+                action = "卖出"; reason = "触发止损，优先保护本金"
+            elif last is not None and last >= tp_price:
+                action = "分批止盈"; reason = "达到止盈目标，建议分批落袋"
             else:
-                slp = float(h.get("stop_loss_pct", 8.0))
-                tpp = float(h.get("take_profit_pct", 12.0))
-                sl_price = entry * (1 - slp / 100.0)
-                tp_price = entry * (1 + tpp / 100.0)
-                # 基于百分比的口径 + 均线提示
-                ma50 = df["close"].rolling(50).mean().iloc[-1]
-                ma200 = df["close"].rolling(200).mean().iloc[-1] if len(df) >= 200 else None
-                if last is not None and last <= sl_price:
-                    action = "卖出"; reason = "触发止损，优先保护本金"
-                elif last is not None and last >= tp_price:
-                    action = "分批止盈"; reason = "达到止盈目标，建议分批落袋"
-                else:
-                    action = "观察"; reasons=[]
-                    if ma50 and last < ma50:
-                        action = "减仓"; reasons.append(f"跌破MA50≈{ma50:.4f}")
-                    if ma200 and last < ma200:
-                        action = "减仓"; reasons.append(f"低于MA200≈{ma200:.4f}")
-                    reason = "；".join(reasons) if reasons else "趋势未变，继续跟踪"
-
-            pnl_pct = round((last - entry) / entry * 100, 2) if (last and entry) else None
-
-            out.append({
-                "symbol": sym,
-                "entry_price": entry,
-                "qty": qty,
-                "last": last,
-                "stop_loss_price": round(sl_price, 6) if sl_price else None,
-                "take_profit_price": round(tp_price, 6) if tp_price else None,
-                "pnl_pct": pnl_pct,
-                "ma50": round(ma50, 6) if ma50 else None,
-                "ma200": round(ma200, 6) if ma200 else None,
-                "action": action,
-                "reason": reason,
-            })
-        except Exception as e:
-            out.append({"symbol": sym, "error": str(e)})
-    return {"items": out}
+                action = "观察"; reasons=[]
+                if ma50 and last < ma50:
+                    action = "减仓"; reasons.append(f"跌破MA50≈{ma50:.4f}")
+                if ma200 and last < ma200:
+                    action = "减仓"; reasons.append(f"低于MA200≈{ma200:.4f}")
+                reason = "；".join(reasons) if reasons else "趋势未变，继续跟踪"
+
+        pnl_pct = round((last - entry) / entry * 100, 2) if (last and entry) else None
+
+        return {
+            "symbol": sym,
+            "entry_price": entry,
+            "qty": qty,
+            "last": last,
+            "stop_loss_price": round(sl_price, 6) if sl_price else None,
+            "take_profit_price": round(tp_price, 6) if tp_price else None,
+            "pnl_pct": pnl_pct,
+            "ma50": round(ma50, 6) if ma50 else None,
+            "ma200": round(ma200, 6) if ma200 else None,
+            "action": action,
+            "reason": reason,
+        }
+    except Exception as e:
+        return {"symbol": sym, "error": str(e)}
+
+# ---------- ADMIN：分析结果 ----------
+def _check_admin(token: str | None):
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="forbidden")
+
+@app.get("/admin/profiles")
+def list_profiles(x_admin_token: str | None = Header(default=None)):
+    _check_admin(x_admin_token)
+    return {"items": [p.summary() for p in reversed(PROFILES)]}
+
+@app.get("/admin/profiles/{pid}")
+def profile_detail(pid: str, format: str = "json", kind: str = "all",
+                   x_admin_token: str | None = Header(default=None)):
+    """format=folded 返回 flamegraph 折叠栈（kind=cpu/wait/all），否则返回摘要与阶段拆分。"""
+    _check_admin(x_admin_token)
+    p = get_profile(pid)
+    if p is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    if format == "folded":
+        return PlainTextResponse(p.folded(kind))
+    return p.summary()
@@ -1,11 +1,136 @@
-import pandas as pd
+from __future__ import annotations
+import asyncio
+from typing import TYPE_CHECKING
+from .resample import resample_rows, base_limit_for, TF_MS
+from .exchanges import max_ohlcv_per_call, ohlcv_history_border, HISTORY_OHLCV_PER_CALL
+from .candles import Candles
+if TYPE_CHECKING:
+    import pandas as pd
 
 TF_ALIAS = {"1m":"1m","5m":"5m","15m":"15m","1h":"1h","4h":"4h","1d":"1d"}
+# 异步分页时同时在途的请求数（ccxt 的 enableRateLimit 仍按交易所限频节流）
+PAGE_CONCURRENCY = 4
 
-def fetch_ohlcv_df(ex, symbol: str, tf: str, limit: int) -> pd.DataFrame:
-    tf = TF_ALIAS.get(tf, "1h")
-    ohlcv = ex.fetch_ohlcv(symbol, timeframe=tf, limit=limit)
+def rows_to_df(ohlcv: list) -> pd.DataFrame:
+    import pandas as pd
     df = pd.DataFrame(ohlcv, columns=["ts","open","high","low","close","volume"])
     df["ts"] = pd.to_datetime(df["ts"], unit="ms")
     df.set_index("ts", inplace=True)
     return df
+
+# ---------- 分页 ----------
+def _older_pages(ex, tf: str, first_ts: int, have: int, limit: int) -> list[tuple[int, int]]:
+    """最新一页之前还差的部分拆成 [(since, 根数)]：近期窗口内每页取单次上限，超出后按历史接口上限。"""
+    step = TF_MS[tf]
+    cap = max_ohlcv_per_call(ex.id)
+    border = ohlcv_history_border(ex, tf, step)
+    hist = HISTORY_OHLCV_PER_CALL.get(ex.id, cap)
+    pages, back, since = [], have, first_ts
+    while back < limit:
+        if border is None or back + cap <= border: n = cap
+        elif back < border: n = border - back
+        else: n = hist
+        n = min(n, limit - back)
+        since -= n * step
+        pages.append((since, n))
+        back += n
+    return pages
+
+def _stitch(pages: list[list], limit: int) -> list:
+    """按 ts 去重拼接（后面的页覆盖前面的），升序返回最后 limit 根。"""
+    by_ts = {}
+    for rows in pages:
+        for r in rows:
+            by_ts[r[0]] = r
+    return [by_ts[t] for t in sorted(by_ts)][-limit:]
+
+def _from_archive(ex, symbol: str, tf: str, limit: int, rows: list) -> tuple[list, int]:
+    """
+    归档中最新一页之前的部分，以及仍需向交易所补的根数（最新一页计在内）。
+    归档只落后几根时只补中间的缺口；没有归档时整段分页。
+    """
+    from .archive import archived_rows
+    old = archived_rows(ex.id, symbol, tf, limit - len(rows), rows[0][0])
+    if not old:
+        return [], limit
+    gap = max(0, (rows[0][0] - old[-1][0]) // TF_MS[tf] - 1)
+    return old, min(limit, len(rows) + gap)
+
+def fetch_rows(ex, symbol: str, tf: str, limit: int) -> list:
+    """
+    原始 OHLCV 行。limit 超过单次上限时自动分页：先取最新一页，再以其首根为锚按 since 拆出更早的页逐页拉取，
+    按 ts 去重拼接。最新一页不满（上市不久）时说明没有更早的数据，不再往前翻。
+    同步版逐页串行：同步 ccxt 实例的限频节流不是线程安全的，多线程并发会同时打出请求（并发分页见 afetch_rows）。
+    配置了 ARCHIVE_DIR 时更早的部分先读归档，只向交易所补归档之后的缺口。
+    """
+    cap = max_ohlcv_per_call(getattr(ex, "id", None))
+    rows = ex.fetch_ohlcv(symbol, timeframe=tf, limit=min(limit, cap))
+    if limit <= cap or tf not in TF_MS or len(rows) < cap:
+        return rows
+    old, need = _from_archive(ex, symbol, tf, limit, rows)
+    pages = _older_pages(ex, tf, rows[0][0], len(rows), need)
+    older = [ex.fetch_ohlcv(symbol, timeframe=tf, since=since, limit=n) for since, n in pages]
+    return _stitch([old] + older[::-1] + [rows], limit)
+
+def fetch_ohlcv_df(ex, symbol: str, tf: str, limit: int) -> pd.DataFrame:
+    tf = TF_ALIAS.get(tf, "1h")
+    return rows_to_df(fetch_rows(ex, symbol, tf, limit))
+
+def _base_need(base_tf: str, tf: str, limit: int) -> int:
+    return limit if tf == base_tf else base_limit_for(base_tf, tf, limit)
+
+def _multi_plan(ex, want: dict[str, int], base_tf: str) -> tuple[dict[str, int], dict[str, int]]:
+    """拆分 want：(由基础周期合成的 {tf: limit}, 需单独拉取的 {tf: limit})。"""
+    cap = max_ohlcv_per_call(getattr(ex, "id", None))
+    derive, direct = {}, {}
+    for tf, limit in want.items():
+        tf = TF_ALIAS.get(tf, tf)
+        try:
+            need = _base_need(base_tf, tf, limit)
+        except ValueError:
+            direct[tf] = limit; continue
+        if need <= cap: derive[tf] = limit
+        else: direct[tf] = limit
+    return derive, direct
+
+# ---------- 异步版本（ccxt.async_support 实例） ----------
+async def afetch_rows(ex, symbol: str, tf: str, limit: int) -> list:
+    """fetch_rows 的异步版本，更早的页用协程并发（同样最多 PAGE_CONCURRENCY 个在途）。"""
+    cap = max_ohlcv_per_call(getattr(ex, "id", None))
+    rows = await ex.fetch_ohlcv(symbol, timeframe=tf, limit=min(limit, cap))
+    if limit <= cap or tf not in TF_MS or len(rows) < cap:
+        return rows
+    old, need = await asyncio.to_thread(_from_archive, ex, symbol, tf, limit, rows)
+    sem = asyncio.Semaphore(PAGE_CONCURRENCY)
+    async def page(since: int, n: int) -> list:
+        async with sem:
+            return await ex.fetch_ohlcv(symbol, timeframe=tf, since=since, limit=n)
+    older = await asyncio.gather(*(page(*p) for p in _older_pages(ex, tf, rows[0][0], len(rows), need)))
+    return _stitch([old] + older[::-1] + [rows], limit)
+
+async def afetch_ohlcv_df(ex, symbol: str, tf: str, limit: int) -> pd.DataFrame:
+    tf = TF_ALIAS.get(tf, "1h")
+    return rows_to_df(await afetch_rows(ex, symbol, tf, limit))
+
+async def afetch_candles(ex, symbol: str, tf: str, limit: int) -> Candles:
+    tf = TF_ALIAS.get(tf, "1h")
+    return Candles.from_rows(await afetch_rows(ex, symbol, tf, limit))
+
+async def afetch_ohlcv_multi(ex, symbol: str, want: dict[str, int], base_tf: str = "1h") -> dict[str, pd.DataFrame]:
+    """
+    一次拉取基础周期，合成 want 中的各周期 {tf: limit}；基础周期与单独拉取的周期并发请求。
+    - 只有单次请求能覆盖所需根数的周期才由基础周期合成，其余周期单独拉取
+    - 返回 {tf: DataFrame}，各周期只保留最后 limit 根
+    """
+    derive, direct = _multi_plan(ex, want, base_tf)
+    jobs = [afetch_ohlcv_df(ex, symbol, tf, limit) for tf, limit in direct.items()]
+    if derive:
+        base_limit = max(_base_need(base_tf, tf, n) for tf, n in derive.items())
+        jobs.append(ex.fetch_ohlcv(symbol, timeframe=base_tf, limit=base_limit))
+    res = await asyncio.gather(*jobs)
+    out: dict[str, pd.DataFrame] = dict(zip(direct, res))
+    if derive:
+        base_rows = res[-1]
+        for tf, limit in derive.items():
+            out[tf] = rows_to_df(resample_rows(base_rows, base_tf, tf, getattr(ex, "id", None), limit))
+    return out
@@ -0,0 +1,87 @@
+"""
+Prometheus 指标：分阶段耗时、交易所调用、缓存命中、飞书发送耗时，统一由 /metrics 导出。
+"""
+import inspect, os, time
+from contextlib import contextmanager
+from functools import wraps
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from .profiling import add_stage
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_SECONDS = Histogram("http_request_seconds", "HTTP 请求耗时", ["method", "path", "status"], buckets=_BUCKETS)
+STAGE_SECONDS = Histogram("stage_seconds", "处理阶段耗时", ["stage"], buckets=_BUCKETS)
+EXCHANGE_CALLS = Counter("exchange_calls_total", "交易所调用次数", ["venue", "endpoint"])
+EXCHANGE_ERRORS = Counter("exchange_errors_total", "交易所调用失败次数", ["venue", "endpoint"])
+EXCHANGE_SECONDS = Histogram("exchange_call_seconds", "交易所调用耗时", ["venue", "endpoint"], buckets=_BUCKETS)
+CACHE_REQUESTS = Counter("cache_requests_total", "缓存查询次数", ["cache", "result"])
+FEISHU_SECONDS = Histogram("feishu_send_seconds", "飞书发送耗时", ["kind"], buckets=_BUCKETS)
+FEISHU_DROPPED = Counter("feishu_events_dropped_total", "飞书回调丢弃次数（重复 / 限频）", ["reason"])
+
+# 需要计量的 ccxt 方法
+EXCHANGE_ENDPOINTS = ("load_markets", "fetch_tickers", "fetch_ticker", "fetch_ohlcv")
+
+@contextmanager
+def timed(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.labels(stage).observe(dt)
+        add_stage(stage, dt)  # 开启分析的请求同时记入墙钟拆分
+
+def cache_result(cache: str, hit: bool, kind: str | None = None) -> None:
+    """kind 细分命中类型：stale（返回陈旧值）/ early（提前刷新）。"""
+    CACHE_REQUESTS.labels(cache, kind or ("hit" if hit else "miss")).inc()
+
+def instrument_exchange(ex):
+    """在交易所实例上包装常用方法，记录调用次数、失败次数与耗时（按 venue/endpoint）。"""
+    venue = getattr(ex, "id", "unknown")
+    for name in EXCHANGE_ENDPOINTS:
+        fn = getattr(ex, name, None)
+        if fn is None or getattr(fn, "_instrumented", False):
+            continue
+        setattr(ex, name, _wrap_call(fn, venue, name))
+    return ex
+
+def _wrap_call(fn, venue: str, endpoint: str):
+    if inspect.iscoroutinefunction(fn):
+        return _wrap_async_call(fn, venue, endpoint)
+    @wraps(fn)
+    def call(*args, **kwargs):
+        EXCHANGE_CALLS.labels(venue, endpoint).inc()
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            EXCHANGE_ERRORS.labels(venue, endpoint).inc()
+            raise
+        finally:
+            EXCHANGE_SECONDS.labels(venue, endpoint).observe(time.perf_counter() - t0)
+    call._instrumented = True
+    return call
+
+def _wrap_async_call(fn, venue: str, endpoint: str):
+    @wraps(fn)
+    async def call(*args, **kwargs):
+        EXCHANGE_CALLS.labels(venue, endpoint).inc()
+        t0 = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            EXCHANGE_ERRORS.labels(venue, endpoint).inc()
+            raise
+        finally:
+            EXCHANGE_SECONDS.labels(venue, endpoint).observe(time.perf_counter() - t0)
+    call._instrumented = True
+    return call
+
+def render() -> tuple[bytes, str]:
+    """多 worker 部署（设置了 PROMETHEUS_MULTIPROC_DIR）时汇总所有 worker 的指标，否则导出本进程。"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -6,15 +6,31 @@ class KlineQuery(BaseModel):
     exchange: Optional[str] = Field(default="okx")
     tf: str = Field(default="1h", description="timeframe")
     limit: int = Field(default=500, ge=50, le=2000)
+    columnar: bool = Field(default=False, description="JSON 也按列式并行数组返回（ts 为整数毫秒）")
+
+class KlineItem(BaseModel):
+    symbol: str = Field(example="BTC/USDT")
+    tf: str = Field(default="1h", description="timeframe")
+    limit: int = Field(default=500, ge=50, le=2000)
+
+class KlineBatchQuery(BaseModel):
+    exchange: Optional[str] = Field(default="okx")
+    items: List[KlineItem] = Field(min_length=1, max_length=200)
 
 class SnapshotQuery(BaseModel):
     symbols: List[str]
     exchange: Optional[str] = Field(default="okx")
+    include_info: bool = Field(default=True, description="是否附带交易所原始 info（体积大，不需要时建议关闭）")
 
 class ScreenDailyQuery(BaseModel):
     symbols: Optional[List[str]] = None
     exchange: Optional[str] = Field(default="okx")
+    exchanges: Optional[List[str]] = Field(default=None, description="同时筛选多个交易所（\"all\" 表示全部），同一基础币只保留流动性最好的一家；缺省只用 exchange")
     topn: int = Field(default=10, ge=1, le=50)
+    strict: bool = Field(default=False, description="胜率增强：日线均线链 + 4h EMA200 + 量能持续")
+    strict_filters: Optional[List[str]] = Field(default=None, description="启用的过滤项，默认全部：trend/4h/volume")
+    diag: bool = Field(default=False, description="返回筛选诊断与筛前列表")
+    universe: int = Field(default=120, ge=1, le=5000, description="按成交额取前多少个候选参与打分；全市场筛选可调大")
 
 class Holding(BaseModel):
     symbol: str
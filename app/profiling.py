@@ -0,0 +1,165 @@
+"""
+按需采样分析（opt-in）：请求头 X-Profile: 1 或查询参数 ?profile=1，且带有效的 X-Admin-Token 时启用。
+- 未配置 ADMIN_TOKEN 时分析与 /admin/profiles* 一律关闭
+- 后台线程按固定间隔采样处理该请求的线程栈，并用线程 CPU 时钟区分“在算（cpu）”与“在等（wait）”
+- 同时汇总 metrics.timed 记录的分阶段耗时，给出墙钟时间拆分
+- 只保留最近 N 份，导出为 flamegraph 折叠栈格式（"a;b;c 次数"），可直接喂给 flamegraph.pl / speedscope
+未启用时只有一次 ContextVar 读取，无额外开销。
+"""
+import asyncio, hmac, inspect, sys, threading, time, uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import wraps
+
+from .config import settings
+
+# 由中间件写入：本请求需要分析时为 profile id，否则为 None
+PROFILE_REQUEST: ContextVar[str | None] = ContextVar("profile_request", default=None)
+_ACTIVE: ContextVar["Profile | None"] = ContextVar("profile_active", default=None)
+
+PROFILES: deque = deque(maxlen=settings.PROFILE_KEEP)
+
+class Profile:
+    def __init__(self, pid: str, name: str, interval: float):
+        self.id = pid
+        self.name = name
+        self.interval = interval
+        self.started = time.time()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.samples = {"cpu": Counter(), "wait": Counter()}
+        self.stages: dict[str, dict] = {}
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        st = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+        st["count"] += 1
+        st["seconds"] += seconds
+
+    def folded(self, kind: str = "all") -> str:
+        """flamegraph 折叠栈；kind=all 时以 cpu/wait 作为根帧区分。"""
+        lines = []
+        for k in (("cpu", "wait") if kind == "all" else (kind,)):
+            for stack, n in self.samples.get(k, Counter()).most_common():
+                lines.append(f"{k};{stack} {n}" if kind == "all" else f"{stack} {n}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        n_cpu = sum(self.samples["cpu"].values())
+        n_wait = sum(self.samples["wait"].values())
+        return {
+            "id": self.id,
+            "name": self.name,
+            "started": self.started,
+            "wall_seconds": round(self.wall, 4),
+            "cpu_seconds": round(self.cpu, 4),
+            "samples": {"cpu": n_cpu, "wait": n_wait},
+            "interval_ms": self.interval * 1000,
+            "stages": {k: {"count": v["count"], "seconds": round(v["seconds"], 4)}
+                       for k, v in sorted(self.stages.items(), key=lambda kv: -kv[1]["seconds"])},
+        }
+
+def _fold(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+class _Sampler(threading.Thread):
+    def __init__(self, profile: Profile, tid: int):
+        super().__init__(daemon=True)
+        self.profile, self.tid = profile, tid
+        self.stop_evt = threading.Event()
+        try:
+            self.clock = time.pthread_getcpuclockid(tid)
+        except (AttributeError, OSError):
+            self.clock = None
+
+    def _cpu(self) -> float:
+        return time.clock_gettime(self.clock) if self.clock is not None else 0.0
+
+    def run(self):
+        last = self._cpu()
+        while not self.stop_evt.wait(self.profile.interval):
+            frame = sys._current_frames().get(self.tid)
+            if frame is None:
+                continue
+            now = self._cpu()
+            # 采样间隔内线程 CPU 时间增长超过一半 → 视为在计算，否则视为在等待（网络/锁）
+            kind = "cpu" if (now - last) >= self.profile.interval * 0.5 else "wait"
+            last = now
+            self.profile.samples[kind][_fold(frame)] += 1
+
+def profiled(name: str):
+    """
+    装饰端点：仅当本请求开启分析时，在处理线程上挂采样器。
+    异步端点采样的是事件循环线程，并发请求的栈也会计入，cpu/wait 拆分以单请求压测时为准。
+    """
+    def deco(fn):
+        def start():
+            prof = Profile(PROFILE_REQUEST.get(), name, settings.PROFILE_INTERVAL_MS / 1000.0)
+            sampler = _Sampler(prof, threading.get_ident())
+            token = _ACTIVE.set(prof)
+            sampler.start()
+            return prof, sampler, token, time.perf_counter(), time.thread_time()
+
+        def stop(prof, sampler, token, t0, c0):
+            prof.wall = time.perf_counter() - t0
+            prof.cpu = time.thread_time() - c0
+            sampler.stop_evt.set()
+            _ACTIVE.reset(token)
+
+        def finish(prof, sampler):
+            sampler.join()
+            PROFILES.append(prof)
+
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def ainner(*args, **kwargs):
+                if PROFILE_REQUEST.get() is None:
+                    return await fn(*args, **kwargs)
+                state = start()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    stop(*state)
+                    # 等采样线程退出放到线程池，不阻塞事件循环
+                    await asyncio.to_thread(finish, *state[:2])
+            return ainner
+
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            if PROFILE_REQUEST.get() is None:
+                return fn(*args, **kwargs)
+            state = start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stop(*state)
+                finish(*state[:2])
+        return inner
+    return deco
+
+def add_stage(stage: str, seconds: float) -> None:
+    prof = _ACTIVE.get()
+    if prof is not None:
+        prof.add_stage(stage, seconds)
+
+def is_admin(token: str | None) -> bool:
+    """未配置 ADMIN_TOKEN 时任何人都不是管理员。"""
+    return bool(settings.ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, settings.ADMIN_TOKEN)
+
+def wants_profile(headers, query) -> bool:
+    if headers.get("x-profile") != "1" and query.get("profile") != "1":
+        return False
+    return is_admin(headers.get("x-admin-token"))
+
+def new_profile_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+def get_profile(pid: str) -> Profile | None:
+    for p in PROFILES:
+        if p.id == pid:
+            return p
+    return None
@@ -0,0 +1,73 @@
+"""
+K线重采样：由低周期（基础周期）K线合成高周期K线，供多周期过滤共用一份数据。
+- 输入/输出均为 ccxt 格式的行：[ts, open, high, low, close, volume]（ts 为毫秒）
+- 桶边界按交易所的会话边界对齐（SESSION_OFFSET_MS，默认 UTC 0 点）
+- 头部不完整的桶会被丢弃（否则开盘价/高低点与交易所不一致）；
+  尾部正在形成的桶保留，与交易所返回的“当前未收盘K线”口径一致
+"""
+
+TF_MS = {
+    "1m": 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "1h": 60 * 60_000,
+    "4h": 4 * 60 * 60_000,
+    "1d": 24 * 60 * 60_000,
+}
+
+# 各交易所高周期K线的起点偏移（毫秒）。
+# binance/bitget 日线按 UTC 0 点切分；ccxt 对 okx ≥6h 周期默认请求 UTC 口径（1Dutc），
+# okx 4H 按 UTC+8 切分，但与 UTC 的 4 小时边界重合，因此偏移同样为 0。
+SESSION_OFFSET_MS = {
+    "binance": 0,
+    "okx": 0,
+    "bitget": 0,
+}
+
+def tf_ratio(base_tf: str, target_tf: str) -> int:
+    """target_tf 包含多少根 base_tf；不能整除时报错。"""
+    if base_tf not in TF_MS or target_tf not in TF_MS:
+        raise ValueError(f"unsupported timeframe: {base_tf}->{target_tf}")
+    base, target = TF_MS[base_tf], TF_MS[target_tf]
+    if target < base or target % base:
+        raise ValueError(f"cannot resample {base_tf} to {target_tf}")
+    return target // base
+
+def base_limit_for(base_tf: str, target_tf: str, limit: int) -> int:
+    """合成 limit 根 target_tf 所需的基础K线根数（多取一桶以抵消头部不完整的桶）。"""
+    return (limit + 1) * tf_ratio(base_tf, target_tf)
+
+def resample_rows(rows: list, base_tf: str, target_tf: str, exchange: str | None = None,
+                  limit: int | None = None) -> list[list]:
+    """把 base_tf 的 ccxt 行合成为 target_tf；limit 不为空时只保留最后 limit 根。"""
+    ratio = tf_ratio(base_tf, target_tf)
+    if ratio == 1:
+        out = [[int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]), float(r[5])] for r in rows or []]
+        return out[-limit:] if limit else out
+
+    period = TF_MS[target_tf]
+    offset = SESSION_OFFSET_MS.get((exchange or "").lower(), 0)
+    out: list[list] = []
+    cur = None
+    skip_start = None
+    for i, r in enumerate(rows or []):
+        ts = int(r[0])
+        start = (ts - offset) // period * period + offset
+        if i == 0 and ts != start:
+            # 头部桶缺少开头部分的基础K线，整桶跳过
+            skip_start = start
+        if start == skip_start:
+            continue
+        o, h, l, c, v = float(r[1]), float(r[2]), float(r[3]), float(r[4]), float(r[5])
+        if cur is not None and cur[0] == start:
+            if h > cur[2]: cur[2] = h
+            if l < cur[3]: cur[3] = l
+            cur[4] = c
+            cur[5] += v
+            continue
+        if cur is not None:
+            out.append(cur)
+        cur = [start, o, h, l, c, v]
+    if cur is not None:
+        out.append(cur)
+    return out[-limit:] if limit else out
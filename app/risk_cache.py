@@ -0,0 +1,44 @@
+import time
+from .cache import get_json, set_json, aget_json, aset_json
+from .market import fetch_ohlcv_df, afetch_ohlcv_df
+from .resample import TF_MS
+from .risk_logic import compute_risk_inputs
+
+# 风控输入统一用 1h × 220 根（MA200 需要 ≥200 根）
+RISK_TF = "1h"
+RISK_LIMIT = 220
+
+def current_bar_ts(tf: str = RISK_TF, now: float | None = None) -> int:
+    """当前（未收盘）K线的开盘时间戳（毫秒），无需请求交易所即可得到。"""
+    step = TF_MS[tf]
+    now_ms = int((time.time() if now is None else now) * 1000)
+    return now_ms // step * step
+
+def _closed(df, tf: str, limit: int):
+    """只保留已收盘K线（去掉开盘时间 ≥ 当前K线开盘时间的那根），取最后 limit 根。"""
+    return df[df.index.asi8 // 1_000_000 < current_bar_ts(tf)].tail(limit)
+
+def get_risk_inputs(ex, exchange: str, symbol: str, tf: str = RISK_TF, limit: int = RISK_LIMIT) -> dict:
+    """
+    按 (交易所, 币对, 当前K线开盘时间) 缓存 compute_risk_inputs 的结果。
+    同一根K线内重复请求不再拉取K线；新K线开始后自动换键。
+    只用已收盘的K线计算（多拉一根补上去掉的未收盘K线），缓存值在整根K线内确实不变。
+    """
+    key = f"risk:{exchange}:{symbol}:{tf}:{current_bar_ts(tf)}"
+    hit = get_json(key)
+    if hit:
+        return hit
+    df = _closed(fetch_ohlcv_df(ex, symbol, tf, limit + 1), tf, limit)
+    inputs = compute_risk_inputs(df)
+    set_json(key, TF_MS[tf] // 1000 + 60, inputs)
+    return inputs
+
+async def aget_risk_inputs(ex, exchange: str, symbol: str, tf: str = RISK_TF, limit: int = RISK_LIMIT) -> dict:
+    """get_risk_inputs 的异步版本（ccxt.async_support 实例 + 异步 Redis），缓存键相同。"""
+    key = f"risk:{exchange}:{symbol}:{tf}:{current_bar_ts(tf)}"
+    hit = await aget_json(key)
+    if hit:
+        return hit
+    inputs = compute_risk_inputs(_closed(await afetch_ohlcv_df(ex, symbol, tf, limit + 1), tf, limit))
+    await aset_json(key, TF_MS[tf] // 1000 + 60, inputs)
+    return inputs
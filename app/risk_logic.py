@@ -1,9 +1,13 @@
+from __future__ import annotations
 import math
-import pandas as pd
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import pandas as pd
 
 def _atr(df: pd.DataFrame, period: int = 14) -> float | None:
     if len(df) < period + 2:
         return None
+    import pandas as pd
     high, low, close = df["high"], df["low"], df["close"]
     prev_close = close.shift(1)
     tr = pd.concat([
@@ -13,20 +17,30 @@ def _atr(df: pd.DataFrame, period: int = 14) -> float | None:
     ], axis=1).max(axis=1)
     return float(tr.rolling(period).mean().iloc[-1])
 
-def compute_dynamic_advice(df: pd.DataFrame, entry: float, last: float) -> dict:
+def compute_risk_inputs(df: pd.DataFrame) -> dict:
     """
-    动态生成止损/止盈与中文建议（无需用户给百分比）。
-    规则（长多单）：
-      - 动态止损：max( 最近20低点, last - 1.8*ATR, 0.97*MA50, 0.94*MA200[可选] )，取 < last 的最大者
-      - 动态止盈：min( 最近20高点*1.01, last + 1.8*ATR )，取 > last 的最小者
-      - 趋势判断：MA50/MA200 位置辅助给出“减仓/观察”等口径
+    只依赖K线的风控输入（传入已收盘K线时同一根K线内不变，可按K线缓存，见 risk_cache）：
+      MA50 / MA200 / ATR14 / 最近20根高低点 / ATR 缺失时的波动率兜底
     """
     ma50 = float(df["close"].rolling(50).mean().iloc[-1]) if len(df) >= 50 else None
     ma200 = float(df["close"].rolling(200).mean().iloc[-1]) if len(df) >= 200 else None
-    atr = _atr(df, 14) or (float(df["close"].pct_change().rolling(14).std().iloc[-1]) * float(last)) if len(df) >= 20 else None
+    atr = _atr(df, 14) if len(df) >= 20 else None
+    # ATR 不可用时，用收益率标准差 × 现价 近似（现价部分在 advice_from_inputs 中乘上）
+    ret_std = float(df["close"].pct_change().rolling(14).std().iloc[-1]) if len(df) >= 20 else None
+    return {
+        "ma50": ma50,
+        "ma200": ma200,
+        "atr": atr,
+        "ret_std": ret_std,
+        "swing_low20": float(df["low"].tail(20).min()),
+        "swing_high20": float(df["high"].tail(20).max()),
+    }
 
-    swing_low20  = float(df["low"].tail(20).min())
-    swing_high20 = float(df["high"].tail(20).max())
+def advice_from_inputs(inputs: dict, entry: float, last: float) -> dict:
+    """在缓存的风控输入上，按现价计算动态止损/止盈与中文建议。"""
+    ma50, ma200 = inputs.get("ma50"), inputs.get("ma200")
+    atr = inputs.get("atr") or (inputs["ret_std"] * float(last) if inputs.get("ret_std") is not None else None)
+    swing_low20, swing_high20 = inputs["swing_low20"], inputs["swing_high20"]
 
     # --- 动态止损 ---
     sl_candidates = [swing_low20, (last - 1.8 * atr) if atr else None]
@@ -69,3 +83,13 @@ def compute_dynamic_advice(df: pd.DataFrame, entry: float, last: float) -> dict:
         "reason": reason,
     }
     return out
+
+def compute_dynamic_advice(df: pd.DataFrame, entry: float, last: float) -> dict:
+    """
+    动态生成止损/止盈与中文建议（无需用户给百分比）。
+    规则（长多单）：
+      - 动态止损：max( 最近20低点, last - 1.8*ATR, 0.97*MA50, 0.94*MA200[可选] )，取 < last 的最大者
+      - 动态止盈：min( 最近20高点*1.01, last + 1.8*ATR )，取 > last 的最小者
+      - 趋势判断：MA50/MA200 位置辅助给出“减仓/观察”等口径
+    """
+    return advice_from_inputs(compute_risk_inputs(df), entry, last)
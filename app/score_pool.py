@@ -0,0 +1,131 @@
+"""
+打分进程池：候选K线打包进一块共享内存，按候选切片分给常驻进程池并行打分，父进程合并结果。
+- 子进程按名字挂载共享内存，直接在上面建 Candles 视图；只传 (symbol, 起止行号, 点差) 这类小元组，不 pickle DataFrame/ndarray
+- 候选数少于 SCORE_POOL_MIN 或可用进程数 ≤1 时在当前进程打分（IPC 与调度开销会超过并行收益）
+- 进程池用 spawn 启动（父进程里有事件循环与刷新线程，fork 不安全），首次使用时创建，退出时关闭；
+  子进程崩溃时本次退回进程内打分，下次调用重建进程池
+"""
+import asyncio, logging, multiprocessing as mp, os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
+from .candles import Candles
+from .config import settings
+from .scoring import total_score, decide_action_cn
+
+log = logging.getLogger(__name__)
+
+_pool: ProcessPoolExecutor | None = None
+
+def processes() -> int:
+    """SCORE_PROCESSES=0 时按 CPU 核数 / gunicorn worker 数自动取值，避免多个 worker 的进程池互相抢核。"""
+    if settings.SCORE_PROCESSES > 0:
+        return settings.SCORE_PROCESSES
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", "1"))))
+
+def score_item(sym: str, candles: Candles, bench: Candles | None, spread: float | None, exchange: str,
+               ext: dict | None = None) -> dict:
+    s = total_score(sym, candles, bench, ext)
+    action_cn, reason_cn = decide_action_cn(candles, s["score_total"], spread)
+    return {
+        "symbol": sym,
+        "exchange": exchange,
+        "avg_spread_pct": spread,
+        **s,
+        "action": action_cn,
+        "reason": reason_cn,
+    }
+
+def _score_many(items, bench: Candles | None, exchange: str) -> list[dict]:
+    """items = [(symbol, Candles, 点差, 外部因子)]；单个币对打分失败只跳过该币对（与拉取失败同样处理）。"""
+    out = []
+    for sym, candles, spread, ext in items:
+        try:
+            out.append(score_item(sym, candles, bench, spread, exchange, ext))
+        except Exception:
+            continue
+    return out
+
+def _score_shard(shm_name: str, n_rows: int, bench_span: tuple | None, items: list, exchange: str) -> list[dict]:
+    """子进程入口：挂载共享内存，对 items = [(symbol, 起行, 止行, 点差, 外部因子)] 打分。"""
+    # 子进程与父进程共用同一个 resource_tracker（spawn 时继承），挂载时的登记与父进程重复，由父进程 unlink 时一并注销
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        data = np.ndarray((n_rows, 6), dtype=np.float64, buffer=shm.buf, order="F")
+        bench = Candles(data[bench_span[0]:bench_span[1]]) if bench_span else None
+        out = _score_many([(sym, Candles(data[a:b]), spread, ext) for sym, a, b, spread, ext in items], bench, exchange)
+        del data, bench  # 释放对 shm.buf 的引用，否则 close() 报 BufferError
+        return out
+    finally:
+        shm.close()
+
+def _noop() -> int:
+    return os.getpid()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=processes(), mp_context=mp.get_context("spawn"))
+    return _pool
+
+async def warm() -> None:
+    """预热：提前拉起子进程并完成模块导入，首个全市场筛选不承担 spawn 耗时。"""
+    if processes() <= 1:
+        return
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, _noop) for _ in range(processes())))
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def score_candidates(frames: dict[str, Candles], bench: Candles | None,
+                           spreads: dict[str, float | None], exchange: str,
+                           ext: dict[str, dict] | None = None) -> list[dict]:
+    """
+    对 {symbol: Candles} 打分，返回结果顺序与 frames 一致（失败的币对不在结果中）。
+    ext 为 {symbol: 外部因子分}（见 factors.factor_scores），缺失取中性分。
+    """
+    ext = ext or {}
+    n_proc = processes()
+    if n_proc <= 1 or len(frames) < settings.SCORE_POOL_MIN:
+        return _score_many([(s, c, spreads.get(s), ext.get(s)) for s, c in frames.items()], bench, exchange)
+    return await _score_pooled(frames, bench, spreads, exchange, n_proc, ext)
+
+async def _score_pooled(frames, bench, spreads, exchange, n_proc, ext) -> list[dict]:
+    # 所有候选（和基准）首尾相接放进一个 (总行数, 6) 的 Fortran 序矩阵，每个币对对应一段行
+    parts = list(frames.values()) + ([bench] if bench is not None else [])
+    n_rows = sum(len(c) for c in parts)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, n_rows * 6 * 8))
+    try:
+        data = np.ndarray((n_rows, 6), dtype=np.float64, buffer=shm.buf, order="F")
+        items, pos = [], 0
+        for sym, c in frames.items():
+            data[pos:pos + len(c)] = c.data
+            items.append((sym, pos, pos + len(c), spreads.get(sym), ext.get(sym)))
+            pos += len(c)
+        bench_span = None
+        if bench is not None:
+            data[pos:pos + len(bench)] = bench.data
+            bench_span = (pos, pos + len(bench))
+        del data
+        # 连续切片分片，每个进程一片；合并时按分片顺序拼接，保持原顺序
+        size = -(-len(items) // n_proc)
+        shards = [items[i:i + size] for i in range(0, len(items), size)]
+        loop = asyncio.get_running_loop()
+        try:
+            pool = _get_pool()
+            res = await asyncio.gather(*(loop.run_in_executor(pool, _score_shard, shm.name, n_rows, bench_span,
+                                                              shard, exchange) for shard in shards))
+        except BrokenProcessPool as e:
+            log.warning("score pool broken, scoring in-process: %s", e)
+            shutdown()
+            return _score_many([(s, c, spreads.get(s), ext.get(s)) for s, c in frames.items()], bench, exchange)
+        return [x for shard in res for x in shard]
+    finally:
+        shm.close()
+        shm.unlink()
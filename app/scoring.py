@@ -1,6 +1,10 @@
-import pandas as pd
-from .indicators import ma, rsi, atr
+from __future__ import annotations
+from typing import TYPE_CHECKING
 from .config import settings
+from .candles import Candles, col, last_mean, last_max, last_pct_change
+from .xsection import FEATURES as XS_FEATURES
+if TYPE_CHECKING:  # pandas 导入较慢，仅用于类型标注；运行时由调用方传入 DataFrame
+    import pandas as pd
 
 # 打分权重
 class FactorWeights:
@@ -9,22 +13,38 @@ class FactorWeights:
     RELSTRENGTH = 0.20
     CATALYST = 0.15
     ONCHAIN = 0.15
-
-def trend_score(df: pd.DataFrame) -> float:
-    close = df["close"]
-    ma50 = ma(close, 50)
-    ma200 = ma(close, 200)
-    cond = (close.iloc[-1] > (ma50.iloc[-1] or close.iloc[-1])) + (close.iloc[-1] > (ma200.iloc[-1] or close.iloc[-1]))
-    peak = close.rolling(60).max().iloc[-1]
-    dd = (peak - close.iloc[-1]) / max(peak, 1e-9)
+    # 横截面排名因子（见 xsection.py），默认不启用；启用时相应调低上面的权重，使总和仍为 1
+    XS_MOMENTUM = 0.0
+    XS_VOLUME_SURGE = 0.0
+    XS_DRAWDOWN = 0.0
+
+# FACTOR_WEIGHTS=trend=0.25,xs_momentum=0.10 这类覆盖
+for _k, _v in settings.FACTOR_WEIGHTS.items():
+    if hasattr(FactorWeights, _k.upper()):
+        setattr(FactorWeights, _k.upper(), _v)
+
+def cross_sectional_weights() -> dict[str, float]:
+    """已启用的横截面因子 {特征名: 权重}。"""
+    w = {f: getattr(FactorWeights, f"XS_{f.upper()}") for f in XS_FEATURES}
+    return {f: x for f, x in w.items() if x > 0}
+
+# 以下打分函数同时接受 DataFrame 与 Candles；只取尾部值，按 numpy 计算（口径与 rolling(...).iloc[-1] 一致）
+def trend_score(df: pd.DataFrame | Candles) -> float:
+    close = col(df, "close")
+    last = close[-1]
+    ma50 = last_mean(close, 50)
+    ma200 = last_mean(close, 200)
+    cond = (last > (ma50 or last)) + (last > (ma200 or last))
+    peak = last_max(close, 60)
+    dd = (peak - last) / max(peak, 1e-9)
     dd_score = max(0.0, 1.0 - min(dd, 0.3) / 0.3)
     base = {0: 40, 1: 65, 2: 85}[cond]
     return float(min(100, base * 0.7 + dd_score * 30))
 
-def volume_score(df: pd.DataFrame) -> float:
-    v = df["volume"]
-    m7 = v.rolling(7).mean().iloc[-1]
-    m90 = v.rolling(90).mean().iloc[-1]
+def volume_score(df: pd.DataFrame | Candles) -> float:
+    v = col(df, "volume")
+    m7 = last_mean(v, 7)
+    m90 = last_mean(v, 90)
     if not (m7 and m90):
         return 50.0
     ratio = m7 / m90
@@ -34,28 +54,30 @@ def volume_score(df: pd.DataFrame) -> float:
     if ratio >= 0.8: return 50.0
     return 35.0
 
-def rel_strength_score(symbol: str, df: pd.DataFrame, bench: pd.DataFrame | None) -> float:
+def rel_strength_score(symbol: str, df: pd.DataFrame | Candles, bench: pd.DataFrame | Candles | None) -> float:
     if bench is None:
         return 60.0
-    r = (df["close"].pct_change(7).iloc[-1] or 0) - (bench["close"].pct_change(7).iloc[-1] or 0)
+    r = (last_pct_change(col(df, "close"), 7) or 0) - (last_pct_change(col(bench, "close"), 7) or 0)
     if r >= 0.10: return 90.0
     if r >= 0.05: return 75.0
     if r >= 0.00: return 65.0
     if r >= -0.03: return 50.0
     return 35.0
 
-def catalyst_score(symbol: str) -> float:
-    return 60.0  # 预留：新闻/上新事件
+# 外部因子由 factors.py 的数据源整批拉取后以 ext={"catalyst": 分, "onchain": 分} 传入，缺失时取中性分 60
+def catalyst_score(symbol: str, ext: dict | None = None) -> float:
+    return float((ext or {}).get("catalyst", 60.0))  # 新闻/上新事件
 
-def onchain_score(symbol: str) -> float:
-    return 60.0  # 预留：链上活跃
+def onchain_score(symbol: str, ext: dict | None = None) -> float:
+    return float((ext or {}).get("onchain", 60.0))  # 链上活跃
 
-def total_score(symbol: str, df: pd.DataFrame, bench: pd.DataFrame | None) -> dict:
+def total_score(symbol: str, df: pd.DataFrame | Candles, bench: pd.DataFrame | Candles | None,
+                ext: dict | None = None) -> dict:
     s_trend = trend_score(df)
     s_vol = volume_score(df)
     s_rel = rel_strength_score(symbol, df, bench)
-    s_cat = catalyst_score(symbol)
-    s_onc = onchain_score(symbol)
+    s_cat = catalyst_score(symbol, ext)
+    s_onc = onchain_score(symbol, ext)
     total = (s_trend * FactorWeights.TREND +
              s_vol * FactorWeights.VOLUME +
              s_rel * FactorWeights.RELSTRENGTH +
@@ -101,8 +123,12 @@ def _thresholds(mode: str) -> dict:
         "need_ma200": False,          # 优先，但不强制
     }
 
+def spread_limit(mode: str | None = None) -> float:
+    """点差上限（%）：超过即“建议回避”。"""
+    return _thresholds(mode or getattr(settings, "STRATEGY_MODE", "balanced"))["spread_max_pct"]
+
 # —— 中文操作建议（支持三档风格） —— #
-def decide_action_cn(df: pd.DataFrame, score_total: float, avg_spread_pct: float | None, mode: str | None = None) -> tuple[str, str]:
+def decide_action_cn(df: pd.DataFrame | Candles, score_total: float, avg_spread_pct: float | None, mode: str | None = None) -> tuple[str, str]:
     """
     返回 (action_cn, reason_cn)
     action_cn ∈ {"突破买点", "建议买入", "建议观察", "建议回避"}
@@ -112,14 +138,14 @@ def decide_action_cn(df: pd.DataFrame, score_total: float, avg_spread_pct: float
 
     cfg = _thresholds(mode or getattr(settings, "STRATEGY_MODE", "balanced"))
 
-    close = df["close"]
-    last = float(close.iloc[-1])
-    ma50 = float(close.rolling(50).mean().iloc[-1])
-    ma200 = float(close.rolling(200).mean().iloc[-1]) if len(close) >= 200 else None
+    close = col(df, "close")
+    last = float(close[-1])
+    ma50 = last_mean(close, 50)
+    ma200 = last_mean(close, 200) if len(close) >= 200 else None
 
     # 近7根涨幅（1h周期下约近7小时）——防追高
     try:
-        ret7 = float((close.iloc[-1] - close.iloc[-7]) / close.iloc[-7]) if len(close) >= 7 else 0.0
+        ret7 = float((close[-1] - close[-7]) / close[-7]) if len(close) >= 7 else 0.0
     except Exception:
         ret7 = 0.0
 
@@ -128,7 +154,7 @@ def decide_action_cn(df: pd.DataFrame, score_total: float, avg_spread_pct: float
         win = cfg["breakout_window"]
         if len(close) <= win:
             win = max(5, len(close) - 1)
-        prev_max = float(close.iloc[-(win+1):-1].max()) if len(close) > win else float(close.max())
+        prev_max = float(close[-(win+1):-1].max()) if len(close) > win else float(close.max())
         is_breakout = last > prev_max * 1.001  # +0.1%容差
     except Exception:
         is_breakout = False
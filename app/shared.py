@@ -0,0 +1,194 @@
+"""
+多 worker 共享：市场元数据、行情快照、K线经 Redis 在各进程间共用，后台刷新任务只由选出的 leader 执行。
+- 市场元数据体积大（数 MB），进程内再保留一份，MARKETS_LOCAL_TTL 内不重复解析
+- Redis 不可用时各函数退化为直接请求交易所，行为与单进程一致
+"""
+import asyncio, logging, os, socket, threading, time, uuid
+
+from .cache import client, get_json, set_json, aget_json, aset_json, acached
+from .candles import Candles
+from .config import settings
+from .market import afetch_rows
+from .metrics import timed
+from .resample import TF_MS
+
+log = logging.getLogger(__name__)
+
+MARKETS_TTL = settings.MARKETS_TTL
+TICKERS_TTL = settings.TICKERS_TTL
+CANDLES_TTL = settings.CANDLES_TTL
+MARKETS_LOCAL_TTL = 60
+
+_local_markets: dict[str, tuple[float, dict, dict]] = {}
+_local_lock = threading.Lock()
+
+def _apply_markets(ex, markets: dict, currencies: dict | None) -> dict:
+    if hasattr(ex, "set_markets"):
+        return ex.set_markets(markets, currencies or None)
+    ex.markets = markets
+    return markets
+
+def load_markets_shared(ex) -> dict:
+    """代替 ex.load_markets()：进程内 → Redis → 交易所，拉取后写回 Redis 供其他 worker 使用。"""
+    venue = ex.id
+    now = time.time()
+    with _local_lock:
+        local = _local_markets.get(venue)
+    if local and now - local[0] < MARKETS_LOCAL_TTL:
+        return _apply_markets(ex, local[1], local[2])
+    hit = get_json(f"mkts:{venue}")
+    if hit:
+        markets, currencies = hit["markets"], hit.get("currencies")
+    else:
+        markets = ex.load_markets()
+        currencies = getattr(ex, "currencies", None)
+        publish_markets(venue, markets, currencies)
+    with _local_lock:
+        _local_markets[venue] = (now, markets, currencies)
+    return _apply_markets(ex, markets, currencies)
+
+def publish_markets(venue: str, markets: dict, currencies: dict | None) -> None:
+    set_json(f"mkts:{venue}", MARKETS_TTL, {"markets": markets, "currencies": currencies})
+
+_tickers_lock = threading.Lock()
+
+def fetch_tickers_shared(ex) -> dict:
+    """
+    全市场行情快照，TICKERS_TTL 内各 worker 共用一份。
+    同步调用方（飞书 /advice、整点推送）都在线程里跑，进程内加锁后再查一次，过期时只有一个线程去拉；
+    跨 worker 不另加锁：开启后台刷新时 leader 每 REFRESH_SEC 秒写一次，这个键一直是热的，
+    而调用方本身按用户限频、整点推送每根K线只有一个 worker 执行，不会形成击穿。
+    """
+    hit = get_json(f"tick:{ex.id}")
+    if hit:
+        return hit
+    with _tickers_lock:
+        hit = get_json(f"tick:{ex.id}")
+        if hit:
+            return hit
+        tickers = ex.fetch_tickers()
+        set_json(f"tick:{ex.id}", TICKERS_TTL, tickers)
+        return tickers
+
+def fetch_ticker_shared(ex, symbol: str) -> dict:
+    """单个币对行情：优先取全市场快照里的，快照中没有时单独拉取，同样按 TICKERS_TTL 共用。"""
+    t = (get_json(f"tick:{ex.id}") or {}).get(symbol)
+    if t:
+        return t
+    key = f"tick1:{ex.id}:{symbol}"
+    t = get_json(key)
+    if t:
+        return t
+    t = ex.fetch_ticker(symbol)
+    set_json(key, TICKERS_TTL, t)
+    return t
+
+# ---------- 异步版本：进程内共享的 ccxt.async_support 实例 ----------
+async def aload_markets_shared(ex) -> dict:
+    """
+    共享实例只在本地副本更新时才重新 set_markets；并标记 markets_loading 已完成，
+    否则 ccxt 异步方法内部的 load_markets() 仍会发起网络请求。
+    """
+    venue = ex.id
+    now = time.time()
+    local = _local_markets.get(venue)
+    if not (local and now - local[0] < MARKETS_LOCAL_TTL):
+        hit = await aget_json(f"mkts:{venue}")
+        if hit:
+            local = (now, hit["markets"], hit.get("currencies"))
+        else:
+            markets = await ex.load_markets()
+            local = (now, markets, getattr(ex, "currencies", None))
+            await aset_json(f"mkts:{venue}", MARKETS_TTL, {"markets": markets, "currencies": local[2]})
+        with _local_lock:
+            _local_markets[venue] = local
+    if getattr(ex, "_shared_markets_ts", None) != local[0]:
+        _apply_markets(ex, local[1], local[2])
+        ex._shared_markets_ts = local[0]
+        if hasattr(ex, "markets_loading"):
+            fut = asyncio.get_running_loop().create_future()
+            fut.set_result(ex.markets)
+            ex.markets_loading = fut
+    return ex.markets
+
+async def afetch_tickers_shared(ex) -> dict:
+    """行情过期时先返回上一份（至多再旧 TICKERS_TTL 秒）并后台刷新，同一时刻只有一个请求打到交易所。"""
+    return await acached(f"tick:{ex.id}", TICKERS_TTL, ex.fetch_tickers, stale=TICKERS_TTL)
+
+async def afetch_rows_shared(ex, symbol: str, tf: str, limit: int) -> list:
+    bar = int(time.time() * 1000) // TF_MS[tf] * TF_MS[tf] if tf in TF_MS else 0
+    key = f"ohlcv:{ex.id}:{symbol}:{tf}:{limit}:{bar}"
+    hit = await aget_json(key)
+    if hit:
+        return hit
+    rows = await afetch_rows(ex, symbol, tf, limit)
+    await aset_json(key, CANDLES_TTL, rows)
+    return rows
+
+async def afetch_candles_shared(ex, symbol: str, tf: str, limit: int) -> Candles:
+    return Candles.from_rows(await afetch_rows_shared(ex, symbol, tf, limit))
+
+# ---------- leader 选举 ----------
+# 续期 / 释放都要“确认仍是自己持有”再操作，GET 与 EXPIRE/DEL 分两步时租约可能恰好在中间过期并被他人取得
+_RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+class Leader:
+    """
+    基于 SET NX EX 的租约：持有者每轮续期，进程退出或卡住超过 ttl 后由其他 worker 接管。
+    同一时刻最多一个 worker 认为自己是 leader（时钟漂移不超过 ttl 的前提下）；续期与释放用 Lua 脚本原子地比较后操作。
+    """
+    def __init__(self, name: str, ttl: int):
+        self.key = f"leader:{name}"
+        self.ttl = ttl
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    def acquire(self) -> bool:
+        r = client()
+        if r.set(self.key, self.id, nx=True, ex=self.ttl):
+            return True
+        return bool(r.eval(_RENEW, 1, self.key, self.id, self.ttl * 1000))
+
+    def release(self) -> None:
+        try:
+            client().eval(_RELEASE, 1, self.key, self.id)
+        except Exception:
+            pass
+
+def refresh_once(ex) -> None:
+    """刷新一家交易所的共享缓存：行情每轮刷新，市场元数据在剩余 TTL 不足一半时刷新。"""
+    venue = ex.id
+    try:
+        left = client().ttl(f"mkts:{venue}")
+    except Exception:
+        left = -2
+    if left < MARKETS_TTL // 2:
+        with timed("refresh.markets"):
+            markets = ex.load_markets(True)
+            publish_markets(venue, markets, getattr(ex, "currencies", None))
+    else:
+        load_markets_shared(ex)
+    with timed("refresh.tickers"):
+        set_json(f"tick:{venue}", TICKERS_TTL, ex.fetch_tickers())
+
+def run_refresher(stop: threading.Event, make_exchange, venues: list[str], interval: float) -> None:
+    """后台刷新循环：每轮先争取/续期 leader，只有 leader 请求交易所。"""
+    leader = Leader("refresh", ttl=max(int(interval * 3), 10))
+    exs, last_err = {}, None
+    try:
+        while True:
+            try:
+                if leader.acquire():
+                    for v in venues:
+                        if v not in exs:
+                            exs[v] = make_exchange(v)
+                        refresh_once(exs[v])
+                last_err = None
+            except Exception as e:
+                if str(e) != last_err:  # 同一错误（如 Redis 不可达）只记一次
+                    log.warning("refresh failed: %s", e)
+                last_err = str(e)
+            if stop.wait(interval):
+                break
+    finally:
+        leader.release()
@@ -0,0 +1,173 @@
+"""
+风控状态存储（SQLite）：替代整文件读写的 JSON 状态，支持多进程并发写。
+- 每条状态按 (ns, key) 存一行 JSON，带版本号；写入在 BEGIN IMMEDIATE 事务内完成，互不覆盖
+- update(..., ratchet=...)：追踪价位只升不降（原子取 max），并记录每次上调到 history
+- transact / compare_and_set：读-改-写的乐观并发，适合持有时间较长的流程（如自适应阈值）
+- WAL + synchronous=FULL，进程崩溃或断电不会留下半截文件
+"""
+import json, os, pathlib, sqlite3, time
+from contextlib import closing
+from typing import Callable, Iterable
+
+DEFAULT_DB = os.getenv("STATE_DB", "/var/lib/crypto_agent/state.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    field TEXT NOT NULL,
+    old REAL,
+    new REAL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_key ON history (ns, key, ts);
+"""
+
+class StateStore:
+    def __init__(self, path: str | pathlib.Path = DEFAULT_DB, timeout: float = 30.0):
+        self.path = str(path)
+        pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        with closing(self._conn()) as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # 每次操作独立连接：进程/线程间无共享状态；isolation_level=None 以便手动 BEGIN IMMEDIATE
+        c = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        c.execute("PRAGMA synchronous=FULL")
+        c.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return c
+
+    # ---------- 读 ----------
+    def get(self, ns: str, key: str, default=None):
+        with closing(self._conn()) as c:
+            row = c.execute("SELECT value FROM state WHERE ns=? AND key=?", (ns, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_versioned(self, ns: str, key: str) -> tuple[dict | None, int]:
+        with closing(self._conn()) as c:
+            row = c.execute("SELECT value, version FROM state WHERE ns=? AND key=?", (ns, key)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, 0)
+
+    def get_all(self, ns: str) -> dict:
+        with closing(self._conn()) as c:
+            rows = c.execute("SELECT key, value FROM state WHERE ns=?", (ns,)).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    # ---------- 写 ----------
+    def put(self, ns: str, key: str, value: dict) -> None:
+        c = self._conn()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            self._write(c, ns, key, value)
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK"); raise
+        finally:
+            c.close()
+
+    def compare_and_set(self, ns: str, key: str, expected_version: int, value: dict) -> bool:
+        """仅当当前版本等于 expected_version（不存在视为 0）时写入。"""
+        c = self._conn()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            row = c.execute("SELECT version FROM state WHERE ns=? AND key=?", (ns, key)).fetchone()
+            if (row[0] if row else 0) != expected_version:
+                c.execute("ROLLBACK")
+                return False
+            self._write(c, ns, key, value)
+            c.execute("COMMIT")
+            return True
+        except Exception:
+            c.execute("ROLLBACK"); raise
+        finally:
+            c.close()
+
+    def transact(self, ns: str, key: str, fn: Callable[[dict | None], dict], retries: int = 10) -> dict:
+        """乐观并发的读-改-写：fn(当前值) -> 新值，版本冲突时重读重算。"""
+        for _ in range(retries):
+            cur, ver = self.get_versioned(ns, key)
+            new = fn(cur)
+            if self.compare_and_set(ns, key, ver, new):
+                return new
+        raise RuntimeError(f"state conflict: {ns}/{key}")
+
+    def update(self, ns: str, key: str, values: dict, ratchet: Iterable[str] = ()) -> dict:
+        """
+        原子合并写入 values：ratchet 中的字段取 max(旧值, 新值)（追踪止损/止盈只升不降），
+        其余字段直接覆盖。被上调的 ratchet 字段记录到 history。返回写入后的完整值。
+        """
+        ratchet = set(ratchet)
+        c = self._conn()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            row = c.execute("SELECT value FROM state WHERE ns=? AND key=?", (ns, key)).fetchone()
+            cur = json.loads(row[0]) if row else {}
+            merged = dict(cur)
+            now = time.time()
+            for f, v in values.items():
+                old = cur.get(f)
+                if f in ratchet and v is not None and old is not None:
+                    v = max(old, v)
+                merged[f] = v
+                if f in ratchet and v is not None and v != old:
+                    c.execute("INSERT INTO history (ns, key, field, old, new, ts) VALUES (?,?,?,?,?,?)",
+                              (ns, key, f, old, v, now))
+            self._write(c, ns, key, merged)
+            c.execute("COMMIT")
+            return merged
+        except Exception:
+            c.execute("ROLLBACK"); raise
+        finally:
+            c.close()
+
+    def delete_except(self, ns: str, keys: Iterable[str]) -> int:
+        """删除 ns 下不在 keys 中的状态（如已清仓的币对）。"""
+        keys = list(keys)
+        with closing(self._conn()) as c:
+            q = "DELETE FROM state WHERE ns=?"
+            if keys:
+                q += f" AND key NOT IN ({','.join('?' * len(keys))})"
+            return c.execute(q, (ns, *keys)).rowcount
+
+    def history(self, ns: str, key: str, limit: int = 50) -> list[dict]:
+        with closing(self._conn()) as c:
+            rows = c.execute("SELECT field, old, new, ts FROM history WHERE ns=? AND key=? ORDER BY id DESC LIMIT ?",
+                             (ns, key, limit)).fetchall()
+        return [{"field": f, "old": o, "new": n, "ts": t} for f, o, n, t in rows]
+
+    def prune_history(self, keep_days: float = 90) -> int:
+        with closing(self._conn()) as c:
+            return c.execute("DELETE FROM history WHERE ts < ?", (time.time() - keep_days * 86400,)).rowcount
+
+    def import_json(self, ns: str, path: str | pathlib.Path) -> int:
+        """一次性迁移旧 JSON 状态文件（{key: {...}}）；ns 已有数据时跳过。"""
+        p = pathlib.Path(path)
+        if self.get_all(ns) or not p.exists():
+            return 0
+        try:
+            data = json.loads(p.read_text("utf-8"))
+        except Exception:
+            return 0
+        n = 0
+        for k, v in (data.items() if isinstance(data, dict) else []):
+            if isinstance(v, dict):
+                self.put(ns, k, v); n += 1
+        return n
+
+    @staticmethod
+    def _write(c: sqlite3.Connection, ns: str, key: str, value: dict) -> None:
+        c.execute(
+            "INSERT INTO state (ns, key, value, version, updated_at) VALUES (?,?,?,1,?) "
+            "ON CONFLICT(ns, key) DO UPDATE SET value=excluded.value, version=state.version+1, updated_at=excluded.updated_at",
+            (ns, key, json.dumps(value, ensure_ascii=False), time.time()))
@@ -0,0 +1,59 @@
+"""
+筛选结果的增量归约：候选逐批打分后立即并入固定容量的最小堆，K线随批次释放，内存不随候选数增长。
+"""
+import heapq
+
+class TopN:
+    """保留 key 最大的 k 个；同分时先加入者优先（与按分数稳定排序后取前 k 个的结果一致）。"""
+    __slots__ = ("k", "key", "count", "_heap")
+
+    def __init__(self, k: int, key: str = "score_total"):
+        self.k = k
+        self.key = key
+        self.count = 0
+        self._heap: list[tuple] = []
+
+    def push(self, item: dict) -> None:
+        # (分数, -序号) 越小越先被挤出；序号唯一，不会比较到 item 本身
+        entry = (item[self.key], -self.count, item)
+        self.count += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def sorted(self) -> list[dict]:
+        """按分数从高到低。"""
+        return [e[2] for e in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+class ScoreSummary:
+    """诊断用的轻量汇总：只累计数量、分数分布（每 10 分一档）与各操作建议的数量，不保留逐个候选。"""
+    __slots__ = ("count", "total", "lo", "hi", "buckets", "actions")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.lo = self.hi = None
+        self.buckets: dict[int, int] = {}
+        self.actions: dict[str, int] = {}
+
+    def add(self, item: dict) -> None:
+        s = item["score_total"]
+        self.count += 1
+        self.total += s
+        self.lo = s if self.lo is None else min(self.lo, s)
+        self.hi = s if self.hi is None else max(self.hi, s)
+        b = int(s // 10) * 10
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+        a = item.get("action")
+        self.actions[a] = self.actions.get(a, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else None,
+            "min": self.lo,
+            "max": self.hi,
+            "score_buckets": {f"{b}-{b + 10}": n for b, n in sorted(self.buckets.items())},
+            "actions": self.actions,
+        }
@@ -0,0 +1,65 @@
+"""
+横截面因子：同一根K线上全体候选之间的百分位排名（0~100）。
+相对排名不随大盘整体涨跌/放量漂移，不同市场阶段的分数可以直接比较。
+- 候选尾部K线对齐到同一时刻（交易所 BTC 基准的最后一根）后拼成矩阵，特征整批向量化计算；
+  最后一根不在该时刻（停牌/未更新）或样本不足的候选特征记为缺失
+- 排名每列一次排序，O(N log N)；同值取平均名次，缺失值记中性 50
+"""
+from __future__ import annotations
+import numpy as np
+from .candles import Candles
+
+FEATURES = ("momentum", "volume_surge", "drawdown")
+MOM_BARS = 7
+VOL_SHORT, VOL_LONG = 7, 90
+DD_WINDOW = 60
+WIDTH = max(MOM_BARS + 1, VOL_LONG, DD_WINDOW)
+
+def tail_matrix(frames: list[Candles], ref_ts: int | None, field: str) -> np.ndarray:
+    """(候选数, WIDTH) 的尾部矩阵，右对齐；不足 WIDTH 根的左侧、以及未对齐到 ref_ts 的整行为 NaN。"""
+    out = np.full((len(frames), WIDTH), np.nan)
+    for i, c in enumerate(frames):
+        n = min(len(c), WIDTH)
+        if not n or (ref_ts is not None and int(c.data[-1, 0]) != ref_ts):
+            continue
+        out[i, WIDTH - n:] = c[field][-n:]
+    return out
+
+def features(frames: list[Candles], ref_ts: int | None) -> np.ndarray:
+    """
+    (候选数, len(FEATURES)) 原始特征，越大越好：
+    momentum = 近 MOM_BARS 根涨幅；volume_surge = 近 VOL_SHORT 根均量 / 近 VOL_LONG 根均量；
+    drawdown = -(近 DD_WINDOW 根最高价回撤)
+    """
+    close = tail_matrix(frames, ref_ts, "close")
+    vol = tail_matrix(frames, ref_ts, "volume")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mom = close[:, -1] / close[:, -1 - MOM_BARS] - 1.0
+        surge = vol[:, -VOL_SHORT:].mean(axis=1) / vol[:, -VOL_LONG:].mean(axis=1)
+        peak = close[:, -DD_WINDOW:].max(axis=1)
+        dd = -(peak - close[:, -1]) / np.maximum(peak, 1e-9)
+    return np.column_stack([mom, surge, dd])
+
+def percentile_ranks(m: np.ndarray) -> np.ndarray:
+    """逐列百分位排名（0 最差，100 最好）。"""
+    m = np.asarray(m, dtype=np.float64)
+    return np.column_stack([_rank(m[:, j]) for j in range(m.shape[1])]) if m.size else m
+
+def _rank(x: np.ndarray) -> np.ndarray:
+    out = np.full(len(x), 50.0)
+    ok = np.isfinite(x)
+    v = x[ok]
+    n = len(v)
+    if n < 2:
+        return out
+    order = np.argsort(v, kind="stable")
+    sv = v[order]
+    # 同值一组，组内取首尾名次的平均
+    new = np.r_[True, sv[1:] != sv[:-1]]
+    group = np.cumsum(new) - 1
+    first = np.flatnonzero(new)
+    last = np.r_[first[1:], n] - 1
+    r = np.empty(n)
+    r[order] = ((first + last) / 2.0)[group]
+    out[ok] = r / (n - 1) * 100.0
+    return out
@@ -0,0 +1,130 @@
+"""
+本地假交易所：回放录制好的 ccxt 响应（markets / tickers / ohlcv），接口与 ccxt 同步版一致；
+AsyncFakeExchange 对应 ccxt.async_support（API 端点使用）。
+- 夹具格式见 record.py；不足 N 个币对时，按录制序列克隆出 SYNxxx/USDT 扩充到目标规模
+- 可选 latency_ms 模拟网络往返
+"""
+import asyncio, gzip, json, pathlib, random, time
+
+TF_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+
+def load_fixture(path: str | pathlib.Path) -> dict:
+    p = pathlib.Path(path)
+    opener = gzip.open if p.suffix == ".gz" else open
+    with opener(p, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def synthetic_fixture(n_series: int = 20, bars: int = 1000, seed: int = 7, exchange: str = "okx") -> dict:
+    """无录制文件时的离线夹具：随机游走K线，时间戳按周期对齐。"""
+    rnd = random.Random(seed)
+    symbols = ["BTC/USDT"] + [f"S{i:03d}/USDT" for i in range(n_series - 1)]
+    ohlcv, tickers, markets = {}, {}, {}
+    for sym in symbols:
+        ohlcv[sym] = {}
+        for tf in ("1h", "4h", "1d"):
+            step = TF_MS[tf]
+            end = 1_760_000_000_000 // step * step
+            p, rows = 100.0 * (1 + rnd.random()), []
+            for i in range(bars):
+                c = p * (1 + rnd.gauss(0.0003, 0.01))
+                rows.append([end - (bars - 1 - i) * step, p, max(p, c) * (1 + abs(rnd.gauss(0, 0.003))),
+                             min(p, c) * (1 - abs(rnd.gauss(0, 0.003))), c, rnd.uniform(100, 10_000)])
+                p = c
+            ohlcv[sym][tf] = rows
+        last = ohlcv[sym]["1h"][-1][4]
+        base = sym.split("/")[0]
+        markets[sym] = {"symbol": sym, "base": base, "quote": "USDT", "active": True}
+        tickers[sym] = {"symbol": sym, "last": last, "bid": last * 0.9995, "ask": last,
+                        "baseVolume": rnd.uniform(1e4, 1e6), "quoteVolume": rnd.uniform(1e6, 1e8),
+                        "timestamp": 1_760_000_000_000, "info": {"instId": base + "-USDT", "raw": "x" * 200}}
+    return {"exchange": exchange, "markets": markets, "tickers": tickers, "ohlcv": ohlcv}
+
+class FakeExchange:
+    def __init__(self, fixture: dict, n_symbols: int | None = None, latency_ms: float = 0.0):
+        self.id = fixture.get("exchange", "okx")
+        self.latency = latency_ms / 1000.0
+        self._ohlcv = dict(fixture["ohlcv"])
+        self._tickers = dict(fixture["tickers"])
+        self.markets = dict(fixture["markets"])
+        recorded = [s for s in self._ohlcv if s != "BTC/USDT"]
+        if n_symbols and n_symbols > len(recorded):
+            for i in range(n_symbols - len(recorded)):
+                src = recorded[i % len(recorded)]
+                sym = f"SYN{i:04d}/USDT"
+                k = 1.0 + (i % 97) / 100.0
+                self._ohlcv[sym] = {tf: [[r[0], r[1] * k, r[2] * k, r[3] * k, r[4] * k, r[5]] for r in rows]
+                                    for tf, rows in self._ohlcv[src].items()}
+                t = dict(self._tickers[src]); t["symbol"] = sym
+                for f in ("last", "bid", "ask"):
+                    if t.get(f) is not None: t[f] = t[f] * k
+                self._tickers[sym] = t
+                self.markets[sym] = {**self.markets[src], "symbol": sym, "base": sym.split("/")[0]}
+        self.symbols = [s for s in self._ohlcv if s != "BTC/USDT"][: n_symbols or None]
+        self.calls = 0
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def load_markets(self, reload: bool = False):
+        self._wait()
+        return self.markets
+
+    def fetch_tickers(self, symbols=None, params={}):
+        self._wait()
+        return self._tickers_of(symbols)
+
+    def fetch_ticker(self, symbol, params={}):
+        self._wait()
+        return self._tickers[symbol]
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params={}):
+        self._wait()
+        return self._ohlcv_of(symbol, timeframe, since, limit)
+
+    def _tickers_of(self, symbols=None) -> dict:
+        if symbols:
+            return {s: self._tickers[s] for s in symbols if s in self._tickers}
+        return dict(self._tickers)
+
+    def _ohlcv_of(self, symbol, timeframe, since=None, limit=None) -> list:
+        rows = (self._ohlcv.get(symbol) or {}).get(timeframe)
+        if rows is None:
+            raise ValueError(f"no fixture for {symbol} {timeframe}")
+        if since is not None:
+            rows = [r for r in rows if r[0] >= since]
+            return rows[:limit] if limit else rows
+        return rows[-limit:] if limit else rows
+
+class AsyncFakeExchange:
+    """FakeExchange 的异步接口（共用同一份数据与调用计数），延迟用 asyncio.sleep 模拟，不占线程。"""
+    def __init__(self, inner: FakeExchange):
+        self.inner = inner
+        self.id = inner.id
+        self.markets = inner.markets
+        self.symbols = inner.symbols
+
+    async def _wait(self):
+        self.inner.calls += 1
+        if self.inner.latency:
+            await asyncio.sleep(self.inner.latency)
+
+    async def load_markets(self, reload: bool = False):
+        await self._wait()
+        return self.markets
+
+    async def fetch_tickers(self, symbols=None, params={}):
+        await self._wait()
+        return self.inner._tickers_of(symbols)
+
+    async def fetch_ticker(self, symbol, params={}):
+        await self._wait()
+        return self.inner._tickers[symbol]
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params={}):
+        await self._wait()
+        return self.inner._ohlcv_of(symbol, timeframe, since, limit)
+
+    async def close(self):
+        pass
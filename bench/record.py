@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+录制交易所真实响应作为基准夹具（需联网）
+用法：
+  python bench/record.py --exchange okx --symbols 50 --out bench/fixtures/okx.json.gz
+夹具内容：markets（精简字段）、tickers、各币对 1h/4h/1d K线
+"""
+import argparse, gzip, json, pathlib, sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.exchanges import get_exchange
+
+TIMEFRAMES = {"1h": 500, "4h": 220, "1d": 250}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--exchange", default="okx")
+    ap.add_argument("--symbols", type=int, default=50, help="按成交额取前 N 个 /USDT 币对")
+    ap.add_argument("--out", default="bench/fixtures/okx.json.gz")
+    args = ap.parse_args()
+
+    ex = get_exchange(args.exchange)
+    markets = ex.load_markets()
+    tickers = ex.fetch_tickers()
+    usdt = [s for s in markets if s.endswith("/USDT")]
+    usdt.sort(key=lambda s: (tickers.get(s) or {}).get("quoteVolume") or 0, reverse=True)
+    symbols = ["BTC/USDT"] + [s for s in usdt if s != "BTC/USDT"][: args.symbols]
+
+    ohlcv = {}
+    for i, sym in enumerate(symbols, 1):
+        try:
+            ohlcv[sym] = {tf: ex.fetch_ohlcv(sym, timeframe=tf, limit=n) for tf, n in TIMEFRAMES.items()}
+            print(f"[{i}/{len(symbols)}] {sym}")
+        except Exception as e:
+            print(f"[WARN] {sym}: {e}")
+
+    keep = ("symbol", "base", "quote", "active", "type", "spot")
+    fixture = {
+        "exchange": ex.id,
+        "markets": {s: {k: markets[s].get(k) for k in keep} for s in ohlcv},
+        "tickers": {s: tickers[s] for s in ohlcv if s in tickers},
+        "ohlcv": ohlcv,
+    }
+    out = pathlib.Path(args.out); out.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(out, "wt", encoding="utf-8") as f:
+        json.dump(fixture, f)
+    print(f"[DONE] {len(ohlcv)} symbols -> {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准：用本地假交易所回放夹具，测 API 端点与核心计算在 10/100/1000 个币对下的延迟/吞吐
+用法：
+  python bench/run_bench.py                                   # 合成夹具，默认规模 10,100,1000
+  python bench/run_bench.py --fixture bench/fixtures/okx.json.gz --sizes 10,100 --out bench/results/v0.4.1.json
+  python bench/run_bench.py --compare bench/results/v0.4.1.json --threshold 0.2   # 与基线比较，退化超阈值时退出码为 1
+说明：
+  - Redis 优先连 REDIS_URL；连不上时使用 fakeredis（pip install -r bench/requirements.txt）
+  - 结果为 JSON：每项 {name, size, n, mean_ms, p50_ms, p95_ms, ops_per_s, stages?, errors?}
+  - 端点返回非 200 的请求不计入耗时，记在 errors（次数）与 error_samples 里；--compare 时有 errors 的项按退化处理
+  - /screen/daily 只对成交额前 universe 个候选打分；基准用默认 universe=120，因此 1000 规模下打分数量仍为 120
+"""
+import argparse, json, os, pathlib, platform, subprocess, sys, tempfile, time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+from fake_exchange import FakeExchange, AsyncFakeExchange, load_fixture, synthetic_fixture
+
+# 基准期间不做预热、后台刷新与整点推送（都会请求真实交易所，推送线程还会占用基准进程）；须在导入 app 之前设置
+os.environ.setdefault("WARMUP", "0")
+os.environ.setdefault("REFRESH_SEC", "0")
+os.environ.setdefault("ADVICE_PUSH", "0")
+os.environ.setdefault("SCREEN_CACHE_TTL", "0")  # 测的是筛选计算本身，不走结果缓存
+
+def _redis():
+    """返回 (同步客户端, 异步客户端)，两者指向同一份数据。"""
+    import redis
+    from app.config import settings
+    try:
+        cli = redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.5)
+        cli.ping()
+        import redis.asyncio as aredis
+        return cli, aredis.from_url(settings.REDIS_URL)
+    except Exception:
+        import fakeredis
+        server = fakeredis.FakeServer()
+        return fakeredis.FakeRedis(server=server), fakeredis.FakeAsyncRedis(server=server)
+
+def _stats(name: str, size: int, durations: list[float], extra: dict | None = None,
+           errors: list[str] | None = None) -> dict:
+    ds = sorted(durations)
+    total = sum(ds)
+    out = {
+        "name": name,
+        "size": size,
+        "n": len(ds),
+        "mean_ms": round(total / len(ds) * 1000, 3) if ds else None,
+        "p50_ms": round(ds[len(ds) // 2] * 1000, 3) if ds else None,
+        "p95_ms": round(ds[min(len(ds) - 1, int(len(ds) * 0.95))] * 1000, 3) if ds else None,
+        "ops_per_s": round(len(ds) / total, 2) if total else None,
+    }
+    if extra:
+        out.update(extra)
+    if errors:
+        out["errors"] = len(errors)
+        out["error_samples"] = sorted(set(errors))[:5]
+        print(f"[bench] {name} size={size}: {len(errors)} failed requests, e.g. {errors[0]}", file=sys.stderr)
+    return out
+
+def _timeit(fn, repeat: int) -> list[float]:
+    ds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        ds.append(time.perf_counter() - t0)
+    return ds
+
+def _timeit_http(call, repeat: int, errors: list[str]) -> list[float]:
+    """同 _timeit，但 call 返回响应：非 200 的不计入耗时，记到 errors。"""
+    ds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        resp = call()
+        d = time.perf_counter() - t0
+        if resp.status_code == 200:
+            ds.append(d)
+        else:
+            errors.append(f"{resp.status_code} {resp.text[:200]}")
+    return ds
+
+def _stage_totals() -> dict:
+    from prometheus_client import REGISTRY
+    out = {}
+    for metric in REGISTRY.collect():
+        if metric.name != "stage_seconds":
+            continue
+        for s in metric.samples:
+            if s.name.endswith("_sum"):
+                out.setdefault(s.labels["stage"], {})["seconds"] = s.value
+            elif s.name.endswith("_count"):
+                out.setdefault(s.labels["stage"], {})["count"] = s.value
+    return out
+
+def _stage_delta(before: dict, after: dict, runs: int) -> dict:
+    out = {}
+    for k, v in after.items():
+        b = before.get(k, {})
+        sec = v.get("seconds", 0) - b.get("seconds", 0)
+        cnt = v.get("count", 0) - b.get("count", 0)
+        if cnt:
+            out[k] = {"ms_per_run": round(sec / runs * 1000, 3), "calls_per_run": round(cnt / runs, 1)}
+    return out
+
+def run_size(client, fixture: dict, size: int, latency_ms: float, repeat: int, r) -> list[dict]:
+    import app.main as m
+    from app.market import fetch_ohlcv_df
+    from app.scoring import total_score
+    from app.risk_logic import compute_dynamic_advice
+    from app.filters import apply_strict
+    from app.resample import resample_rows
+
+    import app.shared
+    ex = FakeExchange(fixture, n_symbols=size, latency_ms=latency_ms)
+    aex = AsyncFakeExchange(ex)
+    m.get_exchange = lambda name=None, proxies=None: ex
+    m.get_async_exchange = lambda name=None, proxies=None: aex
+    app.shared._local_markets.clear()  # 各规模的假交易所 id 相同，避免沿用上一规模的市场元数据
+    syms = ex.symbols[:size]
+    res = []
+
+    # /kline：先全部未命中，再全部命中
+    r.flushdb()
+    for name in ("kline_miss", "kline_hit"):
+        errs = []
+        ds = [d for s in syms for d in _timeit_http(
+            lambda s=s: client.post("/kline", json={"symbol": s, "tf": "1h", "limit": 500}), 1, errs)]
+        res.append(_stats(name, size, ds, errors=errs))
+
+    errs = []
+    ds = _timeit_http(lambda: client.post("/snapshot", json={"symbols": syms}), repeat, errs)
+    res.append(_stats("snapshot", size, ds, errors=errs))
+
+    for strict in (False, True):
+        before, errs = _stage_totals(), []
+        ds = _timeit_http(lambda: client.post("/screen/daily", json={
+            "symbols": syms, "topn": 10, "strict": strict}), repeat, errs)
+        res.append(_stats("screen_daily_strict" if strict else "screen_daily", size, ds,
+                          {"stages": _stage_delta(before, _stage_totals(), repeat)}, errs))
+
+    # /risk/scan：持仓 = 全部币对；冷（清缓存）与热（命中风控输入缓存）
+    holdings = [{"symbol": s, "entry_price": ex.fetch_ticker(s)["last"], "qty": 1.0} for s in syms]
+    m.HOLDINGS_FILE.write_text(json.dumps(holdings), "utf-8")
+    cold, errs = [], []
+    for _ in range(repeat):
+        r.flushdb()
+        cold.extend(_timeit_http(lambda: client.get("/risk/scan"), 1, errs))
+    res.append(_stats("risk_scan_cold", size, cold, errors=errs))
+    errs = []
+    ds = _timeit_http(lambda: client.get("/risk/scan"), repeat, errs)
+    res.append(_stats("risk_scan_warm", size, ds, errors=errs))
+
+    # 纯计算
+    frames = {s: fetch_ohlcv_df(ex, s, "1h", 500) for s in syms}
+    bench_df = fetch_ohlcv_df(ex, "BTC/USDT", "1h", 500)
+    res.append(_stats("total_score", size, [d for s in syms for d in _timeit(lambda s=s: total_score(s, frames[s], bench_df), 1)]))
+    res.append(_stats("compute_dynamic_advice", size, [d for s in syms for d in _timeit(
+        lambda s=s: compute_dynamic_advice(frames[s], float(frames[s]["close"].iloc[-1]) * 0.95, float(frames[s]["close"].iloc[-1])), 1)]))
+    strict_frames = {s: {"1d": fetch_ohlcv_df(ex, s, "1d", 250), "4h": fetch_ohlcv_df(ex, s, "4h", 220)} for s in syms}
+    res.append(_stats("strict_filters", size, [d for s in syms for d in _timeit(lambda s=s: apply_strict(strict_frames[s]), 1)]))
+    h1_rows = {s: ex.fetch_ohlcv(s, "1h", limit=884) for s in syms}
+    res.append(_stats("resample_1h_4h", size, [d for s in syms for d in _timeit(
+        lambda s=s: resample_rows(h1_rows[s], "1h", "4h", ex.id, 220), 1)]))
+    return res
+
+def compare(current: list[dict], baseline_path: str, threshold: float) -> int:
+    base = {(x["name"], x["size"]): x for x in json.loads(pathlib.Path(baseline_path).read_text("utf-8"))["results"]}
+    bad = 0
+    for x in current:
+        if x.get("errors"):
+            bad += 1
+            print(f"{x['name']:<24} size={x['size']:<5} {x['errors']} failed requests  REGRESSION")
+            continue
+        b = base.get((x["name"], x["size"]))
+        if not b or not b.get("p50_ms"):
+            continue
+        ratio = x["p50_ms"] / b["p50_ms"]
+        flag = "REGRESSION" if ratio > 1 + threshold else ("faster" if ratio < 1 - threshold else "")
+        if flag == "REGRESSION": bad += 1
+        print(f"{x['name']:<24} size={x['size']:<5} p50 {b['p50_ms']:>10.3f} -> {x['p50_ms']:>10.3f} ms  x{ratio:.2f} {flag}")
+    return 1 if bad else 0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fixture", help="record.py 录制的夹具；缺省使用合成夹具")
+    ap.add_argument("--sizes", default="10,100,1000")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="每次交易所调用的模拟延迟")
+    ap.add_argument("--out", help="结果 JSON 输出路径（缺省打印到 stdout）")
+    ap.add_argument("--compare", help="基线结果 JSON")
+    ap.add_argument("--threshold", type=float, default=0.2)
+    args = ap.parse_args()
+
+    # 持仓文件写到临时目录，避免覆盖 /data 下的真实数据
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="bench_"))
+    from fastapi.testclient import TestClient
+    import app.cache
+    import app.main as m
+    r, ar = _redis()
+    app.cache.r, app.cache.ar = r, ar
+    m.HOLDINGS_FILE = tmp / "holdings.json"
+
+    fixture = load_fixture(args.fixture) if args.fixture else synthetic_fixture()
+    results = []
+    # 整个基准共用一个事件循环（异步 Redis 客户端与交易所实例绑定在该循环上）
+    with TestClient(m.app) as client:
+        for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+            print(f"[bench] size={size}", file=sys.stderr)
+            results.extend(run_size(client, fixture, size, args.latency_ms, args.repeat, r))
+
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except Exception:
+        rev = None
+    report = {
+        "version": m.app.version,
+        "git": rev,
+        "python": platform.python_version(),
+        "ts": int(time.time()),
+        "fixture": args.fixture or "synthetic",
+        "latency_ms": args.latency_ms,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        p = pathlib.Path(args.out); p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text, "utf-8")
+    else:
+        print(text)
+    if args.compare:
+        sys.exit(compare(results, args.compare, args.threshold))
+
+if __name__ == "__main__":
+    main()
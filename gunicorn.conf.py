@@ -0,0 +1,24 @@
+# gunicorn 多 worker 部署：gunicorn -c gunicorn.conf.py app.main:app
+# 市场元数据 / 行情 / K线 / 飞书 token 经 Redis 共享，后台刷新只由 leader worker 执行（见 app/shared.py）
+import os, pathlib, shutil
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+# Prometheus 多进程模式：各 worker 把指标写到共享目录，/metrics 汇总导出
+_prom_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+def on_starting(server):
+    if _prom_dir:
+        shutil.rmtree(_prom_dir, ignore_errors=True)
+        pathlib.Path(_prom_dir).mkdir(parents=True, exist_ok=True)
+
+def child_exit(server, worker):
+    if _prom_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K线归档维护（写入 app/archive.py 的分区 Parquet）
+用法：
+  python scripts/archive_candles.py backfill --exchange okx --tf 1h --since 2024-01-01       # 全部 USDT 现货
+  python scripts/archive_candles.py backfill --exchange okx --tf 1d --since 2023-01-01 --symbols BTC/USDT,ETH/USDT
+  python scripts/archive_candles.py update --exchange okx --tf 1h        # 增量：从各币对已归档的最后一根往后补（适合 cron 每小时跑）
+  python scripts/archive_candles.py compact --exchange okx --tf 1h
+环境变量：
+  ARCHIVE_DIR   归档目录（与 API 共用），默认 /data/archive
+  HTTP_PROXY / HTTPS_PROXY
+说明：
+  - 各币对按 since 向后翻页，页大小按交易所近期/历史接口的单次上限；多个币对并发（ccxt 仍按限频节流）
+  - 每 BATCH 个币对写一次 part 文件，结束后按月 compact
+"""
+import argparse, os, pathlib, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.archive import CandleArchive
+from app.exchanges import get_exchange, max_ohlcv_per_call, ohlcv_history_border, HISTORY_OHLCV_PER_CALL
+from app.resample import TF_MS
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "").strip() or "/data/archive"
+CONCURRENCY = 4
+BATCH = 50
+
+def _proxies():
+    p = {k: v for k, v in (("http", os.getenv("HTTP_PROXY")), ("https", os.getenv("HTTPS_PROXY"))) if v}
+    return p or None
+
+def _page_limit(ex, tf: str, since: int, now: int) -> int:
+    step = TF_MS[tf]
+    cap = max_ohlcv_per_call(ex.id)
+    border = ohlcv_history_border(ex, tf, step)
+    if border is None or (now - since) // step <= border:
+        return cap
+    return HISTORY_OHLCV_PER_CALL.get(ex.id, cap)
+
+def fetch_since(ex, symbol: str, tf: str, since: int) -> list:
+    """从 since 起向后翻页直到当前K线。"""
+    step = TF_MS[tf]
+    out = []
+    while True:
+        now = int(time.time() * 1000)
+        if since > now:
+            break
+        rows = ex.fetch_ohlcv(symbol, timeframe=tf, since=since, limit=_page_limit(ex, tf, since, now))
+        rows = [r for r in rows if r[0] >= since]
+        if not rows:
+            # 这一段没有数据（尚未上市/停牌）：跳过整页继续往后
+            since += _page_limit(ex, tf, since, now) * step
+            if since > now - step:
+                break
+            continue
+        out.extend(rows)
+        since = rows[-1][0] + step
+    return out
+
+def _universe(ex, symbols: str | None) -> list[str]:
+    if symbols:
+        return [s.strip() for s in symbols.split(",") if s.strip()]
+    markets = ex.load_markets()
+    return sorted(s for s, m in markets.items()
+                  if m.get("spot") and m.get("active", True) and m.get("quote") == "USDT")
+
+def _run(arc: CandleArchive, ex, tf: str, starts: dict[str, int]) -> int:
+    syms, total = sorted(starts), 0
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        for i in range(0, len(syms), BATCH):
+            chunk = syms[i:i + BATCH]
+            got = {}
+            for sym, rows in zip(chunk, pool.map(lambda s: _safe_fetch(ex, s, tf, starts[s]), chunk)):
+                if rows:
+                    got[sym] = rows
+            n = arc.append(ex.id, tf, got)
+            total += n
+            print(f"[archive] {ex.id} {tf} {i + len(chunk)}/{len(syms)} symbols, +{n} bars", file=sys.stderr)
+    arc.compact(ex.id, tf)
+    return total
+
+def _safe_fetch(ex, symbol: str, tf: str, since: int) -> list:
+    try:
+        return fetch_since(ex, symbol, tf, since)
+    except Exception as e:
+        print(f"[archive] {symbol} failed: {e}", file=sys.stderr)
+        return []
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["backfill", "update", "compact"])
+    ap.add_argument("--exchange", default="okx")
+    ap.add_argument("--tf", default="1h", choices=sorted(TF_MS))
+    ap.add_argument("--since", help="backfill 起始日期（UTC），如 2024-01-01")
+    ap.add_argument("--symbols", help="逗号分隔；backfill 缺省为全部 USDT 现货，update 缺省为已归档的币对")
+    ap.add_argument("--root", default=ARCHIVE_DIR)
+    args = ap.parse_args()
+
+    arc = CandleArchive(args.root)
+    if args.cmd == "compact":
+        print(f"[archive] compacted {arc.compact(args.exchange, args.tf)} months", file=sys.stderr)
+        return
+    ex = get_exchange(args.exchange, _proxies())
+    last = arc.last_ts(ex.id, args.tf)
+    step = TF_MS[args.tf]
+    if args.cmd == "backfill":
+        if not args.since:
+            ap.error("backfill requires --since")
+        since = int(datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+        starts = {s: max(since, last.get(s, -step) + step) for s in _universe(ex, args.symbols)}
+    else:
+        syms = _universe(ex, args.symbols) if args.symbols else sorted(last)
+        starts = {s: last[s] + step for s in syms if s in last}
+    print(f"[archive] {args.cmd} done: +{_run(arc, ex, args.tf, starts)} bars", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 import os
+import sys
 import subprocess
 import json
 from pathlib import Path
 
-# 参数存储文件
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.state_store import StateStore
+
+# 参数存储：SQLite 状态库（旧版 JSON 文件仅用于首次迁移）
 STATE_FILE = Path("/root/crypto_agent_backend/adaptive_state.json")
+STATE_DB = os.getenv("STATE_DB", "/var/lib/crypto_agent/state.db")
+STATE_NS, STATE_KEY = "adaptive", "daily_filtered"
 
 # 正常阈值
 BASE_LIQUIDITY = 3_000_000
@@ -15,15 +21,31 @@ BASE_VOLUME_RATIO = 1.05
 MIN_LIQUIDITY = 500_000
 MIN_VOLUME_RATIO = 0.6
 
-# 读取状态
-def load_state():
-    if STATE_FILE.exists():
-        return json.loads(STATE_FILE.read_text())
+def default_state():
     return {"empty_count": 0, "liquidity": BASE_LIQUIDITY, "volume_ratio": BASE_VOLUME_RATIO}
 
-# 保存状态
-def save_state(state):
-    STATE_FILE.write_text(json.dumps(state))
+# 读取状态
+def load_state(store):
+    st = store.get(STATE_NS, STATE_KEY)
+    if st is None and STATE_FILE.exists():
+        st = json.loads(STATE_FILE.read_text())
+        store.put(STATE_NS, STATE_KEY, st)
+    return st or default_state()
+
+def next_state(state, empty):
+    """根据本次扫描是否为空推进状态，返回 (新状态, 日志或 None)；纯函数，冲突重试时可安全重算"""
+    state = dict(state or default_state())
+    if empty:
+        state["empty_count"] += 1
+        if state["empty_count"] >= 3:
+            # 降低阈值
+            state["liquidity"] = max(MIN_LIQUIDITY, int(state["liquidity"] * 0.8))
+            state["volume_ratio"] = max(MIN_VOLUME_RATIO, round(state["volume_ratio"] * 0.8, 2))
+            state["empty_count"] = 0
+            return state, f"[Adaptive] 参数已降低: liquidity={state['liquidity']}, volume_ratio={state['volume_ratio']}"
+        return state, None
+    # 恢复正常
+    return default_state(), "[Adaptive] 已恢复正常阈值"
 
 def run_scan(liq, vol):
     env = os.environ.copy()
@@ -43,23 +65,19 @@ def run_scan(liq, vol):
     return result.stdout
 
 def main():
-    state = load_state()
+    store = StateStore(STATE_DB)
+    state = load_state(store)
     output = run_scan(state["liquidity"], state["volume_ratio"])
 
-    if "暂无合适标的" in output:
-        state["empty_count"] += 1
-        if state["empty_count"] >= 3:
-            # 降低阈值
-            state["liquidity"] = max(MIN_LIQUIDITY, int(state["liquidity"] * 0.8))
-            state["volume_ratio"] = max(MIN_VOLUME_RATIO, round(state["volume_ratio"] * 0.8, 2))
-            state["empty_count"] = 0
-            print(f"[Adaptive] 参数已降低: liquidity={state['liquidity']}, volume_ratio={state['volume_ratio']}")
-    else:
-        # 恢复正常
-        state = {"empty_count": 0, "liquidity": BASE_LIQUIDITY, "volume_ratio": BASE_VOLUME_RATIO}
-        print("[Adaptive] 已恢复正常阈值")
-
-    save_state(state)
+    # 扫描耗时较长，期间可能有其它运行写入：以版本号原子合并，不覆盖他人结果
+    empty = "暂无合适标的" in output
+    log = {}
+    def step(cur):
+        new, log["msg"] = next_state(cur, empty)  # 只保留最后一次（写入成功那次）的日志
+        return new
+    store.transact(STATE_NS, STATE_KEY, step)
+    if log["msg"]:
+        print(log["msg"])
     print(output)
 
 if __name__ == "__main__":
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, json, math, requests, statistics
+import os, sys, json, math, requests, statistics, pathlib
 from datetime import datetime
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.resample import resample_rows, base_limit_for
+
 API_BASE = os.getenv("API_BASE", "http://127.0.0.1:8000")
 FEISHU_WEBHOOK = os.getenv("FEISHU_WEBHOOK", "")
 BINANCE_API = "https://api.binance.com"
@@ -101,10 +104,16 @@ def fundamentals_for_symbol(sym_pair: str):
     return info
 
 # ========== 短线波动护栏 & 确认 ==========
-def atr_percent_1h(sym_pair: str, lookback=14):
-    """1小时ATR%（(均值TrueRange)/close）。"""
-    bnsym = symbol_to_binance(sym_pair)
-    kl = bn_klines(bnsym, "1h", 60+lookback)
+def bn_klines_15m_base(sym_pair: str, lookback=14):
+    """15m 基础K线：同时覆盖 15m 确认与 1h ATR（由15m合成），省去单独的 1h 请求。"""
+    return bn_klines(symbol_to_binance(sym_pair), "15m", base_limit_for("15m", "1h", 60+lookback))
+
+def atr_percent_1h(sym_pair: str, lookback=14, kl15=None):
+    """1小时ATR%（(均值TrueRange)/close）。传入 kl15 时由15m合成1h，不再单独请求。"""
+    if kl15 is not None:
+        kl = resample_rows(kl15, "15m", "1h", "binance", 60+lookback)
+    else:
+        kl = bn_klines(symbol_to_binance(sym_pair), "1h", 60+lookback)
     if not kl or len(kl) < lookback+1: return None
     highs = [float(x[2]) for x in kl]
     lows  = [float(x[3]) for x in kl]
@@ -117,10 +126,9 @@ def atr_percent_1h(sym_pair: str, lookback=14):
     close = closes[-1]
     return (atr/close)*100.0 if close else None
 
-def confirm_15m_above_ma20(sym_pair: str, need=2):
+def confirm_15m_above_ma20(sym_pair: str, need=2, kl15=None):
     """15m 连续 need 根收在MA20上方。"""
-    bnsym = symbol_to_binance(sym_pair)
-    kl = bn_klines(bnsym, "15m", 80)
+    kl = kl15[-80:] if kl15 is not None else bn_klines(symbol_to_binance(sym_pair), "15m", 80)
     if not kl or len(kl) < 30: return False
     closes = [float(x[4]) for x in kl]
     ma20s = []
@@ -222,9 +230,10 @@ def filter_with_all(items):
 
     def _vol_guard_and_confirm(it):
         sym = it.get("symbol")
-        atr1h = atr_percent_1h(sym) or 0.0
+        kl15  = bn_klines_15m_base(sym)
+        atr1h = atr_percent_1h(sym, kl15=kl15) or 0.0
         dd60  = last_60m_drawdown_pct(sym) or 0.0
-        ok_confirm = confirm_15m_above_ma20(sym, need=CONFIRM_NEED)
+        ok_confirm = confirm_15m_above_ma20(sym, need=CONFIRM_NEED, kl15=kl15)
 
         # 默认操作建议
         hint = it.get("action_hint","建议观察")
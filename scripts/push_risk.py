@@ -10,13 +10,19 @@
 与之前版本相比，仅增强了 “行情解析 + 失败原因”。动态止盈/止损逻辑保持不变。
 """
 
-import os, json, requests, pathlib, math
+import os, sys, json, requests, pathlib, math
 from datetime import datetime
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.state_store import StateStore
+
 # ========== 环境参数 ==========
 FEISHU_WEBHOOK   = os.getenv("FEISHU_WEBHOOK", "").strip()
 POS_FILE         = os.getenv("POS_FILE", "/root/crypto_agent_backend/config/positions.json")
-STATE_FILE       = os.getenv("STATE_FILE", "/var/lib/crypto_agent/positions_state.json")
+STATE_FILE       = os.getenv("STATE_FILE", "/var/lib/crypto_agent/positions_state.json")  # 旧版 JSON，仅用于首次迁移
+STATE_DB         = os.getenv("STATE_DB", "/var/lib/crypto_agent/state.db")
+STATE_NS         = "positions"
+HISTORY_KEEP_DAYS = float(os.getenv("HISTORY_KEEP_DAYS", "90"))  # 价位上调记录保留天数，每次运行清理一次
 REQ_TIMEOUT      = float(os.getenv("REQ_TIMEOUT","15"))
 
 STOP_LOSS_PCT    = float(os.getenv("STOP_LOSS_PCT", "8"))
@@ -39,9 +45,12 @@ CHANGE_EPS_PCT     = float(os.getenv("CHANGE_EPS_PCT", "0.3"))
 EX_LIST = [x.strip() for x in os.getenv("EX_LIST","binance,okx,gate,bybit,kucoin").split(",") if x.strip()]
 
 # ========== 交易所 ==========
-import ccxt
+# 按需初始化：ccxt 导入与 load_markets 都很慢，只在真正解析行情时才做，且按 EX_LIST 顺序逐家构建，
+# 前面的交易所已解析成功时后面的不会初始化（无持仓时整个脚本不触碰 ccxt）
+_EXS = {}
 
 def _build_exchange(exid):
+    import ccxt
     klass = getattr(ccxt, exid, None)
     if not klass: return None
     ex = klass({"enableRateLimit": True, "timeout": 15000})
@@ -51,10 +60,11 @@ def _build_exchange(exid):
         print(f"[WARN] load_markets({exid}) failed: {e}")
     return ex
 
-EXS = []
-for exid in EX_LIST:
-    ex = _build_exchange(exid)
-    if ex: EXS.append(ex)
+def iter_exchanges():
+    for exid in EX_LIST:
+        if exid not in _EXS:
+            _EXS[exid] = _build_exchange(exid)
+        if _EXS[exid]: yield _EXS[exid]
 
 # ========== 工具 ==========
 def now_str(): return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -78,19 +88,27 @@ def load_positions():
         print(f"[WARN] positions.json parse error: {e}")
     return []
 
-def load_state():
+def load_state(store: StateStore):
     try:
-        if os.path.exists(STATE_FILE):
-            with open(STATE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+        store.import_json(STATE_NS, STATE_FILE)
+        return store.get_all(STATE_NS)
     except Exception as e:
         print(f"[WARN] load_state error: {e}")
     return {}
 
-def save_state(state: dict):
-    p = pathlib.Path(STATE_FILE); p.parent.mkdir(parents=True, exist_ok=True)
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+def save_symbol_state(store: StateStore, sym: str, st: dict, sl_trailing: bool, tp_trailing: bool) -> dict:
+    """
+    单币对原子写入：追踪中的止损/止盈与最高收盘价只升不降（并发运行时取较高者），
+    未开启追踪的价位直接覆盖为基线。返回落库后的状态。
+    """
+    ratchet = ["highest_close"]
+    if sl_trailing: ratchet.append("sl_price")
+    if tp_trailing: ratchet.append("tp_price")
+    try:
+        return store.update(STATE_NS, sym, st, ratchet=ratchet)
+    except Exception as e:
+        print(f"[WARN] save_state({sym}) error: {e}")
+        return st
 
 def push_feishu(markdown_text: str, title="持仓风控提醒"):
     if not FEISHU_WEBHOOK:
@@ -196,7 +214,7 @@ def get_price_ma_atr_smart(symbol: str):
 
     last_reason = None
 
-    for ex in EXS:
+    for ex in iter_exchanges():
         try:
             # 找最佳报价交易对
             best_sym, why = _best_symbol_on_exchange(ex, base)
@@ -281,8 +299,8 @@ def main():
         push_feishu(f"**风控扫描**\n- 暂无持仓或未配置。\n- 时间：{now_str()}")
         return
 
-    prev = load_state()
-    new_state = {}
+    store = StateStore(STATE_DB)
+    prev = load_state(store)
     items = []
     missing = []
     ts = now_str()
@@ -368,13 +386,17 @@ def main():
         else:
             changed_notes.append(f"设置止盈→{safe_num(tp_price,6)}")
 
+        # 先落库再展示：并发运行时以库中已上调的价位为准
+        saved = save_symbol_state(store, sym, {"sl_price": sl_price, "tp_price": tp_price, "highest_close": highest_close},
+                                  sl_trailing, tp_trailing)
+        sl_price, tp_price = saved.get("sl_price", sl_price), saved.get("tp_price", tp_price)
+
         line1 = f"- {sym}  现价:{safe_num(close,6)}  盈亏:{safe_num(pnl_pct)}%（{exid or '-'}｜{raw_symbol or '-'}）"
         line2 = f"  止损:{safe_num(sl_price,6)}  止盈:{safe_num(tp_price,6)}  MA50:{safe_num(ma50,4)}  MA200:{safe_num(ma200,4)}"
         line3 = f"  建议：**{action_hint}**；{notes}；策略：追踪止损{'开' if sl_trailing else '关'}，追踪止盈{'开' if tp_trailing else '关'}，ATR1h≈{safe_num(atr1h,2)}%"
         if changed_notes: line3 += "；" + "；".join(changed_notes)
 
         items.append({"line1": line1, "line2": line2, "line3": line3})
-        new_state[sym] = {"sl_price": sl_price, "tp_price": tp_price, "highest_close": highest_close}
 
     # 组装并推送
     lines = [f"**风控扫描（自动风控）**\n更新时间：{ts}\n"]
@@ -382,7 +404,9 @@ def main():
         lines.extend([it["line1"], it["line2"], it["line3"]])
     push_feishu("\n".join(lines), title="持仓风控提醒")
 
-    save_state(new_state)
+    # 清理已不在持仓中的币对状态
+    store.delete_except(STATE_NS, {p.get("symbol") for p in positions if p.get("symbol")})
+    store.prune_history(HISTORY_KEEP_DAYS)
 
 if __name__ == "__main__":
     try:
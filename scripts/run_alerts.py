@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+价格触发告警（常驻进程）
+- 价位来源：状态库（push_risk 写入的追踪止损/止盈）+ JSON 状态文件 + API 持仓文件（动态/百分比口径）；
+  各来源的持仓键互不覆盖，状态库里已有的币对以状态库为准，不再读 JSON 状态文件中的同名条目
+- 行情来源：默认轮询交易所 tickers；设置 ALERT_REPLAY 时改为回放文件（每行 {"symbol","price","ts"}）
+- 穿越止损/止盈价位即推送飞书；告警后不重复提醒，直到价位上调越过告警价位，
+  或价格收复超过 ALERT_REARM_PCT 且过了 ALERT_COOLDOWN_SEC 后重新布防
+- 每次重载后，已不在任何来源中的持仓（平仓/删除）撤防；有来源读取失败时本轮不撤防
+环境变量：
+  FEISHU_WEBHOOK      飞书群机器人
+  STATE_DB            push_risk 的状态库，默认 /var/lib/crypto_agent/state.db
+  STATE_FILES         额外的 JSON 状态文件（逗号分隔），默认 /data/risk_state.json
+  HOLDINGS_FILE       默认 /data/holdings.json
+  ALERT_EXCHANGE      默认 okx
+  ALERT_POLL_SEC      轮询间隔，默认 5
+  ALERT_RELOAD_SEC    价位重载间隔，默认 300
+  ALERT_REARM_PCT     价格收复多少（百分比）才重新布防，默认 0.5
+  ALERT_COOLDOWN_SEC  同一持仓同类告警的最短间隔，默认 300
+  ALERT_REPLAY        回放文件路径（可选）
+  ALERT_DRY_RUN       1 时只打印不推送
+"""
+import os, sys, json, time, pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.alerts import AlertEngine, replay_feed, poll_feed, levels_from_state, levels_from_store, levels_from_holdings, alert_md
+from app.state_store import StateStore
+
+STATE_DB      = os.getenv("STATE_DB", "/var/lib/crypto_agent/state.db")
+STATE_FILES   = [x.strip() for x in os.getenv("STATE_FILES", "/data/risk_state.json").split(",") if x.strip()]
+HOLDINGS_FILE = os.getenv("HOLDINGS_FILE", "/data/holdings.json")
+EXCHANGE      = os.getenv("ALERT_EXCHANGE", "okx")
+POLL_SEC      = float(os.getenv("ALERT_POLL_SEC", "5"))
+RELOAD_SEC    = float(os.getenv("ALERT_RELOAD_SEC", "300"))
+REARM_PCT     = float(os.getenv("ALERT_REARM_PCT", "0.5"))
+COOLDOWN_SEC  = float(os.getenv("ALERT_COOLDOWN_SEC", "300"))
+REPLAY        = os.getenv("ALERT_REPLAY", "").strip()
+DRY_RUN       = os.getenv("ALERT_DRY_RUN", "0") == "1"
+
+def notify(alert):
+    md = alert_md(alert)
+    print(f"[ALERT] {json.dumps(alert, ensure_ascii=False)}")
+    if DRY_RUN:
+        return
+    from app.feishu_utils import push_webhook_md
+    try:
+        push_webhook_md(md, title="价格触发提醒")
+    except Exception as e:
+        print(f"[WARN] push failed: {e}")
+
+def load_levels(engine, ex=None):
+    rows, ok = [], True
+    try:
+        if os.path.exists(STATE_DB):
+            rows.extend(levels_from_store(StateStore(STATE_DB)))
+    except Exception as e:
+        print(f"[WARN] load state db failed: {e}")
+        ok = False
+    in_store = {sym for _, sym, _, _ in rows}
+    for p in STATE_FILES:
+        try:
+            rows.extend(r for r in levels_from_state(p) if r[1] not in in_store)
+        except Exception as e:
+            print(f"[WARN] load state {p} failed: {e}")
+            ok = False
+    if ex is not None and os.path.exists(HOLDINGS_FILE):
+        from app.risk_cache import get_risk_inputs
+        try:
+            items = json.loads(pathlib.Path(HOLDINGS_FILE).read_text("utf-8"))
+            ticks = ex.fetch_tickers()
+            rows.extend(levels_from_holdings(
+                items,
+                inputs_for=lambda s: get_risk_inputs(ex, EXCHANGE, s),
+                last_for=lambda s: (ticks.get(s) or {}).get("last"),
+            ))
+        except Exception as e:
+            print(f"[WARN] load holdings failed: {e}")
+            ok = False
+    return engine.sync(rows, prune=ok)
+
+def main():
+    engine = AlertEngine(notify=notify, rearm_pct=REARM_PCT / 100.0, cooldown=COOLDOWN_SEC)
+    if REPLAY:
+        load_levels(engine)
+        n = engine.run(replay_feed(REPLAY))
+        print(f"[DONE] replay fired {n} alerts")
+        return
+
+    from app.exchanges import get_exchange
+    ex = get_exchange(EXCHANGE)
+    state = {"symbols": load_levels(engine, ex), "loaded": time.time()}
+
+    def symbols():
+        # 定期重载价位：追踪止损上调后重新布防，新增持仓自动纳入
+        if time.time() - state["loaded"] >= RELOAD_SEC:
+            state["symbols"] = load_levels(engine, ex)
+            state["loaded"] = time.time()
+        return state["symbols"]
+
+    engine.run(poll_feed(ex, symbols, POLL_SEC))
+
+if __name__ == "__main__":
+    main()
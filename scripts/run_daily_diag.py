@@ -53,6 +53,8 @@ def main():
     dropped_mkt   = diag.get("dropped_by_market")
     dropped_fund  = diag.get("dropped_by_fundamental")
     dropped_other = diag.get("dropped_by_other")
+    # strict 模式下服务端按过滤项给出剔除数
+    dropped_strict = {k: diag.get(f"dropped_by_{k}") for k in ("trend", "4h", "volume")}
 
     # 2) 若没有 diag，尝试从 items 推断
     items = data.get("topn") or data.get("items") or []
@@ -71,10 +73,13 @@ def main():
     print(f"筛后(filtered)：{filtered_cnt if filtered_cnt is not None else '未知'}")
 
     # 打印各类剔除统计
-    if any(x is not None for x in [dropped_mkt, dropped_fund, dropped_other]):
+    if any(x is not None for x in [dropped_mkt, dropped_fund, dropped_other, *dropped_strict.values()]):
         print("\n—— 剔除统计 ——")
         if dropped_mkt is not None:  print(f"大盘过滤剔除：{dropped_mkt}")
         if dropped_fund is not None: print(f"基本面过滤剔除：{dropped_fund}")
+        if dropped_strict["trend"] is not None:  print(f"日线趋势链剔除：{dropped_strict['trend']}")
+        if dropped_strict["4h"] is not None:     print(f"4h EMA200 剔除：{dropped_strict['4h']}")
+        if dropped_strict["volume"] is not None: print(f"量能持续剔除：{dropped_strict['volume']}")
         if dropped_other is not None:print(f"其它规则剔除：{dropped_other}")
 
     # 若 filtered 为空，可以选择做“兜底预览”（仅打印，不推送）